@@ -1,13 +1,16 @@
 import calendar
 import datetime
+import functools
+import os
 import platform
+import sys
 import time
 import urllib
 import urlparse
 import warnings
 
 import stripe
-from stripe import error, http_client, version, util
+from stripe import deadlines, error, http_client, version, util
 from stripe.multipart_data_generator import MultipartDataGenerator
 
 
@@ -52,6 +55,39 @@ def _api_encode(data):
             yield (key, util.utf8(value))
 
 
+# Callables notified of every API request, used by development tooling such
+# as `stripe.diagnostics`.  Each is called with the HTTP method, the URL,
+# the params and the (filename, lineno, function) of the calling code.
+_request_observers = []
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def add_request_observer(observer):
+    _request_observers.append(observer)
+
+
+def remove_request_observer(observer):
+    try:
+        _request_observers.remove(observer)
+    except ValueError:
+        pass
+
+
+def _call_site():
+    # The innermost frame outside of the library itself; tests living in
+    # the package count as callers.
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if (not os.path.abspath(code.co_filename).startswith(_PACKAGE_DIR) or
+                frame.f_globals.get('__name__', '').startswith(
+                    'stripe.test')):
+            return code.co_filename, frame.f_lineno, code.co_name
+        frame = frame.f_back
+    return None
+
+
 def _build_api_url(url, query):
     scheme, netloc, path, base_query, fragment = urlparse.urlsplit(url)
 
@@ -61,9 +97,89 @@ def _build_api_url(url, query):
     return urlparse.urlunsplit((scheme, netloc, path, query, fragment))
 
 
+def _close(post_data):
+    # Multipart bodies hold open the files they stream
+    if hasattr(post_data, 'close'):
+        post_data.close()
+
+
+def shared_http_client(pool_size=10):
+    """
+    Return `stripe.default_http_client`, first setting it to a pooled
+    client with room for `pool_size` concurrent requests if it is unset,
+    so that concurrent callers share its keep-alive connections.
+    """
+    from stripe import verify_ssl_certs
+
+    client = stripe.default_http_client
+    if client is None:
+        client = http_client.new_pooled_http_client(
+            pool_size, verify_ssl_certs=verify_ssl_certs)
+        stripe.default_http_client = client
+    return client
+
+
+# Requested by warmup as a cheap, read-only call
+_WARMUP_PATH = '/v1/account'
+
+
+def warmup(n_connections=2, upload=False):
+    """
+    Pay the cost of the first request ahead of time, from a warmup handler
+    or on worker start: build the SSL context and the HTTP client, and
+    open and handshake `n_connections` connections to `stripe.api_base`
+    (and, with `upload`, to `stripe.upload_api_base`) by sending as many
+    concurrent, ordinary `GET /v1/account` requests with `stripe.api_key`.
+    If no API key is set yet, no requests are sent.
+
+    The connections are kept in `stripe.default_http_client`, which is
+    set to a pooled client if it is unset, so that later requests reuse
+    them.  Returns the time taken by each step, in seconds, and the
+    number of requests sent or the error raised for each host.
+    """
+    from stripe import api_base, api_key, upload_api_base
+
+    start = time.time()
+    http_client.ssl_context()
+    report = {'ssl_context': time.time() - start, 'hosts': {}}
+
+    start = time.time()
+    client = shared_http_client(max(n_connections, 10))
+    report['client'] = time.time() - start
+
+    if not api_key:
+        util.logger.warning('Not warming up Stripe connections, since no '
+                            'API key is set')
+        return report
+
+    requestor = APIRequestor(client=client)
+    headers = requestor.request_headers(api_key, 'get')
+
+    bases = [api_base]
+    if upload:
+        bases.append(upload_api_base)
+    for base in bases:
+        start = time.time()
+        try:
+            opened = client.warmup(base + _WARMUP_PATH, n_connections,
+                                   headers)
+        except error.APIConnectionError, e:
+            util.logger.warning('Could not warm up connections to %s: %s',
+                                base, e)
+            host = {'connections': 0, 'error': e}
+        else:
+            host = {'connections': opened}
+        host['seconds'] = time.time() - start
+        report['hosts'][base] = host
+
+    util.logger.info('Warmed up Stripe connections: %r', report)
+    return report
+
+
 class APIRequestor(object):
 
-    def __init__(self, key=None, client=None, api_base=None, account=None):
+    def __init__(self, key=None, client=None, api_base=None, account=None,
+                 hedging=None, circuit_breaker=None):
         if api_base:
             self.api_base = api_base
         else:
@@ -71,10 +187,14 @@ class APIRequestor(object):
         self.api_key = key
         self.stripe_account = account
 
-        from stripe import verify_ssl_certs
+        from stripe import (default_http_client, hedging_policy,
+                            verify_ssl_certs)
 
-        self._client = client or http_client.new_default_http_client(
-            verify_ssl_certs=verify_ssl_certs)
+        self._client = (client or default_http_client or
+                        http_client.new_default_http_client(
+                            verify_ssl_certs=verify_ssl_certs))
+        self._hedging = hedging or hedging_policy
+        self._circuit_breaker = circuit_breaker or stripe.circuit_breaker
 
     @classmethod
     def api_url(cls, url=''):
@@ -135,12 +255,137 @@ class APIRequestor(object):
             DeprecationWarning)
         return _build_api_url(url, cls.encode(params))
 
-    def request(self, method, url, params=None, headers=None):
-        rbody, rcode, rheaders, my_api_key = self.request_raw(
-            method.lower(), url, params, headers)
+    def request(self, method, url, params=None, headers=None,
+                deadline=None):
+        """
+        Issue an API call, within `deadline`, a stripe.Deadline, if given
+        as well as any deadline already in effect.
+        """
+        if _request_observers:
+            call_site = _call_site()
+            for observer in list(_request_observers):
+                observer(method.lower(), url, params, call_site)
+
+        with deadlines.using(deadline):
+            rbody, rcode, rheaders, my_api_key = self.request_raw(
+                method.lower(), url, params, headers)
         resp = self.interpret_response(rbody, rcode, rheaders)
         return resp, my_api_key
 
+    def request_batch(self, calls, deadline=None):
+        """
+        Issue several API calls at once and wait on them together.  `calls`
+        is a list of `(method, url, params)` tuples.  Returns a list with
+        the `(response, api_key)` pair for each call, in order, or the
+        StripeError it raised.
+
+        Clients with asynchronous requests, like UrlFetchClient on App
+        Engine, run the calls concurrently; others run them in turn.
+        """
+        with deadlines.using(deadline):
+            return self._request_batch(calls)
+
+    def _request_batch(self, calls):
+        if _request_observers:
+            call_site = _call_site()
+            for method, url, params in calls:
+                for observer in list(_request_observers):
+                    observer(method.lower(), url, params, call_site)
+
+        pending = []
+        for method, url, params in calls:
+            method = method.lower()
+            try:
+                abs_url, headers, post_data, my_api_key = \
+                    self._prepare_request(method, url, params, None)
+            except error.StripeError, e:
+                pending.append(e)
+                continue
+            try:
+                rpc = self._call_client(self._client.request_async,
+                                        method, abs_url, headers, post_data)
+            except error.StripeError, e:
+                _close(post_data)
+                pending.append(e)
+            else:
+                pending.append((method, abs_url, my_api_key, rpc, post_data))
+
+        results = []
+        for call in pending:
+            if isinstance(call, error.StripeError):
+                results.append(call)
+                continue
+
+            method, abs_url, my_api_key, rpc, post_data = call
+            try:
+                try:
+                    rbody, rcode, rheaders = self._call_client(
+                        rpc.get_result)
+                finally:
+                    # Bodies are read until the request completes
+                    _close(post_data)
+                self._log_response(method, abs_url, rbody, rcode)
+                resp = self.interpret_response(rbody, rcode, rheaders)
+            except error.StripeError, e:
+                results.append(e)
+            else:
+                results.append((resp, my_api_key))
+        return results
+
+    def request_stream(self, url, params=None, headers=None,
+                       chunk_size=65536):
+        """
+        Issue a GET whose response body is not JSON, like the contents of
+        a file, and return an iterator over its chunks along with the
+        response headers.  `url` may be absolute, for hosts other than
+        `api_base`, but only on `api_base`, `stripe.upload_api_base` or
+        another stripe.com host, since the API key is sent along.  Error
+        responses are raised as usual.
+        """
+        my_api_key = self._resolve_api_key()
+
+        if '://' in url:
+            abs_url = url
+            if not self._is_stripe_url(abs_url):
+                raise error.InvalidRequestError(
+                    'Not sending your API key to %s, which is not a '
+                    'Stripe host.  Only files on api_base, upload_api_base '
+                    'or https://*.stripe.com can be streamed.' % (url,),
+                    'url')
+        else:
+            abs_url = '%s%s' % (self.api_base, url)
+        if params:
+            abs_url = _build_api_url(
+                abs_url, urllib.urlencode(list(_api_encode(params))))
+
+        request_headers = self.request_headers(my_api_key, 'get')
+        if headers is not None:
+            request_headers.update(headers)
+
+        scheme, netloc = urlparse.urlsplit(abs_url)[:2]
+        chunks, rcode, rheaders = self._guarded_call(
+            '%s://%s' % (scheme, netloc), self._client.request_stream,
+            'get', abs_url, request_headers, chunk_size=chunk_size)
+
+        util.logger.info('GET %s %d', abs_url, rcode)
+        if not (200 <= rcode < 300):
+            self.interpret_response(b''.join(chunks), rcode, rheaders)
+        return chunks, rheaders
+
+    def _is_stripe_url(self, url):
+        from stripe import api_base, upload_api_base
+
+        parts = urlparse.urlsplit(url)
+        origin = (parts.scheme, parts.netloc.lower())
+        for base in (self.api_base, api_base, upload_api_base):
+            base_parts = urlparse.urlsplit(base)
+            if origin == (base_parts.scheme, base_parts.netloc.lower()):
+                return True
+
+        host = parts.hostname or ''
+        return parts.scheme == 'https' and (
+            host == 'stripe.com' or host.endswith('.stripe.com'))
+
     def handle_api_error(self, rbody, rcode, resp, rheaders):
         try:
             err = resp['error']
@@ -166,12 +411,7 @@ class APIRequestor(object):
             raise error.APIError(err.get('message'), rbody, rcode, resp,
                                  rheaders)
 
-    def request_raw(self, method, url, params=None, supplied_headers=None):
-        """
-        Mechanism for issuing an API call
-        """
-        from stripe import api_version
-
+    def _resolve_api_key(self):
         if self.api_key:
             my_api_key = self.api_key
         else:
@@ -185,31 +425,10 @@ class APIRequestor(object):
                 'from the Stripe web interface.  See https://stripe.com/api '
                 'for details, or email support@stripe.com if you have any '
                 'questions.')
+        return my_api_key
 
-        abs_url = '%s%s' % (self.api_base, url)
-
-        encoded_params = urllib.urlencode(list(_api_encode(params or {})))
-
-        if method == 'get' or method == 'delete':
-            if params:
-                abs_url = _build_api_url(abs_url, encoded_params)
-            post_data = None
-        elif method == 'post':
-            if supplied_headers is not None and \
-                    supplied_headers.get("Content-Type") == \
-                    "multipart/form-data":
-                generator = MultipartDataGenerator()
-                generator.add_params(params or {})
-                post_data = generator.get_post_data()
-                supplied_headers["Content-Type"] = \
-                    "multipart/form-data; boundary=%s" % (generator.boundary,)
-            else:
-                post_data = encoded_params
-        else:
-            raise error.APIConnectionError(
-                'Unrecognized HTTP method %r.  This may indicate a bug in the '
-                'Stripe bindings.  Please contact support@stripe.com for '
-                'assistance.' % (method,))
+    def request_headers(self, api_key, method):
+        from stripe import api_version
 
         ua = {
             'bindings_version': version.VERSION,
@@ -229,7 +448,7 @@ class APIRequestor(object):
         headers = {
             'X-Stripe-Client-User-Agent': util.json.dumps(ua),
             'User-Agent': 'Stripe/v1 PythonBindings/%s' % (version.VERSION,),
-            'Authorization': 'Bearer %s' % (my_api_key,)
+            'Authorization': 'Bearer %s' % (api_key,)
         }
 
         if self.stripe_account:
@@ -241,25 +460,104 @@ class APIRequestor(object):
         if api_version is not None:
             headers['Stripe-Version'] = api_version
 
+        return headers
+
+    def request_raw(self, method, url, params=None, supplied_headers=None):
+        """
+        Mechanism for issuing an API call
+        """
+        abs_url, headers, post_data, my_api_key = self._prepare_request(
+            method, url, params, supplied_headers)
+
+        # Only GETs are safe to send twice
+        if method == 'get' and self._hedging is not None:
+            request = functools.partial(self._hedging.call,
+                                        self._client.request)
+        else:
+            request = self._client.request
+
+        try:
+            rbody, rcode, rheaders = self._guarded_call(
+                self.api_base, request, method, abs_url, headers, post_data)
+        finally:
+            _close(post_data)
+
+        self._log_response(method, abs_url, rbody, rcode)
+        return rbody, rcode, rheaders, my_api_key
+
+    def _prepare_request(self, method, url, params, supplied_headers):
+        deadlines.check()
+        my_api_key = self._resolve_api_key()
+
+        abs_url = '%s%s' % (self.api_base, url)
+
+        encoded_params = urllib.urlencode(list(_api_encode(params or {})))
+
+        if method == 'get' or method == 'delete':
+            if params:
+                abs_url = _build_api_url(abs_url, encoded_params)
+            post_data = None
+        elif method == 'post':
+            if supplied_headers is not None and \
+                    supplied_headers.get("Content-Type") == \
+                    "multipart/form-data":
+                generator = MultipartDataGenerator()
+                generator.add_params(params or {})
+                # Stream the body so that files are not copied into memory
+                post_data = generator.get_body()
+                supplied_headers["Content-Type"] = \
+                    "multipart/form-data; boundary=%s" % (generator.boundary,)
+                supplied_headers["Content-Length"] = str(len(post_data))
+            else:
+                post_data = encoded_params
+        else:
+            raise error.APIConnectionError(
+                'Unrecognized HTTP method %r.  This may indicate a bug in the '
+                'Stripe bindings.  Please contact support@stripe.com for '
+                'assistance.' % (method,))
+
+        headers = self.request_headers(my_api_key, method)
+
         if supplied_headers is not None:
             for key, value in supplied_headers.items():
                 headers[key] = value
 
-        rbody, rcode, rheaders = self._client.request(
-            method, abs_url, headers, post_data)
+        return abs_url, headers, post_data, my_api_key
 
+    def _call_client(self, func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except error.APIConnectionError:
+            # A request cut short by the deadline is reported as such
+            deadlines.check()
+            raise
+
+    def _guarded_call(self, api_base, func, *args, **kwargs):
+        # Calls the client through the circuit breaker, if there is one,
+        # counting connection errors and 5xx responses against the host
+        breaker = self._circuit_breaker
+        if breaker is None:
+            return self._call_client(func, *args, **kwargs)
+
+        key = breaker.key(api_base, self.stripe_account)
+        with breaker.guard(key) as attempt:
+            response = self._call_client(func, *args, **kwargs)
+            if response[1] >= 500:
+                attempt.failed()
+        return response
+
+    def _log_response(self, method, abs_url, rbody, rcode):
         util.logger.info('%s %s %d', method.upper(), abs_url, rcode)
         util.logger.debug(
             'API request to %s returned (response code, response body) of '
             '(%d, %r)',
             abs_url, rcode, rbody)
-        return rbody, rcode, rheaders, my_api_key
 
     def interpret_response(self, rbody, rcode, rheaders):
         try:
             if hasattr(rbody, 'decode'):
                 rbody = rbody.decode('utf-8')
-            resp = util.json.loads(rbody)
+            resp = util.load_json(rbody)
         except Exception:
             raise error.APIError(
                 "Invalid response body from API: %s "
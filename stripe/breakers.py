@@ -0,0 +1,213 @@
+import collections
+import threading
+import time
+
+from stripe import error
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """
+    Stops sending requests to a Stripe host that keeps failing, so that
+    callers fail fast instead of each waiting out the full timeout.
+
+    Requests are tracked per API base, and per Stripe account too if
+    `per_account` is set.  Connection errors, 5xx responses and, given
+    `slow_threshold`, responses slower than that many seconds count as
+    failures.  Once at least `min_requests` of the last `window` requests
+    were made and `failure_rate` of them failed, the circuit opens and
+    requests raise CircuitOpenError, an APIConnectionError, without being
+    sent.  After `reset_timeout` seconds it half-opens and lets `probes`
+    requests through: if they all succeed it closes again, and if any
+    fails it reopens.
+
+    Set `stripe.circuit_breaker`, or pass `circuit_breaker` to
+    APIRequestor, to use one.  Listeners added with `add_listener` are
+    called with the circuit's key, an `(api_base, account)` pair, and its
+    old and new states whenever it changes state.
+    """
+
+    def __init__(self, failure_rate=0.5, min_requests=10, window=20,
+                 slow_threshold=None, reset_timeout=30, probes=1,
+                 per_account=False):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.slow_threshold = slow_threshold
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.per_account = per_account
+
+        self._circuits = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def key(self, api_base, account=None):
+        if self.per_account:
+            return api_base, account
+        return api_base, None
+
+    def state(self, key):
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None:
+                return CLOSED
+            return circuit.state
+
+    def stats(self):
+        """
+        Return, for each circuit key, its state and counts of the requests
+        it let through, those that failed, those it rejected and the times
+        it opened.
+        """
+        with self._lock:
+            return dict((key, dict(circuit.stats, state=circuit.state))
+                        for key, circuit in self._circuits.iteritems())
+
+    def guard(self, key):
+        """
+        Return a context manager to wrap a request in.  Entering it
+        raises CircuitOpenError if the request may not be sent; a
+        connection error raised inside it, or a call to its `failed()`,
+        counts the request as failed.  A DeadlineExceededError says
+        nothing about the host, so that request is not counted at all.
+        """
+        return _Attempt(self, key)
+
+    def _acquire(self, key):
+        transitions = []
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None:
+                circuit = self._circuits[key] = _Circuit(self.window)
+
+            if circuit.state == OPEN and \
+                    time.time() - circuit.opened_at >= self.reset_timeout:
+                transitions.append(circuit.move(key, HALF_OPEN))
+
+            if circuit.state == OPEN or (circuit.state == HALF_OPEN and
+                                         circuit.probing >= self.probes):
+                circuit.stats['rejected'] += 1
+                retry_in = self.reset_timeout - (time.time() -
+                                                 circuit.opened_at)
+                rejected = True
+            else:
+                probe = circuit.state == HALF_OPEN
+                if probe:
+                    circuit.probing += 1
+                circuit.stats['requests'] += 1
+                rejected = False
+        self._notify(transitions)
+
+        if rejected:
+            raise error.CircuitOpenError(
+                'Requests to %s have been failing, so the Stripe library '
+                'is not sending any more for now.  It will try again in '
+                '%ds.' % (key[0], max(0, retry_in)))
+        return probe
+
+    def _release(self, key, probe, failed, elapsed):
+        # `failed` is None if the request's outcome is unknown
+        if failed is None:
+            if probe:
+                with self._lock:
+                    self._circuits[key].probing -= 1
+            return
+        if self.slow_threshold is not None and elapsed > self.slow_threshold:
+            failed = True
+
+        transitions = []
+        with self._lock:
+            circuit = self._circuits[key]
+            if failed:
+                circuit.stats['failures'] += 1
+            if probe:
+                circuit.probing -= 1
+
+            # Only probes decide whether a half-open circuit closes
+            if circuit.state == HALF_OPEN and probe:
+                if failed:
+                    transitions.append(circuit.move(key, OPEN))
+                else:
+                    circuit.successes += 1
+                    if circuit.successes >= self.probes:
+                        transitions.append(circuit.move(key, CLOSED))
+            elif circuit.state == CLOSED:
+                circuit.outcomes.append(failed)
+                total = len(circuit.outcomes)
+                if total >= self.min_requests and \
+                        sum(circuit.outcomes) >= self.failure_rate * total:
+                    transitions.append(circuit.move(key, OPEN))
+        self._notify(transitions)
+
+    def _notify(self, transitions):
+        for transition in transitions:
+            for listener in list(self._listeners):
+                listener(*transition)
+
+
+class _Circuit(object):
+
+    def __init__(self, window):
+        self.state = CLOSED
+        self.outcomes = collections.deque(maxlen=window)
+        self.opened_at = None
+        self.probing = 0
+        self.successes = 0
+        self.stats = {
+            'requests': 0,
+            'failures': 0,
+            'rejected': 0,
+            'opened': 0,
+        }
+
+    def move(self, key, state):
+        old_state, self.state = self.state, state
+        self.outcomes.clear()
+        self.successes = 0
+        if state == OPEN:
+            self.opened_at = time.time()
+            self.stats['opened'] += 1
+        return key, old_state, state
+
+
+class _Attempt(object):
+
+    def __init__(self, breaker, key):
+        self._breaker = breaker
+        self._key = key
+        self._failed = False
+
+    def failed(self):
+        self._failed = True
+
+    def __enter__(self):
+        self._probe = self._breaker._acquire(self._key)
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and issubclass(
+                exc_type, (error.DeadlineExceededError,
+                           error.CircuitOpenError)):
+            # The caller ran out of time, or another breaker refused the
+            # request, which says nothing about this host
+            failed = None
+        else:
+            failed = self._failed or (
+                exc_type is not None and
+                issubclass(exc_type, error.APIConnectionError))
+        self._breaker._release(self._key, self._probe, failed,
+                               time.time() - self._start)
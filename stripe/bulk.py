@@ -0,0 +1,175 @@
+import hashlib
+import uuid
+
+from stripe import util, workers
+
+
+class Operation(object):
+    """
+    A single API call to be run by a `BulkExecutor`.
+
+    Subclasses implement `run`, which performs the call with the given
+    idempotency key, and `signature`, a JSON-serializable description of
+    the call from which that key is derived.
+    """
+
+    def __init__(self, idempotency_key=None):
+        self.idempotency_key = idempotency_key
+
+    def run(self, idempotency_key):
+        raise NotImplementedError(
+            'Operation subclasses must implement `run`')
+
+    def signature(self):
+        raise NotImplementedError(
+            'Operation subclasses must implement `signature`')
+
+
+class Create(Operation):
+
+    def __init__(self, klass, api_key=None, stripe_account=None,
+                 idempotency_key=None, **params):
+        super(Create, self).__init__(idempotency_key)
+        self.klass = klass
+        self.api_key = api_key
+        self.stripe_account = stripe_account
+        self.params = params
+
+    def run(self, idempotency_key):
+        return self.klass.create(api_key=self.api_key,
+                                 idempotency_key=idempotency_key,
+                                 stripe_account=self.stripe_account,
+                                 **self.params)
+
+    def signature(self):
+        return ['create', self.klass.class_url(), self.params]
+
+
+class Save(Operation):
+
+    def __init__(self, obj, idempotency_key=None):
+        super(Save, self).__init__(idempotency_key)
+        self.obj = obj
+
+    def run(self, idempotency_key):
+        return self.obj.save(idempotency_key=idempotency_key)
+
+    def signature(self):
+        return ['save', self.obj.instance_url(), self.obj.serialize(None)]
+
+
+class Delete(Operation):
+
+    def __init__(self, obj, **params):
+        super(Delete, self).__init__()
+        self.obj = obj
+        self.params = params
+
+    def run(self, idempotency_key):
+        # DELETE requests are idempotent already, so no key is sent
+        return self.obj.delete(**self.params)
+
+    def signature(self):
+        return ['delete', self.obj.instance_url(), self.params]
+
+
+class Call(Operation):
+    """
+    Calls a bound resource method, e.g. `Call(charge.capture, amount=500)`.
+    The idempotency key is passed as the `idempotency_key` keyword argument
+    unless `send_idempotency_key` is False.
+    """
+
+    def __init__(self, method, *args, **kwargs):
+        idempotency_key = kwargs.pop('idempotency_key', None)
+        self.send_idempotency_key = kwargs.pop('send_idempotency_key', True)
+        super(Call, self).__init__(idempotency_key)
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self, idempotency_key):
+        kwargs = dict(self.kwargs)
+        if self.send_idempotency_key:
+            kwargs['idempotency_key'] = idempotency_key
+        return self.method(*self.args, **kwargs)
+
+    def signature(self):
+        target = getattr(self.method, 'im_self', None)
+        if target is None:
+            target = getattr(self.method, '__self__', None)
+
+        if hasattr(target, 'instance_url'):
+            if isinstance(target, type):
+                location = target.class_url()
+            else:
+                location = target.instance_url()
+        else:
+            location = None
+
+        return ['call', self.method.__name__, location, list(self.args),
+                self.kwargs]
+
+
+class BulkExecutor(object):
+    """
+    Runs many operations with bounded concurrency.
+
+    Operations are pulled from the input iterable through a bounded queue,
+    so a producer reading from a database or file never gets more than
+    `queue_size` operations ahead of the workers.  Every operation gets an
+    idempotency key derived from the batch id, its position in the input
+    and the call itself.  See `run` for choosing the batch id.
+    """
+
+    def __init__(self, concurrency=10, queue_size=None, batch_id=None):
+        self.pool = workers.WorkerPool(concurrency, queue_size)
+        self.batch_id = batch_id
+
+    def idempotency_key(self, index, operation, batch_id=None):
+        if operation.idempotency_key is not None:
+            return operation.idempotency_key
+
+        if batch_id is None:
+            batch_id = self.batch_id
+        signature = util.json.dumps([batch_id, index,
+                                     operation.signature()],
+                                    sort_keys=True, default=str)
+        digest = hashlib.sha1(util.utf8(signature)).hexdigest()
+
+        if batch_id is not None:
+            return '%s-%s' % (batch_id, digest)
+        return digest
+
+    def run(self, operations):
+        """
+        Yield a `stripe.workers.WorkResult` for each operation as soon as it
+        completes.  `result.item` is the operation, and `result.value` or
+        `result.error` holds the outcome.
+
+        Without a `batch_id`, each run gets a random one, so running the
+        same operations again really does run them again rather than
+        replaying the first run's results, which Stripe keeps for 24
+        hours.  To resume a batch that was cut short, by a crash say, pass
+        the same stable `batch_id`, such as the billing period, to both
+        runs: operations the first run completed then aren't repeated.
+        """
+        batch_id = self.batch_id
+        if batch_id is None:
+            batch_id = uuid.uuid4().hex
+        keyed = ((self.idempotency_key(index, operation, batch_id), operation)
+                 for index, operation in enumerate(operations))
+
+        for result in self.pool.imap_unordered(_run_keyed, keyed):
+            result.item = result.item[1]
+            yield result
+
+
+def _run_keyed(keyed):
+    idempotency_key, operation = keyed
+    return operation.run(idempotency_key)
+
+
+def run(operations, concurrency=10, queue_size=None, batch_id=None):
+    executor = BulkExecutor(concurrency, queue_size, batch_id)
+    return executor.run(operations)
@@ -0,0 +1,145 @@
+import threading
+import time
+
+
+class ObjectCache(object):
+    """
+    A thread-safe, size-bounded LRU cache of StripeObjects keyed by id.
+
+    Install one as `stripe.object_cache` to let bulk operations such as
+    `APIResource.retrieve_many` skip objects that were already fetched.
+    Cached objects are shared between callers, so treat them as read-only.
+    """
+
+    def __init__(self, max_size=1000, ttl=None):
+        if max_size < 1:
+            raise ValueError(
+                'ObjectCache max_size must be at least 1, got %r' %
+                (max_size,))
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        # Circular doubly linked list of [prev, next, key, value, expires]
+        # entries, ordered from least to most recently used.
+        self._root = root = []
+        root[:] = [root, root, None, None, None]
+
+    def get(self, id, klass=None):
+        with self._lock:
+            link = self._entries.get(id)
+            if link is None:
+                return None
+
+            expires = link[4]
+            if expires is not None and expires <= time.time():
+                self._unlink(link)
+                del self._entries[id]
+                return None
+
+            self._unlink(link)
+            self._append(link)
+            value = link[3]
+
+        if klass is not None and not isinstance(value, klass):
+            return None
+        return value
+
+    def set(self, obj, id=None):
+        if id is None:
+            id = obj.get('id')
+        if not id:
+            return
+
+        if self.ttl is not None:
+            expires = time.time() + self.ttl
+        else:
+            expires = None
+
+        with self._lock:
+            link = self._entries.get(id)
+            if link is not None:
+                self._unlink(link)
+                link[3] = obj
+                link[4] = expires
+            else:
+                if len(self._entries) >= self.max_size:
+                    oldest = self._root[1]
+                    self._unlink(oldest)
+                    del self._entries[oldest[2]]
+                link = [None, None, id, obj, expires]
+                self._entries[id] = link
+            self._append(link)
+
+    def delete(self, id):
+        with self._lock:
+            link = self._entries.pop(id, None)
+            if link is not None:
+                self._unlink(link)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._root[:] = [self._root, self._root, None, None, None]
+
+    def __contains__(self, id):
+        return self.get(id) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _append(self, link):
+        root = self._root
+        last = root[0]
+        link[0] = last
+        link[1] = root
+        last[1] = root[0] = link
+
+    def _unlink(self, link):
+        prev, next = link[0], link[1]
+        prev[1] = next
+        next[0] = prev
+
+
+class SingleFlight(object):
+    """
+    Collapses concurrent calls for the same key into one: while a call for
+    a key is in flight, other callers wait for and share its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+            return call.value
+        except Exception, e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
@@ -0,0 +1,552 @@
+import array
+import datetime
+import itertools
+
+from stripe import util
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TIMESTAMP_FIELDS = frozenset([
+    'available_on', 'created', 'date', 'period_end', 'period_start',
+])
+
+# The fields whose values are interned on decode are the ones with few
+# distinct values, which makes them good candidates for dictionary
+# encoding too.
+CATEGORICAL_FIELDS = util.INTERNED_VALUE_KEYS
+
+SECONDS_PER_DAY = 60 * 60 * 24
+
+# Records are read in chunks so that each column can be filled with one
+# list comprehension per chunk rather than a method call per value.
+CHUNK_SIZE = 10000
+
+
+def _int64_typecode():
+    # Amounts and timestamps need 64 bits, but 'l' is only 32 bits wide on
+    # some platforms, Windows included, and Python 2 has no 'q'
+    for typecode in ('q', 'l'):
+        try:
+            if array.array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+
+INT64_TYPECODE = _int64_typecode()
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError(
+            'This operation requires numpy.  HINT: Try installing it '
+            'with `pip install numpy`, or use `to_columns` instead of '
+            '`to_numpy`.')
+
+
+def _as_numpy(storage, dtype):
+    if not isinstance(storage, array.array):
+        return numpy.array(storage, dtype=dtype)
+    # frombuffer reads the array's memory directly, which is much faster
+    # than iterating over it; astype then copies it so that the result
+    # does not share memory with a column that may still grow.
+    return numpy.frombuffer(storage, dtype=storage.typecode).astype(dtype)
+
+
+class Column(object):
+    """
+    A column of values for one (dotted) field.  Missing values are stored
+    as a placeholder and flagged in `nulls`, which is only allocated once a
+    value is actually missing.
+    """
+    kind = 'object'
+
+    def __init__(self, name):
+        self.name = name
+        self.nulls = None
+        self.values = self._new_storage()
+
+    def _new_storage(self):
+        return []
+
+    def _encode_all(self, values, has_nulls):
+        return values
+
+    def _decode(self, value):
+        return value
+
+    def _decode_all(self, values):
+        return values
+
+    def extend(self, values):
+        has_nulls = None in values
+        if has_nulls:
+            if self.nulls is None:
+                self.nulls = bytearray(len(self.values))
+            self.nulls.extend([value is None for value in values])
+        elif self.nulls is not None:
+            self.nulls.extend(bytearray(len(values)))
+        self.values.extend(self._encode_all(values, has_nulls))
+
+    def append(self, value):
+        self.extend([value])
+
+    def append_nulls(self, count):
+        self.extend([None] * count)
+
+    def is_null(self, i):
+        return self.nulls is not None and bool(self.nulls[i])
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if self.is_null(i):
+            return None
+        return self._decode(self.values[i])
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self):
+        values = self._decode_all(self.values)
+        if self.nulls is None:
+            return list(values)
+        return [None if null else value
+                for value, null in itertools.izip(values, self.nulls)]
+
+    def to_numpy(self):
+        _require_numpy()
+        return self._masked(numpy.array(self.values, dtype=object))
+
+    def _masked(self, values):
+        if self.nulls is None:
+            return values
+        mask = numpy.frombuffer(bytes(self.nulls), dtype=numpy.uint8)
+        return numpy.ma.masked_array(values, mask=mask.astype(bool))
+
+    def __repr__(self):
+        return '<%s %s: %d values>' % (type(self).__name__, self.name,
+                                       len(self))
+
+
+class IntColumn(Column):
+    kind = 'int'
+
+    def _new_storage(self):
+        # Without a 64-bit array type, values are kept in a plain list
+        if INT64_TYPECODE is None:
+            return []
+        return array.array(INT64_TYPECODE)
+
+    def _encode_all(self, values, has_nulls):
+        if has_nulls:
+            values = [0 if value is None else value for value in values]
+        if not isinstance(self.values, array.array):
+            return [self._to_int(value) for value in values]
+        try:
+            return array.array(self.values.typecode, values)
+        except TypeError:
+            return array.array(self.values.typecode,
+                               [self._to_int(value) for value in values])
+
+    def _to_int(self, value):
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(
+                'The %s field has the non-integer value %r, which an %s '
+                'column would truncate.  HINT: Pass kinds={%r: \'float\'} '
+                'to store it as a float.' % (self.name, value, self.kind,
+                                             self.name))
+        return int(value)
+
+    def to_numpy(self):
+        _require_numpy()
+        return self._masked(_as_numpy(self.values, numpy.int64))
+
+
+class TimestampColumn(IntColumn):
+    """
+    Unix timestamps, stored as integer seconds.
+    """
+    kind = 'timestamp'
+
+    def _decode(self, value):
+        return datetime.datetime.utcfromtimestamp(value)
+
+    def _decode_all(self, values):
+        return [datetime.datetime.utcfromtimestamp(value)
+                for value in values]
+
+    def to_numpy(self):
+        _require_numpy()
+        values = _as_numpy(self.values, numpy.int64)
+        return self._masked(values.astype('datetime64[s]'))
+
+
+class FloatColumn(Column):
+    kind = 'float'
+
+    def _new_storage(self):
+        return array.array('d')
+
+    def _encode_all(self, values, has_nulls):
+        if has_nulls:
+            values = [0.0 if value is None else value for value in values]
+        return array.array('d', values)
+
+    def to_numpy(self):
+        _require_numpy()
+        return self._masked(_as_numpy(self.values, numpy.float64))
+
+
+class BoolColumn(IntColumn):
+    kind = 'bool'
+
+    def _new_storage(self):
+        return array.array('b')
+
+    def _decode(self, value):
+        return bool(value)
+
+    def _decode_all(self, values):
+        return [bool(value) for value in values]
+
+    def to_numpy(self):
+        _require_numpy()
+        return self._masked(_as_numpy(self.values, bool))
+
+
+class CategoryColumn(Column):
+    """
+    A dictionary-encoded column: `values` holds integer codes indexing
+    into `categories`.
+    """
+    kind = 'category'
+
+    def __init__(self, name):
+        super(CategoryColumn, self).__init__(name)
+        self.categories = []
+        self._codes = {None: -1}
+
+    def _new_storage(self):
+        return array.array('i')
+
+    def _encode_all(self, values, has_nulls):
+        codes = self._codes
+        if not codes.viewkeys() >= set(values):
+            for value in values:
+                if value not in codes:
+                    codes[value] = len(self.categories)
+                    self.categories.append(value)
+        return array.array('i', [codes[value] for value in values])
+
+    def _decode(self, value):
+        return self.categories[value]
+
+    def _decode_all(self, values):
+        # Missing values (-1) decode to the last category here, but are
+        # masked out by to_list.
+        categories = self.categories
+        return [categories[value] for value in values]
+
+    def to_numpy(self):
+        _require_numpy()
+        return DictionaryArray(_as_numpy(self.values, numpy.int32),
+                               numpy.array(self.categories, dtype=object))
+
+
+class DictionaryArray(object):
+    """
+    NumPy form of a CategoryColumn.  Missing values have the code -1.
+    """
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def decode(self):
+        values = numpy.empty(len(self.codes), dtype=object)
+        present = self.codes >= 0
+        values[present] = self.categories[self.codes[present]]
+        return values
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def _column_for(name, value, kinds):
+    kind = kinds.get(name)
+    if kind is None:
+        if name in TIMESTAMP_FIELDS:
+            kind = 'timestamp'
+        elif name in CATEGORICAL_FIELDS and isinstance(value, basestring):
+            kind = 'category'
+        elif isinstance(value, bool):
+            kind = 'bool'
+        elif isinstance(value, (int, long)):
+            kind = 'int'
+        elif isinstance(value, float):
+            kind = 'float'
+        else:
+            kind = 'object'
+    return COLUMN_KINDS[kind](name)
+
+
+COLUMN_KINDS = {
+    'bool': BoolColumn,
+    'category': CategoryColumn,
+    'float': FloatColumn,
+    'int': IntColumn,
+    'object': Column,
+    'timestamp': TimestampColumn,
+}
+
+
+def _scalar_fields(record, prefix=''):
+    fields = []
+    for key, value in sorted(record.iteritems()):
+        if isinstance(value, dict):
+            fields.extend(_scalar_fields(value, '%s%s.' % (prefix, key)))
+        elif not isinstance(value, list):
+            fields.append(prefix + key)
+    return fields
+
+
+def _lookup(record, path):
+    value = record
+    for part in path:
+        # Anything else, like an unexpanded id, has no fields
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _records(source):
+    # A list page (decoded JSON or a ListObject) rather than an iterable
+    # of records
+    if isinstance(source, dict) and isinstance(source.get('data'), list):
+        return source['data']
+    return source
+
+
+class Columns(object):
+    """
+    Typed columns materialized from an iterable of records.  Index by
+    field name to get a Column.
+    """
+
+    def __init__(self, columns, length):
+        self.columns = columns
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def keys(self):
+        return self.columns.keys()
+
+    def to_numpy(self):
+        return dict((name, column.to_numpy())
+                    for name, column in self.columns.iteritems())
+
+    def group_sum(self, values, by, time_field='created'):
+        return group_sum(self, values, by, time_field)
+
+
+def to_columns(records, fields=None, kinds=None):
+    """
+    Build typed columns straight from decoded JSON records, such as those
+    yielded by `stripe.export.iter_records`, without creating
+    StripeObjects.  Nested fields are addressed with dots, e.g.
+    `source.brand`.  Without `fields`, every scalar field of the first
+    record is used.
+
+    Integers go into compact integer arrays, `created` and the other
+    TIMESTAMP_FIELDS into timestamp columns, and strings of
+    CATEGORICAL_FIELDS into dictionary-encoded columns.  Pass `kinds` (a
+    field to kind mapping, see COLUMN_KINDS) to override the inference.
+    """
+    kinds = kinds or {}
+    columns = {}
+    paths = None
+    length = 0
+    records = iter(_records(records))
+
+    while True:
+        chunk = list(itertools.islice(records, CHUNK_SIZE))
+        if not chunk:
+            break
+
+        if paths is None:
+            if fields is None:
+                fields = _scalar_fields(chunk[0])
+            paths = [(name, name.split('.')) for name in fields]
+
+        for name, path in paths:
+            if len(path) == 1:
+                key = path[0]
+                values = [record.get(key) for record in chunk]
+            else:
+                values = [_lookup(record, path) for record in chunk]
+
+            column = columns.get(name)
+            if column is None:
+                first = next((v for v in values if v is not None), None)
+                if first is None:
+                    continue
+                column = columns[name] = _column_for(name, first, kinds)
+                column.append_nulls(length)
+            column.extend(values)
+
+        length += len(chunk)
+
+    for name in fields or []:
+        if name not in columns:
+            column = columns[name] = Column(name)
+            column.append_nulls(length)
+
+    return Columns(columns, length)
+
+
+def to_numpy(records, fields=None, kinds=None):
+    """
+    Like `to_columns`, but return a dict of NumPy arrays: int64 for
+    integers, datetime64[s] for timestamps and DictionaryArrays for
+    categorical strings.
+    """
+    _require_numpy()
+    return to_columns(records, fields, kinds).to_numpy()
+
+
+def _group_keys(columns, by, time_field):
+    keys = []
+    for name in by:
+        if name == 'day':
+            column = columns[time_field]
+            keys.append(('day', column))
+        else:
+            keys.append((name, columns[name]))
+    return keys
+
+
+def _decode_key(name, column, value):
+    if name == 'day':
+        return datetime.datetime.utcfromtimestamp(
+            value * SECONDS_PER_DAY).date()
+    elif isinstance(column, CategoryColumn):
+        if value < 0:
+            return None
+        return column.categories[value]
+    return value
+
+
+def group_sum(columns, values, by, time_field='created'):
+    """
+    Sum the numeric columns `values` per group of `by` fields, where the
+    pseudo-field `day` is the UTC day of `time_field`:
+
+        group_sum(columns, ['amount', 'fee', 'net'], ['currency', 'day'])
+
+    Returns {group key tuple: {value field: sum}}.  Uses vectorized NumPy
+    arithmetic when it is available and every column involved is typed.
+    """
+    if not isinstance(columns, Columns):
+        columns = to_columns(columns)
+    if not len(columns):
+        return {}
+
+    keys = _group_keys(columns, by, time_field)
+    typed = all(isinstance(column.values, array.array) for column in
+                [column for _, column in keys] +
+                [columns[name] for name in values])
+    if numpy is not None and typed:
+        return _group_sum_numpy(columns, values, keys)
+    return _group_sum_python(columns, values, keys)
+
+
+def _group_sum_python(columns, values, keys):
+    sums = {}
+    value_columns = [(name, columns[name]) for name in values]
+    key_values = []
+    for name, column in keys:
+        if name == 'day':
+            key_values.append([v // SECONDS_PER_DAY for v in column.values])
+        else:
+            key_values.append(column.values)
+
+    for i in xrange(len(columns)):
+        key = tuple(k[i] for k in key_values)
+        group = sums.get(key)
+        if group is None:
+            group = sums[key] = dict((name, _zero(column))
+                                     for name, column in value_columns)
+        for name, column in value_columns:
+            if not column.is_null(i):
+                group[name] += column.values[i]
+
+    return dict((_decoded_group(keys, key), group)
+                for key, group in sums.iteritems())
+
+
+def _group_sum_numpy(columns, values, keys):
+    key_arrays = []
+    for name, column in keys:
+        raw = _as_numpy(column.values, numpy.int64)
+        if name == 'day':
+            raw = raw // SECONDS_PER_DAY
+        key_arrays.append(raw)
+
+    order = numpy.lexsort(key_arrays[::-1])
+    sorted_keys = [k[order] for k in key_arrays]
+
+    changed = numpy.zeros(len(order), dtype=bool)
+    changed[0] = True
+    for k in sorted_keys:
+        changed[1:] |= k[1:] != k[:-1]
+    starts = numpy.flatnonzero(changed)
+
+    sums = {}
+    for name in values:
+        column = columns[name]
+        # Floats are summed as floats, not truncated to integers
+        raw = _as_numpy(column.values, _dtype(column))
+        if column.nulls is not None:
+            raw[numpy.frombuffer(bytes(column.nulls),
+                                 dtype=numpy.uint8).astype(bool)] = 0
+        sums[name] = numpy.add.reduceat(raw[order], starts)
+
+    result = {}
+    for group, start in enumerate(starts):
+        key = tuple(int(k[start]) for k in sorted_keys)
+        result[_decoded_group(keys, key)] = dict(
+            (name, type(_zero(columns[name]))(sums[name][group]))
+            for name in values)
+    return result
+
+
+def _zero(column):
+    if isinstance(column, FloatColumn):
+        return 0.0
+    return 0
+
+
+def _dtype(column):
+    if isinstance(column, FloatColumn):
+        return numpy.float64
+    return numpy.int64
+
+
+def _decoded_group(keys, key):
+    return tuple(_decode_key(name, column, value)
+                 for (name, column), value in zip(keys, key))
@@ -0,0 +1,104 @@
+import contextlib
+import threading
+import time
+
+from stripe import error
+
+_local = threading.local()
+
+
+class Deadline(object):
+    """
+    A time budget for the API calls made while it is in effect, either
+    passed to `APIRequestor.request` or entered as a context:
+
+        with stripe.Deadline(10, connect_timeout=2):
+            customer = stripe.Customer.retrieve('cus_123')
+            customer.charges()
+
+    The clock starts when the deadline is created.  Every request's
+    connect and read timeouts are cut down to what is left of the budget,
+    so later requests and retries get less time than earlier ones, and
+    once the budget is spent calls fail straight away with a
+    DeadlineExceededError.  Deadlines nest, with the one that runs out
+    first taking effect, and are inherited by WorkerPool threads.
+    """
+
+    def __init__(self, timeout, connect_timeout=None):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.expires = time.time() + timeout
+
+    def remaining(self):
+        return max(0.0, self.expires - time.time())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired():
+            raise error.DeadlineExceededError(
+                'The %gs deadline for requests to Stripe has passed.' %
+                (self.timeout,))
+
+    def timeouts(self, connect, read):
+        """
+        Return the `connect` and `read` timeouts, in seconds, cut down to
+        the time left.  Raises DeadlineExceededError if there is none.
+        """
+        self.check()
+        remaining = self.remaining()
+        if self.connect_timeout is not None:
+            connect = min(connect, self.connect_timeout)
+        return min(connect, remaining), min(read, remaining)
+
+    def __enter__(self):
+        _stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _stack().remove(self)
+
+    def __repr__(self):
+        return '<Deadline %gs, %.3gs left>' % (
+            self.timeout, self.remaining())
+
+
+def current():
+    """
+    Return the deadline in effect on this thread that runs out first, or
+    None.
+    """
+    stack = _stack()
+    if not stack:
+        return None
+    return min(stack, key=lambda deadline: deadline.expires)
+
+
+def check():
+    """
+    Raise DeadlineExceededError if the current deadline has passed.
+    """
+    deadline = current()
+    if deadline is not None:
+        deadline.check()
+
+
+@contextlib.contextmanager
+def using(deadline):
+    """
+    Put `deadline` in effect on this thread, if it isn't None.
+    """
+    if deadline is None:
+        yield
+    else:
+        with deadline:
+            yield
+
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
@@ -0,0 +1,243 @@
+import collections
+import hashlib
+import math
+import struct
+import threading
+import time
+
+
+class MemoryDedupeStore(object):
+    """
+    Remembers the ids (of Events, typically) that were already processed.
+
+    With `max_size`, only the most recently added ids are kept, so an id
+    seen long ago may be processed again.  Consumers that deliver at least
+    once tolerate that.
+    """
+
+    def __init__(self, max_size=None):
+        if max_size is not None and max_size < 1:
+            raise ValueError(
+                'MemoryDedupeStore max_size must be at least 1, got %r' %
+                (max_size,))
+
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._ids = set()
+        self._order = collections.deque()
+
+    def seen(self, id):
+        return id in self._ids
+
+    __contains__ = seen
+
+    def add(self, id):
+        with self._lock:
+            self._add(id)
+
+    def check_and_add(self, id):
+        """
+        Record `id` and return whether it had been seen before, atomically.
+        """
+        with self._lock:
+            if id in self._ids:
+                return True
+            self._add(id)
+            return False
+
+    def _add(self, id):
+        if id in self._ids:
+            return
+        self._ids.add(id)
+        if self.max_size is not None:
+            self._order.append(id)
+            while len(self._order) > self.max_size:
+                self._ids.discard(self._order.popleft())
+
+    def __len__(self):
+        return len(self._ids)
+
+
+_HASH_STRUCT = struct.Struct('<QQ')
+
+
+def bloom_parameters(capacity, error_rate):
+    """
+    Return (bits, hashes) for a Bloom filter holding `capacity` items at
+    the given false positive rate.
+    """
+    if not 0 < error_rate < 1:
+        raise ValueError('error_rate must be between 0 and 1, got %r' %
+                         (error_rate,))
+    capacity = max(1, int(capacity))
+    bits = int(math.ceil(-capacity * math.log(error_rate) /
+                         (math.log(2) ** 2)))
+    hashes = max(1, int(round(float(bits) / capacity * math.log(2))))
+    return bits, hashes
+
+
+def _positions(key, num_bits, num_hashes):
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    h1, h2 = _HASH_STRUCT.unpack(hashlib.md5(key).digest())
+    h2 |= 1
+    return [(h1 + i * h2) % num_bits for i in xrange(num_hashes)]
+
+
+class BloomFilter(object):
+    """
+    A fixed size Bloom filter over a bytearray.  Items are positioned by
+    double hashing of one MD5 digest.
+    """
+
+    def __init__(self, bits, hashes):
+        self.num_bits = max(8, bits)
+        self.num_hashes = hashes
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        return _positions(key, self.num_bits, self.num_hashes)
+
+    def add_positions(self, positions):
+        bits = self.bits
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def has_positions(self, positions):
+        bits = self.bits
+        for position in positions:
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        self.add_positions(self.positions(key))
+
+    def __contains__(self, key):
+        return self.has_positions(self.positions(key))
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+
+class BloomDedupeStore(object):
+    """
+    A dedupe store with bounded memory for long-running consumers, in
+    place of MemoryDedupeStore whose exact set grows with every id.
+
+    Ids are kept for roughly `window` seconds in a ring of `buckets` Bloom
+    filters, each filled for `window / buckets` seconds; the oldest filter
+    is dropped as a new one starts.  Each filter is sized for an even
+    share of the `capacity` ids expected per window, so that a lookup
+    across all of them is wrong with a probability of about `error_rate`.
+    With `max_bytes`, filters are shrunk to fit and the real error rate,
+    `expected_error_rate`, is higher.
+
+    A Bloom filter never misses an id it has seen but can claim to have
+    seen one it has not, which would drop an event.  Pass `confirm`, a
+    callable taking an id and returning whether it was really seen (for
+    instance `Mirror.has_event`), to check positives exactly.  It is
+    called from whichever thread checks the id, without the store's lock
+    held.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001, window=259200,
+                 buckets=3, max_bytes=None, confirm=None, clock=time.time):
+        if buckets < 1:
+            raise ValueError(
+                'BloomDedupeStore buckets must be at least 1, got %r' %
+                (buckets,))
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self.buckets = buckets
+        self.bucket_seconds = float(window) / buckets
+        self.confirm = confirm
+        self.clock = clock
+
+        per_bucket = int(math.ceil(float(capacity) / buckets))
+        bits, hashes = bloom_parameters(per_bucket, error_rate / buckets)
+        if max_bytes is not None:
+            max_bits = int(max_bytes) * 8 // buckets
+            if max_bits < 8:
+                raise ValueError(
+                    'max_bytes of %r is too small for %d buckets' %
+                    (max_bytes, buckets))
+            if bits > max_bits:
+                bits = max_bits
+                hashes = max(1, int(round(
+                    float(bits) / per_bucket * math.log(2))))
+        self.num_bits = max(8, bits)
+        self.num_hashes = hashes
+
+        self._lock = threading.Lock()
+        # (bucket number, BloomFilter) pairs, oldest first
+        self._filters = collections.deque()
+
+    @property
+    def expected_error_rate(self):
+        n = float(self.capacity) / self.buckets
+        k = self.num_hashes
+        per_filter = (1 - math.exp(-k * n / self.num_bits)) ** k
+        return min(1.0, per_filter * self.buckets)
+
+    @property
+    def nbytes(self):
+        return sum(bloom.nbytes for _, bloom in self._filters)
+
+    def _rotate(self):
+        current = int(self.clock() // self.bucket_seconds)
+        filters = self._filters
+        while filters and filters[0][0] <= current - self.buckets:
+            filters.popleft()
+        if not filters or filters[-1][0] != current:
+            filters.append((current, BloomFilter(self.num_bits,
+                                                 self.num_hashes)))
+        return filters[-1][1]
+
+    def _maybe_seen(self, positions):
+        for _, bloom in self._filters:
+            if bloom.has_positions(positions):
+                return True
+        return False
+
+    def _confirmed(self, id):
+        # Called without the lock, so that a slow check, like a database
+        # query, doesn't hold up every other lookup
+        if self.confirm is None:
+            return True
+        return bool(self.confirm(id))
+
+    def seen(self, id):
+        positions = _positions(id, self.num_bits, self.num_hashes)
+        with self._lock:
+            self._rotate()
+            maybe_seen = self._maybe_seen(positions)
+        return maybe_seen and self._confirmed(id)
+
+    __contains__ = seen
+
+    def add(self, id):
+        positions = _positions(id, self.num_bits, self.num_hashes)
+        with self._lock:
+            self._rotate().add_positions(positions)
+
+    def check_and_add(self, id):
+        positions = _positions(id, self.num_bits, self.num_hashes)
+        with self._lock:
+            current = self._rotate()
+            if not self._maybe_seen(positions):
+                current.add_positions(positions)
+                return False
+
+        if self._confirmed(id):
+            return True
+        self.add(id)
+        return False
+
+    def __len__(self):
+        return sum(bloom.count for _, bloom in self._filters)
@@ -0,0 +1,136 @@
+import re
+import threading
+import warnings
+
+from stripe import api_requestor
+
+# Path segments that look like object ids, e.g. `cus_6jEGA5j3G4xs` or
+# `ch_16Ttie2eZvKYlo2C`, as opposed to `application_fees`.
+_ID_SEGMENT = re.compile(r'^[a-z]+_(?=[a-z]*[A-Z0-9])[A-Za-z0-9]+$')
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+class NPlusOneDetector(object):
+    """
+    Development aid that counts API calls per calling line of code and
+    warns when one line keeps retrieving single objects, the telltale sign
+    of an N+1 loop such as
+
+        for invoice in stripe.Invoice.all().data:
+            customer = stripe.Customer.retrieve(invoice.customer)
+
+    Use it as a context manager around a test or a request handler:
+
+        with NPlusOneDetector(threshold=5) as detector:
+            ...
+        detector.report()
+
+    It is not meant to be left on in production.
+    """
+
+    def __init__(self, threshold=5):
+        self.threshold = threshold
+        self.counts = {}
+        self._warned = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        api_requestor.add_request_observer(self.observe)
+
+    def stop(self):
+        api_requestor.remove_request_observer(self.observe)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def observe(self, method, url, params, call_site):
+        template = url_template(url)
+        key = (call_site, method, template)
+
+        with self._lock:
+            count = self.counts.get(key, 0) + 1
+            self.counts[key] = count
+            should_warn = (method == 'get' and
+                           template.endswith('/{id}') and
+                           count >= self.threshold and
+                           key not in self._warned)
+            if should_warn:
+                self._warned.add(key)
+
+        if should_warn:
+            self.warn(call_site, template, count)
+
+    def warn(self, call_site, template, count):
+        message = (
+            'GET %s was called %d times from the same line of code.  This '
+            'is likely an N+1 pattern: consider expanding the object on the '
+            'list call that returned these ids instead, e.g. with '
+            '`stripe.diagnostics.all_expanded`.' % (template, count))
+
+        if call_site is None:
+            warnings.warn(message, NPlusOneWarning)
+        else:
+            filename, lineno, _ = call_site
+            warnings.warn_explicit(message, NPlusOneWarning, filename,
+                                   lineno)
+
+    def report(self):
+        """
+        Return (call_site, method, url_template, count) tuples for every
+        line that made more than one call, busiest first.
+        """
+        with self._lock:
+            rows = [key + (count,) for key, count in self.counts.iteritems()
+                    if count > 1]
+        rows.sort(key=lambda row: -row[3])
+        return rows
+
+
+def url_template(url):
+    path = url.split('?', 1)[0]
+    segments = path.split('/')
+    return '/'.join(_ID_SEGMENT.match(segment) and '{id}' or segment
+                    for segment in segments)
+
+
+def expand_params(fields, params=None, prefix='data.'):
+    """
+    Return a copy of `params` asking the API to expand `fields` on every
+    object of a list response.
+    """
+    params = dict(params or {})
+    expand = list(params.get('expand') or [])
+
+    for field in fields:
+        if not field.startswith(prefix):
+            field = prefix + field
+        if field not in expand:
+            expand.append(field)
+
+    params['expand'] = expand
+    return params
+
+
+def all_expanded(klass, fields, api_key=None, stripe_account=None,
+                 **params):
+    """
+    List `klass` with `fields` expanded in place, so that
+
+        for invoice in stripe.Invoice.all().data:
+            customer = stripe.Customer.retrieve(invoice.customer)
+
+    becomes a single request:
+
+        for invoice in all_expanded(stripe.Invoice, ['customer']).data:
+            customer = invoice.customer
+    """
+    return klass.all(api_key=api_key, stripe_account=stripe_account,
+                     **expand_params(fields, params))
@@ -34,6 +34,14 @@ class APIConnectionError(StripeError):
     pass
 
 
+class DeadlineExceededError(APIConnectionError):
+    pass
+
+
+class CircuitOpenError(APIConnectionError):
+    pass
+
+
 class CardError(StripeError):
 
     def __init__(self, message, param, code, http_body=None,
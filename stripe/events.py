@@ -0,0 +1,371 @@
+import os
+import Queue
+import threading
+
+from stripe import api_requestor, export, resource, util
+
+_DONE = object()
+
+
+def iter_event_pages(cursor, api_key=None, stripe_account=None,
+                     page_size=100):
+    """
+    Yield lists of the decoded Events created after the Event `cursor`,
+    oldest first.  Without a cursor, every Event the API still retains is
+    returned.
+    """
+    if not cursor:
+        events = list(export.iter_records(
+            resource.Event, api_key=api_key, stripe_account=stripe_account,
+            page_size=page_size))
+        if events:
+            yield list(reversed(events))
+        return
+
+    requestor = api_requestor.APIRequestor(api_key, account=stripe_account)
+    while True:
+        # Pages are newest first, and `ending_before` returns the page of
+        # events that immediately follow the cursor.
+        page, _ = requestor.request(
+            'get', resource.Event.class_url(),
+            {'limit': page_size, 'ending_before': cursor})
+        data = page.get('data') or []
+        if not data:
+            return
+
+        yield list(reversed(data))
+        if not page.get('has_more'):
+            return
+        cursor = data[0]['id']
+
+
+def latest_event_id(api_key=None, stripe_account=None):
+    requestor = api_requestor.APIRequestor(api_key, account=stripe_account)
+    page, _ = requestor.request('get', resource.Event.class_url(),
+                                {'limit': 1})
+    data = page.get('data') or []
+    return data and data[0]['id'] or None
+
+
+class MemoryCheckpoint(object):
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class FileCheckpoint(object):
+    """
+    Stores the id of the last processed Event in a file, replacing it
+    atomically so that a crash never leaves a partial id behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def get(self):
+        try:
+            with open(self.path) as f:
+                return f.read().strip() or None
+        except IOError:
+            return None
+
+    def set(self, value):
+        tmp = '%s.tmp' % (self.path,)
+        with open(tmp, 'w') as f:
+            f.write(value)
+        os.rename(tmp, self.path)
+
+
+class ConsumeSummary(object):
+
+    def __init__(self):
+        self.handled = []
+        self.duplicates = []
+        # (event, error) pairs
+        self.failed = []
+        # Events held back because an earlier event for the same object
+        # failed; they are delivered again with it.
+        self.deferred = []
+        self.checkpoint = None
+
+    @property
+    def ok(self):
+        return not (self.failed or self.deferred)
+
+    def merge(self, other):
+        self.handled.extend(other.handled)
+        self.duplicates.extend(other.duplicates)
+        self.failed.extend(other.failed)
+        self.deferred.extend(other.deferred)
+        self.checkpoint = other.checkpoint or self.checkpoint
+
+    def __repr__(self):
+        return ('<ConsumeSummary handled=%d duplicates=%d failed=%d '
+                'deferred=%d>' % (len(self.handled), len(self.duplicates),
+                                  len(self.failed), len(self.deferred)))
+
+
+class _Batch(object):
+
+    def __init__(self, events):
+        self.events = events
+        self.outcomes = [None] * len(events)
+        self.errors = {}
+        self.failed_keys = set()
+        self.remaining = len(events)
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if not events:
+            self.done.set()
+
+    def finish(self, index, outcome, key=None, error=None):
+        with self.lock:
+            self.outcomes[index] = outcome
+            if error is not None:
+                self.errors[index] = error
+            if key is not None:
+                self.failed_keys.add(key)
+            self.remaining -= 1
+            if not self.remaining:
+                self.done.set()
+
+    def summary(self):
+        summary = ConsumeSummary()
+        complete = True
+        for index, (event, outcome) in enumerate(zip(self.events,
+                                                     self.outcomes)):
+            if outcome == 'handled':
+                summary.handled.append(event)
+            elif outcome == 'duplicate':
+                summary.duplicates.append(event)
+            elif outcome == 'failed':
+                summary.failed.append((event, self.errors[index]))
+            else:
+                summary.deferred.append(event)
+
+            if outcome not in ('handled', 'duplicate'):
+                complete = False
+            elif complete:
+                summary.checkpoint = event['id']
+        return summary
+
+
+class Dispatcher(object):
+    """
+    A registry of Event handlers by event type.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    def on(self, event_type, handler=None):
+        """
+        Register `handler` for events of `event_type`, which may end in
+        `.*` to match a whole family such as `customer.*`, or be `*` to
+        match every event.  Without `handler`, return a decorator.
+        """
+        if handler is None:
+            def decorator(handler):
+                return self.on(event_type, handler)
+            return decorator
+
+        self._handlers.setdefault(event_type, []).append(handler)
+        return handler
+
+    def handlers_for(self, event_type):
+        handlers = list(self._handlers.get(event_type, ()))
+        parts = event_type.split('.')
+        for i in xrange(len(parts) - 1, 0, -1):
+            pattern = '.'.join(parts[:i]) + '.*'
+            handlers.extend(self._handlers.get(pattern, ()))
+        handlers.extend(self._handlers.get('*', ()))
+        return handlers
+
+    def dispatch(self, event):
+        for handler in self.handlers_for(event['type']):
+            handler(event)
+
+
+class EventConsumer(Dispatcher):
+    """
+    Reads Events from a checkpoint and dispatches them to handlers
+    registered by type, on a pool of worker threads:
+
+        consumer = EventConsumer(concurrency=8,
+                                 checkpoint=FileCheckpoint('events.cursor'),
+                                 dedupe=MemoryDedupeStore(100000))
+
+        @consumer.on('invoice.payment_failed')
+        def payment_failed(event):
+            ...
+
+        consumer.run(interval=5)
+
+    Events are partitioned by the customer they concern, or else by the
+    id of their `data.object`, so events about one object are handled in
+    order by one worker while unrelated events are handled in parallel.
+
+    Delivery is at least once.  The checkpoint only moves past events
+    that were handled; when a handler fails, the event and any later ones
+    for the same object are delivered again on the next poll.  Handled
+    ids are recorded in the `dedupe` store so redelivered events that
+    already succeeded are skipped.
+    """
+
+    def __init__(self, concurrency=4, checkpoint=None, dedupe=None,
+                 api_key=None, stripe_account=None, page_size=100,
+                 queue_size=100, from_beginning=False):
+        if concurrency < 1:
+            raise ValueError(
+                'EventConsumer concurrency must be at least 1, got %r' %
+                (concurrency,))
+
+        super(EventConsumer, self).__init__()
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint or MemoryCheckpoint()
+        self.dedupe = dedupe
+        self.api_key = api_key
+        self.stripe_account = stripe_account
+        self.page_size = page_size
+        self.queue_size = queue_size
+        self.from_beginning = from_beginning
+
+        self._queues = None
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def partition_key(self, event):
+        obj = (event.get('data') or {}).get('object') or {}
+        customer = obj.get('customer')
+        if isinstance(customer, dict):
+            customer = customer.get('id')
+        if obj.get('object') == 'customer':
+            customer = obj.get('id')
+        return customer or obj.get('id') or event['id']
+
+    # Workers
+
+    def start(self):
+        with self._lock:
+            if self._queues is not None:
+                return
+            self._queues = [Queue.Queue(self.queue_size)
+                            for _ in xrange(self.concurrency)]
+            self._threads = [threading.Thread(target=self._work,
+                                              args=(queue,))
+                             for queue in self._queues]
+            for thread in self._threads:
+                thread.daemon = True
+                thread.start()
+
+    def stop(self):
+        with self._lock:
+            if self._queues is None:
+                return
+            for queue in self._queues:
+                queue.put(_DONE)
+            for thread in self._threads:
+                thread.join()
+            self._queues = None
+            self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def _work(self, queue):
+        while True:
+            task = queue.get()
+            if task is _DONE:
+                return
+
+            batch, index, key, record = task
+            if key in batch.failed_keys:
+                batch.finish(index, 'deferred')
+                continue
+
+            if self.dedupe is not None and self.dedupe.seen(record['id']):
+                batch.finish(index, 'duplicate')
+                continue
+
+            try:
+                event = resource.convert_to_stripe_object(
+                    record, self.api_key, self.stripe_account)
+                self.dispatch(event)
+            except Exception, e:
+                util.logger.warning('Handling event %s failed: %r',
+                                    record.get('id'), e)
+                batch.finish(index, 'failed', key=key, error=e)
+                continue
+
+            if self.dedupe is not None:
+                self.dedupe.add(record['id'])
+            batch.finish(index, 'handled')
+
+    def process(self, events):
+        """
+        Handle a batch of decoded events, oldest first, and return a
+        ConsumeSummary once all of them were handled, skipped or failed.
+        """
+        self.start()
+        batch = _Batch(events)
+        for index, record in enumerate(events):
+            key = self.partition_key(record)
+            queue = self._queues[hash(key) % self.concurrency]
+            queue.put((batch, index, key, record))
+        batch.done.wait()
+        return batch.summary()
+
+    # Polling
+
+    def poll(self):
+        """
+        Process all events created since the checkpoint, moving it along
+        page by page.  Stops at the first page with a failure so the
+        failed events are retried by the next poll.
+        """
+        total = ConsumeSummary()
+        cursor = self.checkpoint.get()
+        if cursor is None and not self.from_beginning:
+            latest = latest_event_id(self.api_key, self.stripe_account)
+            if latest is not None:
+                self.checkpoint.set(latest)
+            return total
+
+        for events in iter_event_pages(cursor, api_key=self.api_key,
+                                       stripe_account=self.stripe_account,
+                                       page_size=self.page_size):
+            summary = self.process(events)
+            total.merge(summary)
+            if summary.checkpoint:
+                self.checkpoint.set(summary.checkpoint)
+            if not summary.ok:
+                break
+
+        return total
+
+    def run(self, interval=5, stop_event=None):
+        """
+        Poll every `interval` seconds until `stop_event` is set.
+        """
+        stop_event = stop_event or threading.Event()
+        self.start()
+        try:
+            while not stop_event.isSet():
+                try:
+                    self.poll()
+                except Exception, e:
+                    util.logger.warning('Polling events failed: %r', e)
+                stop_event.wait(interval)
+        finally:
+            self.stop()
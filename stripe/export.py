@@ -0,0 +1,123 @@
+import csv
+
+from stripe import api_requestor, util
+
+
+def iter_records(klass, api_key=None, stripe_account=None, page_size=100,
+                 **params):
+    """
+    Yield the decoded JSON of every object of a listable resource,
+    following pagination.  Only one page is held in memory at a time and
+    no StripeObjects are built, which keeps long exports cheap.
+    """
+    requestor = api_requestor.APIRequestor(
+        api_key, api_base=klass.api_base(), account=stripe_account)
+    url = klass.class_url()
+    params = dict(params)
+    params.setdefault('limit', page_size)
+
+    while True:
+        page, _ = requestor.request('get', url, params)
+        data = page.get('data') or []
+
+        for record in data:
+            yield record
+
+        if not page.get('has_more') or not data:
+            return
+        params['starting_after'] = data[-1]['id']
+
+
+def flatten(record, prefix='', separator='.'):
+    """
+    Flatten nested objects into a single level with dotted keys, e.g.
+    `{'source': {'brand': 'Visa'}}` becomes `{'source.brand': 'Visa'}`.
+    Lists are kept as values.
+    """
+    flat = {}
+    for key, value in record.iteritems():
+        key = '%s%s' % (prefix, key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, key + separator, separator))
+        else:
+            flat[key] = value
+    return flat
+
+
+def project(record, columns):
+    flat = flatten(record)
+    return [(column, flat.get(column)) for column in columns]
+
+
+def write_jsonl(records, fileobj, columns=None):
+    """
+    Write one JSON document per line.  With `columns`, each line is a flat
+    object holding just those dotted fields.
+    """
+    count = 0
+    for record in records:
+        if columns is not None:
+            record = dict(project(record, columns))
+        fileobj.write(util.json.dumps(record, sort_keys=True))
+        fileobj.write('\n')
+        count += 1
+    return count
+
+
+def write_csv(records, fileobj, columns=None):
+    """
+    Write records as CSV with one column per dotted field.  Without
+    `columns`, the columns are those of the first record; fields that only
+    appear on later records are left out.
+    """
+    writer = csv.writer(fileobj)
+    count = 0
+
+    for record in records:
+        if columns is None:
+            columns = sorted(flatten(record).keys())
+        if count == 0:
+            writer.writerow([util.utf8(column) for column in columns])
+
+        writer.writerow([_csv_value(value)
+                         for _, value in project(record, columns)])
+        count += 1
+    return count
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    elif isinstance(value, bool):
+        return value and 'true' or 'false'
+    elif isinstance(value, list):
+        return util.json.dumps(value)
+    return util.utf8(value)
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+}
+
+
+def export(klass, fileobj, format='jsonl', columns=None, api_key=None,
+           stripe_account=None, **params):
+    """
+    Stream every object of `klass` matching `params` into `fileobj` and
+    return how many were written:
+
+        with open('charges.csv', 'wb') as f:
+            stripe.export.export(stripe.Charge, f, format='csv',
+                                 columns=['id', 'amount', 'source.brand'],
+                                 created={'gte': 1420070400})
+    """
+    try:
+        writer = WRITERS[format]
+    except KeyError:
+        raise ValueError('Unknown export format %r; expected one of %s' %
+                         (format, ', '.join(sorted(WRITERS))))
+
+    records = iter_records(klass, api_key=api_key,
+                           stripe_account=stripe_account, **params)
+    return writer(records, fileobj, columns)
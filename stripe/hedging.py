@@ -0,0 +1,245 @@
+import collections
+import heapq
+import itertools
+import math
+import Queue
+import threading
+import time
+
+from stripe import deadlines
+
+# Until this many latencies have been seen, `initial_delay` is used
+_MIN_SAMPLES = 20
+
+_HEDGE = object()
+
+
+class HedgingPolicy(object):
+    """
+    Hedges slow requests: when no response has arrived after a delay, the
+    same request is sent again, on another of the client's pooled
+    connections, and whichever succeeds first is used.  The other one is
+    left to finish in the background and its response discarded, since
+    a request already in flight can't be called off.
+
+    The delay is the `percentile` of recent response times, so only the
+    slowest requests are hedged, and hedges are further capped at
+    `max_hedged` of all requests.  Set `stripe.hedging_policy`, or pass
+    `hedging` to APIRequestor, to hedge GET requests; others are never
+    sent twice.  `stats()` reports how often hedges are sent and win.
+
+    Requests run on a pool of at most `max_threads` threads that is kept
+    for the life of the policy, and one more thread sends the signal to
+    hedge.  When all of the pool is busy, requests run unhedged on the
+    caller's thread.
+    """
+
+    def __init__(self, percentile=95, max_hedged=0.05, initial_delay=1.0,
+                 window=1000, max_threads=32):
+        self.percentile = percentile
+        self.max_hedged = max_hedged
+        self.initial_delay = initial_delay
+
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = _Executor(max_threads)
+        self._timer = _Timer()
+        # Every request earns `max_hedged` of a hedge, up to a small burst
+        self._tokens = 0.0
+        self._max_tokens = max(1.0, max_hedged * 100)
+        self._stats = {
+            'requests': 0,
+            'hedged': 0,
+            'hedge_wins': 0,
+            'throttled': 0,
+            'saturated': 0,
+        }
+
+    def delay(self):
+        """
+        Return how long, in seconds, to wait for a response before
+        hedging.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < _MIN_SAMPLES:
+            return self.initial_delay
+        rank = int(math.ceil(self.percentile / 100.0 * len(latencies)))
+        return latencies[max(rank, 1) - 1]
+
+    def stats(self):
+        """
+        Return counts of the requests made, those hedged, those where the
+        hedge won, those that would have been hedged but for `max_hedged`
+        and those that ran unhedged because the thread pool was busy,
+        along with the current delay.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['delay'] = self.delay()
+        return stats
+
+    def call(self, func, *args, **kwargs):
+        """
+        Return `func(*args, **kwargs)`, calling it a second time if the
+        first call is slow.  If both calls fail, the first call's error is
+        raised.
+        """
+        with self._lock:
+            self._stats['requests'] += 1
+            self._tokens = min(self._max_tokens,
+                               self._tokens + self.max_hedged)
+
+        results = Queue.Queue()
+        deadline = deadlines.current()
+
+        def attempt(hedge):
+            start = time.time()
+            try:
+                with deadlines.using(deadline):
+                    value = func(*args, **kwargs)
+            except Exception, e:
+                return hedge, None, e
+            self._record(time.time() - start)
+            return hedge, value, None
+
+        if not self._executor.submit(attempt, results.put, False):
+            with self._lock:
+                self._stats['saturated'] += 1
+            return func(*args, **kwargs)
+
+        # Python 2's timed waits poll, which would hold up fast responses,
+        # so the timer posts the signal to hedge instead
+        signal = self._timer.schedule(self.delay(), results.put, _HEDGE)
+
+        outcome = results.get()
+        if outcome is not _HEDGE:
+            self._timer.cancel(signal)
+            hedge, value, error = outcome
+            # Errors aren't hedged; that would be retrying
+            if error is not None:
+                raise error
+            return value
+
+        pending = 1
+        if self._take_token():
+            sent = self._executor.submit(attempt, results.put, True)
+            with self._lock:
+                if sent:
+                    self._stats['hedged'] += 1
+                    pending = 2
+                else:
+                    # No hedge went out, so the token is given back
+                    self._tokens = min(self._max_tokens, self._tokens + 1)
+                    self._stats['saturated'] += 1
+
+        first_error = None
+        for _ in xrange(pending):
+            hedge, value, error = results.get()
+            if error is None:
+                if hedge:
+                    with self._lock:
+                        self._stats['hedge_wins'] += 1
+                return value
+            if first_error is None or not hedge:
+                first_error = error
+        raise first_error
+
+    def _record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _take_token(self):
+        with self._lock:
+            if self._tokens < 1:
+                self._stats['throttled'] += 1
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _Executor(object):
+    """
+    Runs functions on up to `max_threads` threads, which are started as
+    needed and then kept.  Functions must not raise.
+    """
+
+    def __init__(self, max_threads):
+        self.max_threads = max_threads
+        self._tasks = Queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = 0
+        self._idle = 0
+
+    def submit(self, func, callback, *args):
+        """
+        Run `func(*args)` on a pool thread and pass its result to
+        `callback`, or return False if all of the threads are busy.
+        """
+        with self._lock:
+            if self._idle:
+                self._idle -= 1
+            elif self._threads < self.max_threads:
+                self._threads += 1
+                _start(self._work)
+            else:
+                return False
+        self._tasks.put((func, callback, args))
+        return True
+
+    def _work(self):
+        while True:
+            func, callback, args = self._tasks.get()
+            result = func(*args)
+            # Free the thread before the caller hears back, so that its
+            # next request can use it
+            with self._lock:
+                self._idle += 1
+            callback(result)
+
+
+class _Timer(object):
+    """
+    Calls functions after a delay from a single thread.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._entries = []
+        self._counter = itertools.count()
+        self._started = False
+
+    def schedule(self, delay, func, *args):
+        entry = [time.time() + delay, next(self._counter), func, args]
+        with self._condition:
+            heapq.heappush(self._entries, entry)
+            if not self._started:
+                self._started = True
+                _start(self._run)
+            self._condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        with self._condition:
+            entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._entries:
+                    self._condition.wait()
+                due = self._entries[0][0]
+                remaining = due - time.time()
+                if remaining > 0:
+                    # Returns early if an entry is added
+                    self._condition.wait(remaining)
+                    continue
+                _, _, func, args = heapq.heappop(self._entries)
+            if func is not None:
+                func(*args)
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
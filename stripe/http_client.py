@@ -1,34 +1,77 @@
+import errno
 import os
+import select
+import socket
 import sys
 import textwrap
+import threading
+import time
+import urlparse
 import warnings
 import email
 
-from stripe import error, util
+from stripe import deadlines, error, util, workers
+
+CA_BUNDLE = os.path.join(os.path.dirname(__file__), 'data/ca-certificates.crt')
 
 
 # - Requests is the preferred HTTP library
 # - Google App Engine has urlfetch
 # - Use Pycurl if it's there (at least it verifies SSL certs)
 # - Fall back to urllib2 with a warning if needed
-try:
-    import urllib2
-except ImportError:
-    pass
-
-try:
-    import pycurl
-except ImportError:
-    pycurl = None
-
-try:
-    import requests
-except ImportError:
-    requests = None
-else:
+#
+# The libraries are probed by _load_backends when the first client is
+# made rather than on import, which keeps `import stripe` cheap.
+_NOT_LOADED = object()
+
+urllib2 = _NOT_LOADED
+httplib = _NOT_LOADED
+pycurl = _NOT_LOADED
+requests = _NOT_LOADED
+urlfetch = _NOT_LOADED
+
+
+def _load_backends():
+    global urllib2, httplib, pycurl, requests, urlfetch
+
+    if urllib2 is _NOT_LOADED:
+        try:
+            import urllib2 as urllib2_module
+        except ImportError:
+            urllib2_module = None
+        urllib2 = urllib2_module
+
+    if httplib is _NOT_LOADED:
+        import httplib as httplib_module
+        httplib = httplib_module
+
+    if pycurl is _NOT_LOADED:
+        try:
+            import pycurl as pycurl_module
+        except ImportError:
+            pycurl_module = None
+        pycurl = pycurl_module
+
+    if requests is _NOT_LOADED:
+        requests = _load_requests()
+
+    if urlfetch is _NOT_LOADED:
+        try:
+            from google.appengine.api import urlfetch as urlfetch_module
+        except ImportError:
+            urlfetch_module = None
+        urlfetch = urlfetch_module
+
+
+def _load_requests():
+    try:
+        import requests as requests_module
+    except ImportError:
+        return None
+
     try:
         # Require version 0.8.8, but don't want to depend on distutils
-        version = requests.__version__
+        version = requests_module.__version__
         major, minor, patch = [int(i) for i in version.split('.')]
     except Exception:
         # Probably some new-fangled version, so it should support verify
@@ -44,15 +87,63 @@ else:
                 'questions, please contact support@stripe.com. (HINT: running '
                 '"pip install -U requests" should upgrade your requests '
                 'library to the latest version.)' % (version,))
-            requests = None
+            return None
+    return requests_module
+
+
+_ssl_contexts = {}
+_ssl_context_lock = threading.Lock()
+
+
+def ssl_context(check_hostname=True):
+    """
+    Return an `ssl.SSLContext` that verifies certificates against the
+    bundled CA file.  It is built on first use and shared afterwards, so
+    the bundle is only parsed once.  Pass `check_hostname=False` for
+    libraries, like urllib3, that match host names themselves.  Returns
+    None on Pythons whose `ssl` module has no contexts (before 2.7.9).
+    """
+    context = _ssl_contexts.get(check_hostname)
+    if context is None:
+        with _ssl_context_lock:
+            context = _ssl_contexts.get(check_hostname)
+            if context is None:
+                import ssl
+                if not hasattr(ssl, 'create_default_context'):
+                    return None
+                context = ssl.create_default_context(cafile=CA_BUNDLE)
+                context.check_hostname = check_hostname
+                _ssl_contexts[check_hostname] = context
+    return context
 
-try:
-    from google.appengine.api import urlfetch
-except ImportError:
-    urlfetch = None
+
+_ca_bundle = None
+
+
+def ca_bundle():
+    """
+    Return the contents of the bundled CA file, read on first use.
+    """
+    global _ca_bundle
+
+    if _ca_bundle is None:
+        with open(CA_BUNDLE, 'rb') as f:
+            _ca_bundle = f.read()
+    return _ca_bundle
+
+
+def _timeouts(connect, read):
+    # A backend's own connect and read timeouts, cut down to what is left
+    # of the current deadline
+    deadline = deadlines.current()
+    if deadline is None:
+        return connect, read
+    return deadline.timeouts(connect, read)
 
 
 def new_default_http_client(*args, **kwargs):
+    _load_backends()
+
     if urlfetch:
         impl = UrlFetchClient
     elif requests:
@@ -71,36 +162,218 @@ def new_default_http_client(*args, **kwargs):
     return impl(*args, **kwargs)
 
 
+def new_pooled_http_client(pool_size=10, *args, **kwargs):
+    """
+    Like `new_default_http_client`, but returns a client whose keep-alive
+    connections are shared between threads, with room for `pool_size`
+    concurrent requests.  Without requests or pycurl this is a
+    PooledUrllib2Client; otherwise falls back to the default client when
+    the backend has no connection pool.
+    """
+    _load_backends()
+
+    if urlfetch or (requests and not hasattr(requests, 'Session')):
+        return new_default_http_client(*args, **kwargs)
+    elif not requests:
+        if pycurl:
+            return new_default_http_client(*args, **kwargs)
+        return PooledUrllib2Client(pool_size=pool_size, *args, **kwargs)
+
+    session = _new_session(pool_size, kwargs.get('verify_ssl_certs', True))
+    return RequestsClient(session=session, *args, **kwargs)
+
+
+_sessions = {}
+_session_lock = threading.Lock()
+
+
+def _shared_session(verify_ssl_certs):
+    # Clients made without a session, such as the one APIRequestor makes
+    # for each request when `stripe.default_http_client` is unset, share
+    # one, so that they reuse its connections
+    session = _sessions.get(verify_ssl_certs)
+    if session is None:
+        with _session_lock:
+            session = _sessions.get(verify_ssl_certs)
+            if session is None:
+                session = _new_session(10, verify_ssl_certs)
+                _sessions[verify_ssl_certs] = session
+    return session
+
+
+def _new_session(pool_size, verify_ssl_certs):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                            pool_maxsize=pool_size)
+
+    # Verify against the shared SSL context, rather than have urllib3
+    # load the CA file again for every new connection.  Needs requests
+    # 2.4 and urllib3 1.13 or newer.
+    context = ssl_context(False) if verify_ssl_certs else None
+    urllib3 = getattr(requests.packages, 'urllib3', None)
+    if context is not None and \
+            hasattr(urllib3, 'util') and \
+            hasattr(urllib3.util, 'ssl_') and \
+            hasattr(urllib3.util.ssl_, 'create_urllib3_context'):
+        try:
+            adapter.init_poolmanager(1, pool_size, ssl_context=context)
+        except TypeError:
+            pass
+        else:
+            adapter.cert_verify = _verify_with_context
+
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _verify_with_context(conn, url, verify, cert):
+    # Stands in for HTTPAdapter.cert_verify, which would point every
+    # connection at a CA file to load
+    if verify:
+        conn.cert_reqs = 'CERT_REQUIRED'
+    else:
+        conn.cert_reqs = 'CERT_NONE'
+    conn.ca_certs = None
+    conn.ca_cert_dir = None
+
+
 class HTTPClient(object):
 
     def __init__(self, verify_ssl_certs=True):
+        _load_backends()
         self._verify_ssl_certs = verify_ssl_certs
 
     def request(self, method, url, headers, post_data=None):
         raise NotImplementedError(
             'HTTPClient subclasses must implement `request`')
 
+    def close(self):
+        """
+        Close the client's idle connections.  Clients without a pool of
+        their own have none.
+        """
+        pass
+
+    def warmup(self, url, n_connections=1, headers=None):
+        """
+        Open up to `n_connections` connections to the host of `url` ahead
+        of the first request, by sending that many concurrent GETs for
+        `url` with `headers`, and return how many requests were sent.
+        Clients without a pool send none.
+        """
+        return 0
+
+    def request_stream(self, method, url, headers, post_data=None,
+                       chunk_size=65536):
+        """
+        Like `request`, but returns an iterator over the chunks of the
+        response body in place of the body.  Clients that can't stream
+        fall back to slicing up the buffered body.
+        """
+        rbody, rcode, rheaders = self.request(method, url, headers, post_data)
+        chunks = (rbody[i:i + chunk_size]
+                  for i in xrange(0, len(rbody), chunk_size))
+        return chunks, rcode, rheaders
+
+    def request_async(self, method, url, headers, post_data=None):
+        """
+        Start a request and return an object whose `get_result()` waits
+        for it and returns what `request` would, or raises its error.
+        Clients that can't run requests in the background make the
+        request straight away.
+        """
+        try:
+            return _FinishedRequest(
+                self.request(method, url, headers, post_data))
+        except error.StripeError, e:
+            return _FinishedRequest(error=e)
+
+
+class _FinishedRequest(object):
+
+    def __init__(self, result=None, error=None):
+        self._result = result
+        self._error = error
+
+    def get_result(self):
+        if self._error is not None:
+            raise self._error
+        return self._result
+
 
 class RequestsClient(HTTPClient):
     name = 'requests'
 
+    def __init__(self, verify_ssl_certs=True, session=None):
+        super(RequestsClient, self).__init__(verify_ssl_certs)
+        self._shared = session is None
+        self._session = session or _shared_session(verify_ssl_certs)
+
+    def close(self):
+        # The shared session outlives any one client
+        if not self._shared:
+            self._session.close()
+
     def request(self, method, url, headers, post_data=None):
-        kwargs = {}
+        result = self._request(method, url, headers, post_data)
+        try:
+            # This causes the content to actually be read, which could cause
+            # e.g. a socket timeout. TODO: The other fetch methods probably
+            # are susceptible to the same and should be updated.
+            content = result.content
+            status_code = result.status_code
+        except Exception, e:
+            self._handle_request_error(e)
+        return content, status_code, result.headers
+
+    def request_stream(self, method, url, headers, post_data=None,
+                       chunk_size=65536):
+        result = self._request(method, url, headers, post_data, stream=True)
 
+        def chunks():
+            try:
+                for chunk in result.iter_content(chunk_size):
+                    yield chunk
+            except Exception, e:
+                self._handle_request_error(e)
+            finally:
+                result.close()
+
+        return chunks(), result.status_code, result.headers
+
+    def warmup(self, url, n_connections=1, headers=None):
+        # Requests that overlap each take a connection of their own from
+        # the session's pool
+        def warm(_):
+            self.request('get', url, headers or {})
+
+        pool = workers.WorkerPool(n_connections)
+        for result in pool.map(warm, xrange(n_connections)):
+            if not result.ok:
+                raise result.error
+        return n_connections
+
+    def _verify(self):
         if self._verify_ssl_certs:
-            kwargs['verify'] = os.path.join(
-                os.path.dirname(__file__), 'data/ca-certificates.crt')
+            return CA_BUNDLE
+        return False
+
+    def _request(self, method, url, headers, post_data, **kwargs):
+        kwargs['verify'] = self._verify()
+        # Separate connect and read timeouts need requests 2.4
+        if deadlines.current() is not None:
+            kwargs['timeout'] = _timeouts(80, 80)
         else:
-            kwargs['verify'] = False
+            kwargs['timeout'] = 80
 
         try:
             try:
-                result = requests.request(method,
-                                          url,
-                                          headers=headers,
-                                          data=post_data,
-                                          timeout=80,
-                                          **kwargs)
+                result = self._session.request(method,
+                                               url,
+                                               headers=headers,
+                                               data=post_data,
+                                               **kwargs)
             except TypeError, e:
                 raise TypeError(
                     'Warning: It looks like your installed version of the '
@@ -109,17 +382,11 @@ class RequestsClient(HTTPClient):
                     'your "requests" library is out of date. You can fix '
                     'that by running "pip install -U requests".) The '
                     'underlying error was: %s' % (e,))
-
-            # This causes the content to actually be read, which could cause
-            # e.g. a socket timeout. TODO: The other fetch methods probably
-            # are susceptible to the same and should be updated.
-            content = result.content
-            status_code = result.status_code
         except Exception, e:
             # Would catch just requests.exceptions.RequestException, but can
             # also raise ValueError, RuntimeError, etc.
             self._handle_request_error(e)
-        return content, status_code, result.headers
+        return result
 
     def _handle_request_error(self, e):
         if isinstance(e, requests.exceptions.RequestException):
@@ -144,7 +411,17 @@ class RequestsClient(HTTPClient):
 class UrlFetchClient(HTTPClient):
     name = 'urlfetch'
 
+    def __init__(self, verify_ssl_certs=True, deadline=55):
+        super(UrlFetchClient, self).__init__(verify_ssl_certs)
+        # GAE requests time out after 60 seconds, so by default leave some
+        # time for the application to handle a slow Stripe
+        self.deadline = deadline
+
     def request(self, method, url, headers, post_data=None):
+        # urlfetch only accepts a string payload
+        if hasattr(post_data, 'read'):
+            post_data = post_data.read()
+
         try:
             result = urlfetch.fetch(
                 url=url,
@@ -154,9 +431,7 @@ class UrlFetchClient(HTTPClient):
                 # However, that's ok because the CA bundle they use recognizes
                 # api.stripe.com.
                 validate_certificate=self._verify_ssl_certs,
-                # GAE requests time out after 60 seconds, so make sure we leave
-                # some time for the application to handle a slow Stripe
-                deadline=55,
+                deadline=self._deadline(),
                 payload=post_data
             )
         except urlfetch.Error, e:
@@ -164,6 +439,32 @@ class UrlFetchClient(HTTPClient):
 
         return result.content, result.status_code, result.headers
 
+    def request_async(self, method, url, headers, post_data=None):
+        """
+        Start the request as a urlfetch RPC, so that several can be in
+        flight at once.
+        """
+        if hasattr(post_data, 'read'):
+            post_data = post_data.read()
+
+        rpc = urlfetch.create_rpc(deadline=self._deadline())
+        try:
+            urlfetch.make_fetch_call(
+                rpc,
+                url,
+                payload=post_data,
+                method=method,
+                headers=headers,
+                validate_certificate=self._verify_ssl_certs)
+        except urlfetch.Error, e:
+            self._handle_request_error(e, url)
+
+        return _UrlFetchRequest(self, rpc, url)
+
+    def _deadline(self):
+        # urlfetch has a single deadline for the whole fetch
+        return _timeouts(self.deadline, self.deadline)[1]
+
     def _handle_request_error(self, e, url):
         if isinstance(e, urlfetch.InvalidURLError):
             msg = ("The Stripe library attempted to fetch an "
@@ -184,6 +485,22 @@ class UrlFetchClient(HTTPClient):
         raise error.APIConnectionError(msg)
 
 
+class _UrlFetchRequest(object):
+
+    def __init__(self, client, rpc, url):
+        self._client = client
+        self._rpc = rpc
+        self._url = url
+
+    def get_result(self):
+        try:
+            result = self._rpc.get_result()
+        except urlfetch.Error, e:
+            self._client._handle_request_error(e, self._url)
+
+        return result.content, result.status_code, result.headers
+
+
 class PycurlClient(HTTPClient):
     name = 'pycurl'
 
@@ -197,40 +514,107 @@ class PycurlClient(HTTPClient):
     def request(self, method, url, headers, post_data=None):
         s = util.StringIO.StringIO()
         rheaders = util.StringIO.StringIO()
+        curl = self._curl(method, url, headers, post_data, s.write,
+                          rheaders.write)
+
+        try:
+            curl.perform()
+        except pycurl.error, e:
+            self._handle_request_error(e)
+        rbody = s.getvalue()
+        rcode = curl.getinfo(pycurl.RESPONSE_CODE)
+
+        return rbody, rcode, self.parse_headers(rheaders.getvalue())
+
+    def request_stream(self, method, url, headers, post_data=None,
+                       chunk_size=65536):
+        # The multi interface runs the transfer only as far as each call to
+        # perform() takes it, so chunks are handed out as they arrive.
+        pending = []
+        rheaders = util.StringIO.StringIO()
+        curl = self._curl(method, url, headers, post_data, pending.append,
+                          rheaders.write)
+        curl.setopt(pycurl.BUFFERSIZE, chunk_size)
+        multi = pycurl.CurlMulti()
+        multi.add_handle(curl)
+
+        def close():
+            multi.remove_handle(curl)
+            curl.close()
+            multi.close()
+
+        def perform():
+            while True:
+                ret, active = multi.perform()
+                if ret != pycurl.E_CALL_MULTI_PERFORM:
+                    break
+            if not active:
+                _, _, failed = multi.info_read()
+                if failed:
+                    close()
+                    _, errno, message = failed[0]
+                    self._handle_request_error(pycurl.error(errno, message))
+            return active
+
+        # Run until the headers are in, or the transfer is over
+        active = perform()
+        while active and not rheaders.getvalue().endswith('\r\n\r\n'):
+            multi.select(1.0)
+            active = perform()
+        rcode = curl.getinfo(pycurl.RESPONSE_CODE)
+
+        def chunks(active):
+            try:
+                while True:
+                    while pending:
+                        yield pending.pop(0)
+                    if not active:
+                        return
+                    multi.select(1.0)
+                    active = perform()
+            finally:
+                close()
+
+        return (chunks(active), rcode,
+                self.parse_headers(rheaders.getvalue()))
+
+    def _curl(self, method, url, headers, post_data, write, write_header):
         curl = pycurl.Curl()
 
         if method == 'get':
             curl.setopt(pycurl.HTTPGET, 1)
         elif method == 'post':
             curl.setopt(pycurl.POST, 1)
-            curl.setopt(pycurl.POSTFIELDS, post_data)
+            if hasattr(post_data, 'read'):
+                curl.setopt(pycurl.READFUNCTION, post_data.read)
+                curl.setopt(pycurl.POSTFIELDSIZE_LARGE, len(post_data))
+            else:
+                curl.setopt(pycurl.POSTFIELDS, post_data)
         else:
             curl.setopt(pycurl.CUSTOMREQUEST, method.upper())
 
         # pycurl doesn't like unicode URLs
         curl.setopt(pycurl.URL, util.utf8(url))
 
-        curl.setopt(pycurl.WRITEFUNCTION, s.write)
-        curl.setopt(pycurl.HEADERFUNCTION, rheaders.write)
+        curl.setopt(pycurl.WRITEFUNCTION, write)
+        curl.setopt(pycurl.HEADERFUNCTION, write_header)
         curl.setopt(pycurl.NOSIGNAL, 1)
-        curl.setopt(pycurl.CONNECTTIMEOUT, 30)
-        curl.setopt(pycurl.TIMEOUT, 80)
+        connect_timeout, timeout = _timeouts(30, 80)
+        curl.setopt(pycurl.CONNECTTIMEOUT_MS, int(connect_timeout * 1000))
+        curl.setopt(pycurl.TIMEOUT_MS, int(timeout * 1000))
         curl.setopt(pycurl.HTTPHEADER, ['%s: %s' % (k, v)
                     for k, v in headers.iteritems()])
         if self._verify_ssl_certs:
-            curl.setopt(pycurl.CAINFO, os.path.join(
-                os.path.dirname(__file__), 'data/ca-certificates.crt'))
+            # Newer libcurls take the bundle from memory, which spares
+            # reading the file for every connection
+            if hasattr(pycurl, 'CAINFO_BLOB'):
+                curl.setopt(pycurl.CAINFO_BLOB, ca_bundle())
+            else:
+                curl.setopt(pycurl.CAINFO, CA_BUNDLE)
         else:
             curl.setopt(pycurl.SSL_VERIFYHOST, False)
 
-        try:
-            curl.perform()
-        except pycurl.error, e:
-            self._handle_request_error(e)
-        rbody = s.getvalue()
-        rcode = curl.getinfo(pycurl.RESPONSE_CODE)
-
-        return rbody, rcode, self.parse_headers(rheaders.getvalue())
+        return curl
 
     def _handle_request_error(self, e):
         if e[0] in [pycurl.E_COULDNT_CONNECT,
@@ -261,7 +645,39 @@ class Urllib2Client(HTTPClient):
     else:
         name = 'urllib2'
 
+    def __init__(self, verify_ssl_certs=True):
+        super(Urllib2Client, self).__init__(verify_ssl_certs)
+        self._unverified_context = None
+
     def request(self, method, url, headers, post_data=None):
+        response = self._open(method, url, headers, post_data)
+        try:
+            rbody = response.read()
+        except (urllib2.URLError, httplib.HTTPException, socket.error,
+                ValueError), e:
+            self._handle_request_error(e)
+        return rbody, response.code, self._headers(response)
+
+    def request_stream(self, method, url, headers, post_data=None,
+                       chunk_size=65536):
+        response = self._open(method, url, headers, post_data)
+
+        def chunks():
+            try:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+            except (urllib2.URLError, httplib.HTTPException, socket.error,
+                    ValueError), e:
+                self._handle_request_error(e)
+            finally:
+                response.close()
+
+        return chunks(), response.code, self._headers(response)
+
+    def _open(self, method, url, headers, post_data):
         if sys.version_info >= (3, 0) and isinstance(post_data, basestring):
             post_data = post_data.encode('utf-8')
 
@@ -270,22 +686,243 @@ class Urllib2Client(HTTPClient):
         if method not in ('get', 'post'):
             req.get_method = lambda: method.upper()
 
+        kwargs = {}
+        # Pythons without SSL contexts can't verify certificates here
+        context = self._ssl_context()
+        if context is not None:
+            kwargs['context'] = context
+        # urlopen takes a single timeout for connecting and each read
+        if deadlines.current() is not None:
+            kwargs['timeout'] = _timeouts(80, 80)[1]
+
         try:
-            response = urllib2.urlopen(req)
-            rbody = response.read()
-            rcode = response.code
-            headers = dict(response.info())
+            return urllib2.urlopen(req, **kwargs)
         except urllib2.HTTPError, e:
-            rcode = e.code
-            rbody = e.read()
-            headers = dict(e.info())
-        except (urllib2.URLError, ValueError), e:
+            # Error responses carry a body too
+            return e
+        except (urllib2.URLError, httplib.HTTPException, socket.error,
+                ValueError), e:
             self._handle_request_error(e)
-        lh = dict((k.lower(), v) for k, v in dict(headers).iteritems())
-        return rbody, rcode, lh
+
+    def _ssl_context(self):
+        if self._verify_ssl_certs:
+            return ssl_context()
+
+        if self._unverified_context is None:
+            import ssl
+            if hasattr(ssl, '_create_unverified_context'):
+                self._unverified_context = ssl._create_unverified_context()
+        return self._unverified_context
+
+    def _headers(self, response):
+        headers = dict(response.info())
+        return dict((k.lower(), v) for k, v in headers.iteritems())
 
     def _handle_request_error(self, e):
         msg = ("Unexpected error communicating with Stripe. "
                "If this problem persists, let us know at support@stripe.com.")
         msg = textwrap.fill(msg) + "\n\n(Network error: " + str(e) + ")"
         raise error.APIConnectionError(msg)
+
+
+class PooledUrllib2Client(Urllib2Client):
+    """
+    A client built directly on httplib, for when neither requests nor
+    pycurl is installed, that keeps connections alive between requests.
+    Up to `pool_size` idle connections are kept per host, and those left
+    idle for longer than `max_idle` seconds are closed rather than reused.
+    """
+    name = 'httplib'
+
+    def __init__(self, verify_ssl_certs=True, pool_size=10, max_idle=30):
+        super(PooledUrllib2Client, self).__init__(verify_ssl_certs)
+        self.pool_size = pool_size
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, headers, post_data=None):
+        key, conn, response = self._open(method, url, headers, post_data)
+        try:
+            rbody = response.read()
+        except (socket.error, httplib.HTTPException), e:
+            conn.close()
+            self._handle_request_error(e)
+        self._release(key, conn, response)
+        return rbody, response.status, self._headers(response)
+
+    def request_stream(self, method, url, headers, post_data=None,
+                       chunk_size=65536):
+        key, conn, response = self._open(method, url, headers, post_data)
+
+        def chunks():
+            finished = False
+            try:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        finished = True
+                        return
+                    yield chunk
+            except (socket.error, httplib.HTTPException), e:
+                self._handle_request_error(e)
+            finally:
+                # A connection is only reusable once its response is read
+                if finished:
+                    self._release(key, conn, response)
+                else:
+                    conn.close()
+
+        return chunks(), response.status, self._headers(response)
+
+    def warmup(self, url, n_connections=1, headers=None):
+        key = self._pool_key(url)
+        parts = urlparse.urlsplit(url)
+        path = urlparse.urlunsplit(('', '', parts.path or '/', parts.query,
+                                    ''))
+        n_connections = min(n_connections, self.pool_size)
+        connections = [self._connect(key) for _ in xrange(n_connections)]
+
+        def warm(conn):
+            _connect_socket(conn)
+            # Reading a response also reads the session tickets that TLS
+            # 1.3 servers send after the handshake, which would otherwise
+            # leave the socket readable and the connection looking dropped
+            conn.request('GET', path, headers=headers or {})
+            conn.getresponse().read()
+
+        try:
+            handshakes = workers.WorkerPool(n_connections)
+            for result in handshakes.map(warm, connections):
+                if not result.ok:
+                    raise result.error
+        except (socket.error, httplib.HTTPException, ValueError), e:
+            for conn in connections:
+                conn.close()
+            self._handle_request_error(e)
+
+        for conn in connections:
+            self._checkin(key, conn)
+        return n_connections
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.itervalues():
+            for conn, _ in connections:
+                conn.close()
+
+    def _open(self, method, url, headers, post_data):
+        if sys.version_info >= (3, 0) and isinstance(post_data, basestring):
+            post_data = post_data.encode('utf-8')
+
+        key = self._pool_key(url)
+        scheme, netloc, path, query, _ = urlparse.urlsplit(url)
+        target = urlparse.urlunsplit(('', '', path or '/', query, ''))
+
+        conn, reused = self._checkout(key)
+        while True:
+            sent = False
+            try:
+                # A retry gets whatever is left of the deadline
+                connect_timeout, read_timeout = _timeouts(80, 80)
+                if conn.sock is None:
+                    conn.timeout = connect_timeout
+                    _connect_socket(conn)
+                conn.sock.settimeout(read_timeout)
+                conn.request(method.upper(), target, post_data, headers)
+                sent = True
+                return key, conn, conn.getresponse()
+            except (socket.error, httplib.HTTPException, ValueError), e:
+                conn.close()
+                # The server may close a kept-alive connection just as we
+                # send on it.  If it can't have seen the whole request, or
+                # handling it twice is harmless, the request can go out
+                # again on a new connection.  File bodies can only be sent
+                # once.
+                if reused and _is_disconnect(e) and \
+                        not hasattr(post_data, 'read') and \
+                        (not sent or _is_repeatable(method, headers)):
+                    conn, reused = self._connect(key), False
+                    continue
+                self._handle_request_error(e)
+
+    def _pool_key(self, url):
+        scheme, netloc = urlparse.urlsplit(url)[:2]
+        return scheme.lower(), netloc.lower()
+
+    def _connect(self, key):
+        scheme, netloc = key
+        if scheme != 'https':
+            return httplib.HTTPConnection(netloc, timeout=80)
+
+        context = self._ssl_context()
+        if context is None:
+            return httplib.HTTPSConnection(netloc, timeout=80)
+        return httplib.HTTPSConnection(netloc, timeout=80, context=context)
+
+    def _checkout(self, key):
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, since = idle.pop()
+                if now - since <= self.max_idle and not _is_dropped(conn):
+                    return conn, True
+                conn.close()
+        return self._connect(key), False
+
+    def _checkin(self, key, conn):
+        now = time.time()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            # The oldest connections sit at the front
+            while idle and now - idle[0][1] > self.max_idle:
+                idle.pop(0)[0].close()
+            if len(idle) < self.pool_size:
+                idle.append((conn, now))
+                return
+        conn.close()
+
+    def _release(self, key, conn, response):
+        if response.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+
+    def _headers(self, response):
+        return dict((k.lower(), v) for k, v in response.getheaders())
+
+
+def _connect_socket(conn):
+    conn.connect()
+    # Like urllib3, send small writes straight away instead of holding
+    # them back for the server's delayed ACKs
+    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def _is_dropped(conn):
+    # An idle connection has nothing to read unless the server has closed
+    # it, or sent something we can't make sense of
+    if conn.sock is None:
+        return True
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (select.error, socket.error, ValueError):
+        return True
+
+
+def _is_repeatable(method, headers):
+    if method in ('get', 'delete'):
+        return True
+    return any(name.lower() == 'idempotency-key' for name in headers)
+
+
+def _is_disconnect(e):
+    if isinstance(e, httplib.BadStatusLine):
+        return True
+    return isinstance(e, socket.error) and e.errno in (
+        errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
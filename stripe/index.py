@@ -0,0 +1,235 @@
+import bisect
+import threading
+
+from stripe import resource, util
+
+
+class InvertedIndex(object):
+    """
+    An in-memory index from field values to object ids, for lookups the
+    API can't do efficiently:
+
+        index = InvertedIndex(fields=['email'], metadata_keys=['user_id'],
+                              object_types=['customer'])
+        index.start()    # index objects as they are loaded
+        index.build(stripe.export.iter_records(stripe.Customer))
+
+        index.find('metadata.user_id', 123)
+        index.prefix('email', 'jenny@')
+
+    Top-level string `fields` and `metadata_keys` (looked up as
+    `metadata.<key>`) are indexed.  Values are compared as strings, and
+    case-insensitively unless `case_sensitive` is set.  Exact lookups are
+    dict lookups; prefix lookups bisect a sorted list of the values.
+
+    The index is kept current by `add`, `remove` and `apply` (for Events),
+    and, between `start` and `stop`, by every `refresh_from` of a
+    StripeObject.  It only holds ids: use `retrieve` to get the objects.
+    """
+
+    def __init__(self, fields=('email',), metadata_keys=(),
+                 object_types=None, case_sensitive=False):
+        self.fields = tuple(fields)
+        self.metadata_keys = tuple(metadata_keys)
+        self.object_types = object_types and frozenset(object_types)
+        self.case_sensitive = case_sensitive
+
+        self._lock = threading.Lock()
+        # index name -> value -> set of ids
+        self._postings = dict((name, {}) for name in self.names)
+        # index name -> sorted list of the values in _postings
+        self._values = dict((name, []) for name in self.names)
+        # id -> tuple of (index name, value) the object is indexed under
+        self._terms = {}
+
+    @property
+    def names(self):
+        return self.fields + tuple('metadata.%s' % (key,)
+                                   for key in self.metadata_keys)
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, id):
+        return id in self._terms
+
+    def normalize(self, value):
+        if not isinstance(value, basestring):
+            value = str(value)
+        if not self.case_sensitive:
+            value = value.lower()
+        return value
+
+    def _object_terms(self, obj):
+        terms = set()
+        for field in self.fields:
+            value = obj.get(field)
+            if isinstance(value, basestring) and value:
+                terms.add((field, self.normalize(value)))
+
+        metadata = obj.get('metadata')
+        if self.metadata_keys and isinstance(metadata, dict):
+            for key in self.metadata_keys:
+                value = metadata.get(key)
+                if value is not None and value != '':
+                    terms.add(('metadata.%s' % (key,), self.normalize(value)))
+
+        return tuple(sorted(terms))
+
+    def _indexable(self, obj):
+        return bool(obj.get('id')) and (
+            self.object_types is None or
+            obj.get('object') in self.object_types)
+
+    def add(self, obj):
+        """
+        Index (or re-index) a StripeObject or decoded JSON object.
+        """
+        if not self._indexable(obj):
+            return
+
+        id = obj['id']
+        terms = self._object_terms(obj)
+        with self._lock:
+            old = self._terms.get(id, ())
+            if old == terms:
+                return
+            self._unindex(id, old)
+            self._index(id, terms)
+
+    def build(self, objects):
+        """
+        Index many objects at once.  Each index's values are sorted once
+        at the end, rather than kept sorted as every new value arrives.
+        """
+        with self._lock:
+            for obj in objects:
+                if not self._indexable(obj):
+                    continue
+                id = obj['id']
+                terms = self._object_terms(obj)
+                old = self._terms.get(id, ())
+                if old != terms:
+                    self._unindex(id, old, keep_sorted=False)
+                    self._index(id, terms, keep_sorted=False)
+            self._sort_values()
+        return self
+
+    def remove(self, id):
+        with self._lock:
+            self._unindex(id, self._terms.get(id, ()))
+
+    def apply(self, event):
+        """
+        Update the index from a decoded Event: `*.deleted` events remove
+        the object and all others re-index it.
+        """
+        obj = (event.get('data') or {}).get('object') or {}
+        if not self._indexable(obj):
+            return
+        if event['type'].endswith('.deleted'):
+            self.remove(obj['id'])
+        else:
+            self.add(obj)
+
+    def _index(self, id, terms, keep_sorted=True):
+        # Without keep_sorted, _values is left for _sort_values to rebuild
+        for name, value in terms:
+            ids = self._postings[name].get(value)
+            if ids is None:
+                ids = self._postings[name][value] = set()
+                if keep_sorted:
+                    bisect.insort(self._values[name], value)
+            ids.add(id)
+        if terms:
+            self._terms[id] = terms
+
+    def _unindex(self, id, terms, keep_sorted=True):
+        for name, value in terms:
+            ids = self._postings[name][value]
+            ids.discard(id)
+            if not ids:
+                del self._postings[name][value]
+                if keep_sorted:
+                    values = self._values[name]
+                    del values[bisect.bisect_left(values, value)]
+        self._terms.pop(id, None)
+
+    def _sort_values(self):
+        for name, postings in self._postings.iteritems():
+            self._values[name] = sorted(postings)
+
+    def _postings_for(self, name):
+        try:
+            return self._postings[name]
+        except KeyError:
+            raise ValueError('%r is not indexed; expected one of %s' %
+                             (name, ', '.join(self.names)))
+
+    def find(self, name, value):
+        """
+        Return the sorted ids of the objects whose `name` equals `value`.
+        """
+        postings = self._postings_for(name)
+        with self._lock:
+            return sorted(postings.get(self.normalize(value), ()))
+
+    def find_one(self, name, value):
+        ids = self.find(name, value)
+        return ids[0] if ids else None
+
+    def prefix(self, name, prefix, limit=None):
+        """
+        Return the ids of the objects whose `name` starts with `prefix`,
+        ordered by value.
+        """
+        postings = self._postings_for(name)
+        prefix = self.normalize(prefix)
+        ids = []
+
+        with self._lock:
+            values = self._values[name]
+            i = bisect.bisect_left(values, prefix)
+            while i < len(values) and values[i].startswith(prefix):
+                ids.extend(sorted(postings[values[i]]))
+                if limit is not None and len(ids) >= limit:
+                    return ids[:limit]
+                i += 1
+        return ids
+
+    def retrieve(self, klass, name, value, **params):
+        """
+        Return the objects of `klass` matching `value`, by way of
+        `klass.retrieve_many` and hence `stripe.object_cache`.
+        """
+        return klass.retrieve_many(self.find(name, value), **params)
+
+    def start(self):
+        resource.add_refresh_listener(self.add)
+
+    def stop(self):
+        resource.remove_refresh_listener(self.add)
+
+    def save(self, fileobj):
+        with self._lock:
+            state = {
+                'fields': self.fields,
+                'metadata_keys': self.metadata_keys,
+                'object_types': sorted(self.object_types or []) or None,
+                'case_sensitive': self.case_sensitive,
+                'terms': self._terms,
+            }
+            util.json.dump(state, fileobj, sort_keys=True)
+
+    @classmethod
+    def load(cls, fileobj):
+        state = util.json.load(fileobj)
+        index = cls(fields=state['fields'],
+                    metadata_keys=state['metadata_keys'],
+                    object_types=state['object_types'],
+                    case_sensitive=state['case_sensitive'])
+        for id, terms in state['terms'].iteritems():
+            index._index(id, tuple(tuple(term) for term in terms),
+                         keep_sorted=False)
+        index._sort_values()
+        return index
@@ -0,0 +1,283 @@
+import sqlite3
+import threading
+
+from stripe import events, export, resource, util
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS objects (
+        id TEXT PRIMARY KEY,
+        object TEXT NOT NULL,
+        customer TEXT,
+        charge TEXT,
+        plan TEXT,
+        created INTEGER,
+        data TEXT NOT NULL
+    )""",
+    'CREATE INDEX IF NOT EXISTS objects_customer '
+    'ON objects (object, customer)',
+    'CREATE INDEX IF NOT EXISTS objects_charge ON objects (object, charge)',
+    'CREATE INDEX IF NOT EXISTS objects_plan ON objects (object, plan)',
+    'CREATE INDEX IF NOT EXISTS objects_created '
+    'ON objects (object, created)',
+    'CREATE TABLE IF NOT EXISTS applied_events (id TEXT PRIMARY KEY)',
+    """CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )""",
+]
+
+FOREIGN_KEYS = ('customer', 'charge', 'plan')
+
+# Lists embedded in bootstrapped objects whose items are mirrored too,
+# for resources that can't be listed on their own.  Only the items the
+# API embeds are stored; later changes arrive through events.
+EMBEDDED_LISTS = {
+    'customer': ['subscriptions'],
+}
+
+CREATED_OPERATORS = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+
+class Mirror(object):
+    """
+    A local SQLite copy of Stripe objects for answering queries like "all
+    charges for customer X" without calling the API.
+
+        mirror = Mirror('stripe.db')
+        mirror.bootstrap([stripe.Customer, stripe.Charge, stripe.Plan])
+        ...
+        mirror.sync()
+        charges = mirror.find('charge', customer='cus_6jEGA5j3G4xs')
+
+    `bootstrap` copies every object of the given resources and remembers
+    the newest Event; `sync` then applies the events created since, in
+    order, and moves that cursor forward.  Events are only kept by the API
+    for 30 days, so sync at least that often.
+
+    A mirror may be used from several threads, such as the workers of an
+    EventConsumer or WebhookPipeline; they take turns on its connection.
+    """
+
+    def __init__(self, path=':memory:', api_key=None, stripe_account=None):
+        self.api_key = api_key
+        self.stripe_account = stripe_account
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        with self._lock, self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    # Sync state
+
+    def _get_state(self, key):
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT value FROM sync_state WHERE key = ?',
+                (key,)).fetchone()
+        return row and row[0]
+
+    def _set_state(self, key, value):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)',
+            (key, value))
+
+    @property
+    def cursor(self):
+        """
+        The id of the last applied Event, '' if there were no events at
+        bootstrap, or None if the mirror was never bootstrapped.
+        """
+        return self._get_state('cursor')
+
+    @property
+    def object_types(self):
+        types = self._get_state('object_types')
+        return set(types.split(',')) if types else set()
+
+    # Writing
+
+    def bootstrap(self, resources, page_size=100):
+        """
+        Copy every object of the `ListableAPIResource` classes in
+        `resources` into the mirror and start tracking events from now.
+        """
+        cursor = events.latest_event_id(self.api_key,
+                                        self.stripe_account) or ''
+
+        types = self.object_types
+        for klass in resources:
+            types.add(klass.class_name())
+            records = export.iter_records(
+                klass, api_key=self.api_key,
+                stripe_account=self.stripe_account, page_size=page_size)
+            with self._lock, self.connection:
+                for record in records:
+                    types.add(record['object'])
+                    self._upsert(record)
+                    for embedded in self._embedded(record):
+                        types.add(embedded['object'])
+                        self._upsert(embedded)
+
+        with self._lock, self.connection:
+            self._set_state('object_types', ','.join(sorted(types)))
+            self._set_state('cursor', cursor)
+
+    def _embedded(self, record):
+        for field in EMBEDDED_LISTS.get(record['object'], ()):
+            embedded = record.get(field)
+            if isinstance(embedded, dict):
+                for item in embedded.get('data') or []:
+                    yield item
+
+    def _upsert(self, obj):
+        row = [obj['id'], obj['object']]
+        for key in FOREIGN_KEYS:
+            value = obj.get(key)
+            if isinstance(value, dict):
+                value = value.get('id')
+            row.append(value)
+        row.append(obj.get('created'))
+        row.append(util.json.dumps(obj))
+
+        self.connection.execute(
+            'INSERT OR REPLACE INTO objects '
+            '(id, object, customer, charge, plan, created, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', row)
+
+    def _delete(self, id):
+        self.connection.execute('DELETE FROM objects WHERE id = ?', (id,))
+
+    def apply(self, event, object_types=None):
+        """
+        Apply one decoded Event to the mirror, in its own transaction.
+        Returns whether it changed a mirrored object.
+        """
+        if object_types is None:
+            object_types = self.object_types
+
+        with self._lock, self.connection:
+            return self._apply(event, object_types)
+
+    def _apply(self, event, object_types):
+        self.connection.execute(
+            'INSERT OR IGNORE INTO applied_events (id) VALUES (?)',
+            (event['id'],))
+
+        obj = (event.get('data') or {}).get('object') or {}
+        if obj.get('object') not in object_types or not obj.get('id'):
+            return False
+
+        if event['type'].endswith('.deleted'):
+            self._delete(obj['id'])
+        else:
+            self._upsert(obj)
+        return True
+
+    def _new_events(self, page_size):
+        cursor = self.cursor
+        if cursor is None:
+            raise ValueError(
+                'The mirror has not been bootstrapped yet; call '
+                'Mirror.bootstrap before Mirror.sync.')
+
+        # An empty cursor means there were no events at all when we
+        # bootstrapped, so all of them are new.
+        return events.iter_event_pages(cursor, api_key=self.api_key,
+                                       stripe_account=self.stripe_account,
+                                       page_size=page_size)
+
+    def sync(self, page_size=100):
+        """
+        Apply all events created since the last sync (or the bootstrap) in
+        the order they happened.  Each page is applied in one transaction
+        together with the cursor, so an interrupted sync resumes where it
+        left off.  Returns the number of events read.
+        """
+        object_types = self.object_types
+        count = 0
+
+        for page in self._new_events(page_size):
+            with self._lock, self.connection:
+                for event in page:
+                    self._apply(event, object_types)
+                self._set_state('cursor', page[-1]['id'])
+            count += len(page)
+
+        return count
+
+    # Querying
+
+    def _convert(self, data):
+        return resource.convert_to_stripe_object(
+            util.load_json(data), self.api_key, self.stripe_account)
+
+    def get(self, id):
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT data FROM objects WHERE id = ?', (id,)).fetchone()
+        return row and self._convert(row[0])
+
+    def has_event(self, id):
+        """
+        Return whether the Event `id` was applied to the mirror, e.g. to
+        confirm the positives of a `stripe.dedupe.BloomDedupeStore`.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT 1 FROM applied_events WHERE id = ?',
+                (id,)).fetchone()
+        return row is not None
+
+    def find(self, object, customer=None, charge=None, plan=None,
+             created=None, limit=None):
+        """
+        Return the mirrored objects of type `object` (e.g. 'charge') that
+        match the given foreign keys, newest first.  `created` is a
+        timestamp or, as in the API, a dict of gt/gte/lt/lte bounds.
+        """
+        clauses = ['object = ?']
+        args = [object]
+
+        for key, value in (('customer', customer), ('charge', charge),
+                           ('plan', plan)):
+            if value is not None:
+                clauses.append('%s = ?' % (key,))
+                args.append(value)
+
+        if isinstance(created, dict):
+            for op, bound in sorted(created.iteritems()):
+                try:
+                    clauses.append('created %s ?' % (CREATED_OPERATORS[op],))
+                except KeyError:
+                    raise ValueError(
+                        'Unknown created filter %r; expected one of %s' %
+                        (op, ', '.join(sorted(CREATED_OPERATORS))))
+                args.append(bound)
+        elif created is not None:
+            clauses.append('created = ?')
+            args.append(created)
+
+        sql = ('SELECT data FROM objects WHERE %s '
+               'ORDER BY created DESC, id' % (' AND '.join(clauses),))
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args.append(limit)
+
+        with self._lock:
+            rows = self.connection.execute(sql, args).fetchall()
+        return [self._convert(row[0]) for row in rows]
+
+    def count(self, object=None):
+        with self._lock:
+            if object is None:
+                row = self.connection.execute(
+                    'SELECT COUNT(*) FROM objects').fetchone()
+            else:
+                row = self.connection.execute(
+                    'SELECT COUNT(*) FROM objects WHERE object = ?',
+                    (object,)).fetchone()
+        return row[0]
@@ -1,14 +1,19 @@
+import io
+import mmap
+import os
 import random
+import stat
 import sys
-import io
 
 
 class MultipartDataGenerator(object):
     def __init__(self, chunk_size=1028):
+        self.parts = []
         self.data = io.BytesIO()
         self.line_break = "\r\n"
         self.boundary = self._initialize_boundary()
         self.chunk_size = chunk_size
+        self._finished = False
 
     def add_params(self, params):
         for key, value in params.iteritems():
@@ -25,7 +30,7 @@ class MultipartDataGenerator(object):
                 self._write(self.line_break)
                 self._write(self.line_break)
 
-                self._write_file(value)
+                self._add_file(value)
             else:
                 self._write("Content-Disposition: form-data; name=\"%s\"" %
                             (key,))
@@ -38,10 +43,24 @@ class MultipartDataGenerator(object):
     def param_header(self):
         return "--%s" % self.boundary
 
+    def get_body(self, chunk_size=65536):
+        """
+        Return the body as a MultipartBody, which reads files as it is
+        sent instead of copying them into memory up front.
+        """
+        self._finish()
+        return MultipartBody(self.parts, chunk_size)
+
     def get_post_data(self):
-        self._write("--%s--" % (self.boundary,))
-        self._write(self.line_break)
-        return self.data.getvalue()
+        with self.get_body(self.chunk_size) as body:
+            return body.read()
+
+    def _finish(self):
+        if not self._finished:
+            self._write("--%s--" % (self.boundary,))
+            self._write(self.line_break)
+            self._flush()
+            self._finished = True
 
     def _write(self, value):
         if sys.version_info < (3, 0):
@@ -49,12 +68,130 @@ class MultipartDataGenerator(object):
         else:
             self.data.write(bytes(value, 'utf-8'))
 
-    def _write_file(self, f):
-        while True:
-            file_contents = f.read(self.chunk_size)
-            if not file_contents:
-                break
-            self._write(file_contents)
+    def _flush(self):
+        if self.data.tell():
+            self.parts.append(self.data.getvalue())
+            self.data = io.BytesIO()
+
+    def _add_file(self, f):
+        self._flush()
+        self.parts.append(f)
 
     def _initialize_boundary(self):
         return random.randint(0, 2**63)
+
+
+class MultipartBody(object):
+    """
+    A file-like multipart/form-data body of a known length.  Files on disk
+    are memory-mapped and sliced as the body is read; other file objects
+    are read into memory once.
+    """
+
+    def __init__(self, parts, chunk_size=65536):
+        self.chunk_size = chunk_size
+        self._segments = []
+        for part in parts:
+            if hasattr(part, 'read'):
+                self._segments.append(_file_segment(part))
+            else:
+                self._segments.append(_BytesSegment(part))
+        self._length = sum(len(segment) for segment in self._segments)
+        self._index = 0
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+
+        chunks = []
+        while size > 0 and self._index < len(self._segments):
+            chunk = self._segments[self._index].read(size)
+            if chunk:
+                chunks.append(chunk)
+                size -= len(chunk)
+            else:
+                self._index += 1
+
+        if len(chunks) == 1:
+            return chunks[0]
+        return b''.join(chunks)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _BytesSegment(object):
+
+    def __init__(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        self._data = data
+        self._position = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def read(self, size):
+        chunk = self._data[self._position:self._position + size]
+        self._position += len(chunk)
+        return chunk
+
+    def close(self):
+        pass
+
+
+class _MappedFileSegment(object):
+
+    def __init__(self, mapped, start, end):
+        self._map = mapped
+        self._position = start
+        self._end = end
+        self._length = end - start
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size):
+        end = min(self._position + size, self._end)
+        chunk = self._map[self._position:end]
+        self._position = end
+        return chunk
+
+    def close(self):
+        self._map.close()
+
+
+def _file_segment(f):
+    # Only regular files on disk can be mapped; pipes, sockets and
+    # in-memory files are read from their current position instead.
+    try:
+        fileno = f.fileno()
+        info = os.fstat(fileno)
+        start = f.tell()
+    except (AttributeError, EnvironmentError, ValueError,
+            io.UnsupportedOperation):
+        info = None
+
+    if info is not None and stat.S_ISREG(info.st_mode) and \
+            info.st_size > start:
+        mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        return _MappedFileSegment(mapped, start, info.st_size)
+
+    return _BytesSegment(f.read())
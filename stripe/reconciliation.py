@@ -0,0 +1,206 @@
+import calendar
+import datetime
+import itertools
+
+from stripe import columnar, export, resource
+
+TRANSACTION_FIELDS = ['id', 'source', 'amount', 'fee', 'net', 'currency',
+                      'type', 'created']
+
+
+def timestamp(value):
+    """
+    Convert a date or a naive UTC datetime to a Unix timestamp.  Integers
+    are returned unchanged.
+    """
+    if isinstance(value, datetime.datetime):
+        return calendar.timegm(value.utctimetuple())
+    elif isinstance(value, datetime.date):
+        return calendar.timegm(value.timetuple())
+    return int(value)
+
+
+def balance_history(start, end, api_key=None, stripe_account=None,
+                    page_size=100, **params):
+    """
+    Stream the decoded balance transactions created in [start, end).
+    """
+    params['created'] = {'gte': timestamp(start), 'lt': timestamp(end)}
+    return export.iter_records(resource.BalanceTransaction, api_key=api_key,
+                               stripe_account=stripe_account,
+                               page_size=page_size, **params)
+
+
+def summarize(transactions):
+    """
+    Return {(type, currency, day): {'gross': ..., 'fee': ..., 'net': ...}}
+    for balance transaction records or columns built from them.
+    """
+    if not isinstance(transactions, columnar.Columns):
+        transactions = columnar.to_columns(transactions, TRANSACTION_FIELDS)
+
+    totals = {}
+    groups = columnar.group_sum(transactions, ['amount', 'fee', 'net'],
+                                ['type', 'currency', 'day'])
+    for key, sums in groups.iteritems():
+        totals[key] = {'gross': sums['amount'], 'fee': sums['fee'],
+                       'net': sums['net']}
+    return totals
+
+
+class ReconciliationReport(object):
+
+    def __init__(self, totals):
+        self.totals = totals
+        self.matched = 0
+        # (source, amount, currency) for transactions with no ledger entry
+        self.missing_from_ledger = []
+        # (source, amount, currency) for ledger entries with no transaction
+        self.missing_from_stripe = []
+        # (source, stripe amount, stripe currency, ledger amount, ledger
+        # currency)
+        self.mismatched = []
+
+    @property
+    def ok(self):
+        return not (self.missing_from_ledger or self.missing_from_stripe or
+                    self.mismatched)
+
+    def lines(self):
+        """
+        Yield the differences one per line: `-` for transactions missing
+        from the ledger, `+` for ledger entries missing from Stripe and `~`
+        for amounts or currencies that differ.
+        """
+        for source, amount, currency in self.missing_from_ledger:
+            yield '- %s %s' % (source, _money(amount, currency))
+        for source, amount, currency in self.missing_from_stripe:
+            yield '+ %s %s' % (source, _money(amount, currency))
+        for (source, stripe_amount, stripe_currency, ledger_amount,
+             ledger_currency) in self.mismatched:
+            yield '~ %s %s != %s' % (
+                source, _money(stripe_amount, stripe_currency),
+                _money(ledger_amount, ledger_currency))
+
+    def __str__(self):
+        header = ('%d matched, %d missing from ledger, %d missing from '
+                  'Stripe, %d mismatched' % (
+                      self.matched, len(self.missing_from_ledger),
+                      len(self.missing_from_stripe), len(self.mismatched)))
+        return '\n'.join([header] + list(self.lines()))
+
+    def __repr__(self):
+        return '<ReconciliationReport %s>' % (str(self).split('\n', 1)[0],)
+
+
+def _money(amount, currency):
+    if currency is None:
+        return '%d' % (amount,)
+    return '%d %s' % (amount, currency)
+
+
+def _ledger_entry(entry):
+    if isinstance(entry, dict):
+        return entry['source'], entry['amount'], entry.get('currency')
+    source, amount = entry
+    return source, amount, None
+
+
+def index_ledger(ledger):
+    """
+    Index ledger entries by source id, summing the amounts of entries that
+    share a source.  Entries are mappings with `source`, `amount` and
+    optionally `currency` keys, or (source, amount) pairs.  Returns
+    ({source: amount}, {source: currency}).
+    """
+    amounts = {}
+    currencies = {}
+    for entry in ledger:
+        source, amount, currency = _ledger_entry(entry)
+        if currency is not None:
+            currencies[source] = currency
+
+        if source in amounts:
+            amounts[source] += amount
+        else:
+            amounts[source] = amount
+    return amounts, currencies
+
+
+def _source_id(source, id):
+    # Transactions without a source, such as some adjustments, can only
+    # be matched on their own id
+    if isinstance(source, dict):
+        return source['id']
+    return source or id
+
+
+def _stripe_amounts(columns):
+    sources = [_source_id(source, id) for source, id in
+               itertools.izip(columns['source'].to_list(),
+                              columns['id'].to_list())]
+    amounts = columns['amount'].to_list()
+
+    index = dict(itertools.izip(sources, amounts))
+    if len(index) < len(sources):
+        index = {}
+        for source, amount in itertools.izip(sources, amounts):
+            index[source] = index.get(source, 0) + amount
+
+    currencies = dict(itertools.izip(sources, columns['currency'].to_list()))
+    return index, currencies
+
+
+def reconcile(transactions, ledger):
+    """
+    Compare balance transactions against a ledger on source ids (a charge,
+    refund or transfer id) and their gross amounts in the smallest
+    currency unit.  Returns a ReconciliationReport that also carries the
+    per type/currency/day totals of the transactions.
+    """
+    if not isinstance(transactions, columnar.Columns):
+        transactions = columnar.to_columns(transactions, TRANSACTION_FIELDS)
+
+    report = ReconciliationReport(summarize(transactions))
+    stripe_amounts, stripe_currencies = _stripe_amounts(transactions)
+    ledger_amounts, ledger_currencies = index_ledger(ledger)
+
+    stripe_sources = stripe_amounts.viewkeys()
+    ledger_sources = ledger_amounts.viewkeys()
+    common = stripe_sources & ledger_sources
+
+    mismatched = set(source for source in common
+                     if stripe_amounts[source] != ledger_amounts[source])
+    for source, currency in ledger_currencies.iteritems():
+        if source in common and currency != stripe_currencies[source]:
+            mismatched.add(source)
+
+    report.matched = len(common) - len(mismatched)
+    report.missing_from_ledger = sorted(
+        (source, stripe_amounts[source], stripe_currencies[source])
+        for source in stripe_sources - ledger_sources)
+    report.missing_from_stripe = sorted(
+        (source, ledger_amounts[source], ledger_currencies.get(source))
+        for source in ledger_sources - stripe_sources)
+    report.mismatched = sorted(
+        (source, stripe_amounts[source], stripe_currencies[source],
+         ledger_amounts[source], ledger_currencies.get(source))
+        for source in mismatched)
+    return report
+
+
+def reconcile_range(start, end, ledger, api_key=None, stripe_account=None,
+                    **params):
+    """
+    Reconcile the balance transactions created in [start, end) against
+    `ledger`:
+
+        report = reconcile_range(datetime.date(2015, 7, 1),
+                                 datetime.date(2015, 7, 2),
+                                 ledger_entries_for_day())
+        if not report.ok:
+            print report
+    """
+    transactions = balance_history(start, end, api_key=api_key,
+                                   stripe_account=stripe_account, **params)
+    return reconcile(transactions, ledger)
@@ -1,8 +1,24 @@
+import os
 import urllib
 import warnings
 import sys
 
-from stripe import api_requestor, error, util, upload_api_base
+from stripe import (
+    api_requestor, cache, error, http_client, util, workers, upload_api_base)
+
+# Callables notified with every StripeObject after its refresh_from
+_refresh_listeners = []
+
+
+def add_refresh_listener(listener):
+    _refresh_listeners.append(listener)
+
+
+def remove_refresh_listener(listener):
+    try:
+        _refresh_listeners.remove(listener)
+    except ValueError:
+        pass
 
 
 def convert_to_stripe_object(resp, api_key, account):
@@ -33,6 +49,87 @@ def convert_to_stripe_object(resp, api_key, account):
         return resp
 
 
+def _reference_types():
+    return {'account': Account, 'application_fee': ApplicationFee,
+            'balance_transaction': BalanceTransaction, 'charge': Charge,
+            'coupon': Coupon, 'customer': Customer, 'invoice': Invoice,
+            'plan': Plan, 'recipient': Recipient,
+            'source_transfer': Transfer, 'transfer': Transfer}
+
+
+def _reference_class(field, klass=None):
+    if klass is not None:
+        return klass
+    try:
+        return _reference_types()[field]
+    except KeyError:
+        raise ValueError(
+            "Don't know which kind of object the %r field refers to. "
+            "Pass the resource class explicitly, e.g. "
+            "obj.resolve(%r, stripe.Customer)" % (field, field))
+
+
+_resolve_flight = cache.SingleFlight()
+
+
+def _cache_key(id, api_key, stripe_account):
+    # Objects fetched with other credentials are cached apart, so that one
+    # account's objects are never handed to another, even when the global
+    # key is switched between requests
+    if not api_key:
+        from stripe import api_key
+    return id, api_key, stripe_account
+
+
+def _resolve_reference(klass, id, api_key, stripe_account):
+    from stripe import object_cache
+
+    cache_key = _cache_key(id, api_key, stripe_account)
+    if object_cache is not None:
+        cached = object_cache.get(cache_key, klass)
+        if cached is not None:
+            return cached
+
+    def fetch():
+        instance = klass(id, api_key, stripe_account=stripe_account)
+        instance.refresh()
+        if object_cache is not None:
+            object_cache.set(instance, cache_key)
+        return instance
+
+    return _resolve_flight.do((klass,) + cache_key, fetch)
+
+
+def prefetch(objects, field, klass=None, concurrency=10):
+    """
+    Resolve `field` on every object in one concurrent burst, so that later
+    calls to `obj.resolve(field)` don't hit the network:
+
+        charges = stripe.Charge.all(limit=100).data
+        stripe.resource.prefetch(charges, 'customer')
+        emails = [charge.resolve('customer').email for charge in charges]
+
+    Objects whose reference couldn't be retrieved are left unresolved.
+    """
+    klass = _reference_class(field, klass)
+
+    groups = {}
+    for obj in objects:
+        value = obj.get(field)
+        if isinstance(value, basestring) and value:
+            group = groups.setdefault((obj.api_key, obj.stripe_account), [])
+            group.append(obj)
+
+    for (api_key, stripe_account), group in groups.iteritems():
+        ids = [obj[field] for obj in group]
+        resolved = klass.retrieve_many(ids, api_key=api_key,
+                                       concurrency=concurrency,
+                                       stripe_account=stripe_account)
+        for obj, value in zip(group, resolved):
+            if isinstance(value, StripeObject):
+                obj._remember_resolved(field, value)
+
+
 def populate_headers(idempotency_key):
     if idempotency_key is not None:
         return {"Idempotency-Key": idempotency_key}
@@ -170,6 +267,34 @@ class StripeObject(dict):
 
         self._previous = values
 
+        if _refresh_listeners:
+            for listener in list(_refresh_listeners):
+                listener(self)
+
+    def resolve(self, field, klass=None):
+        """
+        Return the object an id field such as `charge.customer` refers to,
+        retrieving it if necessary.  Retrieval goes through
+        `stripe.object_cache` when one is configured, and concurrent
+        resolutions of the same id share a single request.  Fields that
+        were expanded in the response are returned as is.
+        """
+        value = self[field]
+        if value is None or isinstance(value, StripeObject):
+            return value
+
+        resolved = self.__dict__.get('_resolved', {}).get(field)
+        if resolved is not None and resolved.get('id') == value:
+            return resolved
+
+        resolved = _resolve_reference(_reference_class(field, klass), value,
+                                      self.api_key, self.stripe_account)
+        self._remember_resolved(field, resolved)
+        return resolved
+
+    def _remember_resolved(self, field, obj):
+        self.__dict__.setdefault('_resolved', {})[field] = obj
+
     @classmethod
     def api_base(cls):
         return None
@@ -257,6 +382,73 @@ class APIResource(StripeObject):
         instance.refresh()
         return instance
 
+    @classmethod
+    def retrieve_many(cls, ids, api_key=None, concurrency=10,
+                      stripe_account=None, **params):
+        """
+        Retrieve several objects in parallel over a shared connection pool.
+
+        Returns a list in the same order as `ids`.  Objects that could not
+        be retrieved are replaced by the `StripeError` raised for them, so
+        a single failure doesn't sink the whole batch.  Requests go through
+        `stripe.default_http_client`, which is set to a pooled client if it
+        is unset.
+
+        When `stripe.object_cache` is set it is consulted before any
+        request is made, and populated with whatever is fetched, separately
+        for each API key and account.  It is skipped when `params`, such as
+        `expand`, are given, since those change what is returned.
+        """
+        # Params change what is returned, so those objects aren't cached
+        if params:
+            object_cache = None
+        else:
+            from stripe import object_cache
+
+        ids = list(ids)
+        found = {}
+        if object_cache is not None:
+            for id in ids:
+                cached = object_cache.get(
+                    _cache_key(id, api_key, stripe_account), cls)
+                if cached is not None:
+                    found[id] = cached
+
+        missing = []
+        for id in ids:
+            if id not in found and id not in missing:
+                missing.append(id)
+
+        if missing:
+            client = api_requestor.shared_http_client(concurrency)
+
+            def fetch(id):
+                instance = cls(id, api_key, stripe_account=stripe_account,
+                               **params)
+                requestor = api_requestor.APIRequestor(
+                    api_key, client=client, api_base=cls.api_base(),
+                    account=stripe_account)
+                try:
+                    response, my_api_key = requestor.request(
+                        'get', instance.instance_url(), params)
+                except error.StripeError, e:
+                    return e
+
+                instance.refresh_from(response, my_api_key,
+                                      stripe_account=stripe_account)
+                if object_cache is not None:
+                    object_cache.set(
+                        instance, _cache_key(id, api_key, stripe_account))
+                return instance
+
+            pool = workers.WorkerPool(min(concurrency, len(missing)))
+            for result in pool.imap_unordered(fetch, missing):
+                if not result.ok:
+                    raise result.error
+                found[result.item] = result.value
+
+        return [found[id] for id in ids]
+
     def refresh(self):
         self.refresh_from(self.request('get', self.instance_url()))
         return self
@@ -303,6 +495,16 @@ class ListObject(StripeObject):
 
         return self.request('get', url, params)
 
+    # columnar is imported here rather than at the top, as it pulls in
+    # numpy, which is slow to import
+    def to_columns(self, fields=None, kinds=None):
+        from stripe import columnar
+        return columnar.to_columns(self, fields, kinds)
+
+    def to_numpy(self, fields=None, kinds=None):
+        from stripe import columnar
+        return columnar.to_numpy(self, fields, kinds)
+
 
 class SingletonAPIResource(APIResource):
 
@@ -702,8 +904,100 @@ class FileUpload(ListableAPIResource):
 
     @classmethod
     def create(cls, api_key=None, stripe_account=None, **params):
+        return cls._create(None, api_key, stripe_account, params)
+
+    @classmethod
+    def create_many(cls, files, purpose=None, concurrency=4, api_key=None,
+                    stripe_account=None, **params):
+        """
+        Upload several files in parallel.
+
+        The uploads share a connection pool of their own, so that large
+        files don't hold up the connections used for other API calls.
+        Returns a list in the same order as `files`; files that could not
+        be uploaded are replaced by the `StripeError` raised for them.
+        """
+        from stripe import verify_ssl_certs
+
+        files = list(files)
+        if not files:
+            return []
+
+        concurrency = min(concurrency, len(files))
+        client = http_client.new_pooled_http_client(
+            concurrency, verify_ssl_certs=verify_ssl_certs)
+
+        def upload(f):
+            file_params = dict(params, file=f)
+            if purpose is not None:
+                file_params['purpose'] = purpose
+            try:
+                return cls._create(client, api_key, stripe_account,
+                                   file_params)
+            except error.StripeError, e:
+                return e
+
+        pool = workers.WorkerPool(concurrency)
+        results = []
+        try:
+            for result in pool.map(upload, files):
+                if not result.ok:
+                    raise result.error
+                results.append(result.value)
+        finally:
+            client.close()
+        return results
+
+    def iter_content(self, chunk_size=65536):
+        """
+        Yield the contents of the file in chunks of at most `chunk_size`
+        bytes, streamed from its `url` with this object's credentials.
+        Raises InvalidRequestError, without sending them, if `url` is not
+        on a Stripe host.
+        """
+        requestor = api_requestor.APIRequestor(
+            self.api_key, api_base=self.api_base(),
+            account=self.stripe_account)
+        chunks, _ = requestor.request_stream(self.url, chunk_size=chunk_size)
+        return chunks
+
+    def download(self, dest, chunk_size=65536, hash=None):
+        """
+        Stream the contents of the file to `dest`, a path, an object with
+        a `write` method or a callable taking each chunk, and return the
+        number of bytes written.
+
+        A path is written to a temporary file next to it and renamed into
+        place once the download completes.  Pass a `hashlib` object as
+        `hash` to have it updated with the contents as they go by.
+        """
+        if isinstance(dest, basestring):
+            tmp = '%s.part' % (dest,)
+            done = False
+            try:
+                with open(tmp, 'wb') as f:
+                    size = self.download(f, chunk_size, hash)
+                os.rename(tmp, dest)
+                done = True
+            finally:
+                if not done and os.path.exists(tmp):
+                    os.remove(tmp)
+            return size
+
+        write = getattr(dest, 'write', dest)
+        size = 0
+        for chunk in self.iter_content(chunk_size):
+            if hash is not None:
+                hash.update(chunk)
+            write(chunk)
+            size += len(chunk)
+        return size
+
+    @classmethod
+    def _create(cls, client, api_key, stripe_account, params):
         requestor = api_requestor.APIRequestor(
-            api_key, api_base=cls.api_base(), account=stripe_account)
+            api_key, client=client, api_base=cls.api_base(),
+            account=stripe_account)
         url = cls.class_url()
         supplied_headers = {
             "Content-Type": "multipart/form-data"
@@ -0,0 +1,119 @@
+"""
+A stand-in for App Engine's `google.appengine.api.urlfetch`, so that
+UrlFetchClient can be tested off the platform.  Patch a FakeUrlFetch in as
+`stripe.http_client.urlfetch` and queue up its responses with
+`add_response`; they are handed out in the order fetches are made.
+"""
+
+
+class Error(Exception):
+    pass
+
+
+class InvalidURLError(Error):
+    pass
+
+
+class DownloadError(Error):
+    pass
+
+
+class DeadlineExceededError(DownloadError):
+    pass
+
+
+class ResponseTooLargeError(Error):
+    pass
+
+
+class _URLFetchResult(object):
+
+    def __init__(self, content, status_code, headers):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers
+
+
+class RPC(object):
+
+    def __init__(self, urlfetch, deadline=None, callback=None):
+        self.deadline = deadline
+        self.callback = callback
+        self.request = None
+        self._urlfetch = urlfetch
+        self._response = None
+        self._done = False
+
+    def wait(self):
+        if self.request is not None and not self._done:
+            self._done = True
+            self._urlfetch.in_flight -= 1
+            if self.callback is not None:
+                self.callback()
+
+    def get_result(self):
+        if self.request is None:
+            raise AssertionError('get_result called before make_fetch_call')
+        self.wait()
+
+        content, status_code, headers, error = self._response
+        if error is not None:
+            raise error
+        return _URLFetchResult(content, status_code, headers)
+
+
+class FakeUrlFetch(object):
+    """
+    Records every fetch in `calls`, and the most fetches that were ever
+    in flight at once in `max_in_flight`.
+    """
+
+    Error = Error
+    InvalidURLError = InvalidURLError
+    DownloadError = DownloadError
+    DeadlineExceededError = DeadlineExceededError
+    ResponseTooLargeError = ResponseTooLargeError
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._responses = []
+
+    def add_response(self, content='{}', status_code=200, headers=None,
+                     error=None):
+        self._responses.append((content, status_code, headers or {}, error))
+
+    def create_rpc(self, deadline=None, callback=None):
+        return RPC(self, deadline, callback)
+
+    def make_fetch_call(self, rpc, url, payload=None, method='GET',
+                        headers={}, allow_truncated=False,
+                        follow_redirects=True, validate_certificate=None):
+        if not url.startswith(('http://', 'https://')):
+            raise InvalidURLError('Invalid request URL: %s' % (url,))
+        if not self._responses:
+            raise AssertionError('No response queued for %s' % (url,))
+
+        rpc.request = {
+            'url': url,
+            'payload': payload,
+            'method': method,
+            'headers': headers,
+            'validate_certificate': validate_certificate,
+            'deadline': rpc.deadline,
+        }
+        rpc._response = self._responses.pop(0)
+        self.calls.append(rpc.request)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def fetch(self, url, payload=None, method='GET', headers={},
+              allow_truncated=False, follow_redirects=True, deadline=None,
+              validate_certificate=None):
+        rpc = self.create_rpc(deadline=deadline)
+        self.make_fetch_call(rpc, url, payload, method, headers,
+                             allow_truncated, follow_redirects,
+                             validate_certificate)
+        return rpc.get_result()
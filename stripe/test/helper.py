@@ -110,7 +110,9 @@ SAMPLE_INVOICE = stripe.util.json.loads("""
 
 
 class StripeTestCase(unittest2.TestCase):
-    RESTORE_ATTRIBUTES = ('api_version', 'api_key')
+    RESTORE_ATTRIBUTES = ('api_version', 'api_key', 'object_cache',
+                          'default_http_client', 'hedging_policy',
+                          'circuit_breaker')
 
     def setUp(self):
         super(StripeTestCase, self).setUp()
@@ -169,11 +171,17 @@ class StripeUnitTestCase(StripeTestCase):
             self.request_mocks[lib] = patcher.start()
             self.request_patchers[lib] = patcher
 
+        # Sessions made from the mocked libraries mustn't outlive the test
+        self.sessions_patcher = patch.dict(stripe.http_client._sessions,
+                                           clear=True)
+        self.sessions_patcher.start()
+
     def tearDown(self):
         super(StripeUnitTestCase, self).tearDown()
 
         for patcher in self.request_patchers.itervalues():
             patcher.stop()
+        self.sessions_patcher.stop()
 
 
 class StripeApiTestCase(StripeTestCase):
@@ -0,0 +1,169 @@
+import unittest2
+
+from mock import patch
+
+import stripe
+
+from stripe import breakers
+
+
+class CircuitBreakerTests(unittest2.TestCase):
+
+    def setUp(self):
+        self.time_patcher = patch('stripe.breakers.time')
+        self.time_mock = self.time_patcher.start()
+        self.time_mock.time.return_value = 1000.0
+
+        self.transitions = []
+        self.breaker = breakers.CircuitBreaker(
+            failure_rate=0.5, min_requests=4, window=4, reset_timeout=30)
+        self.breaker.add_listener(
+            lambda *transition: self.transitions.append(transition))
+        self.key = self.breaker.key('https://api.stripe.com')
+
+    def tearDown(self):
+        self.time_patcher.stop()
+
+    def succeed(self, key=None):
+        with self.breaker.guard(key or self.key):
+            pass
+
+    def fail(self, key=None):
+        try:
+            with self.breaker.guard(key or self.key):
+                raise stripe.error.APIConnectionError('refused')
+        except stripe.error.CircuitOpenError:
+            raise
+        except stripe.error.APIConnectionError:
+            pass
+
+    def test_opens_at_failure_rate(self):
+        self.succeed()
+        self.fail()
+        self.fail()
+        self.assertEqual(breakers.CLOSED, self.breaker.state(self.key))
+
+        self.succeed()
+        self.assertEqual(breakers.OPEN, self.breaker.state(self.key))
+        self.assertEqual([(self.key, breakers.CLOSED, breakers.OPEN)],
+                         self.transitions)
+
+        self.assertRaises(stripe.error.CircuitOpenError, self.succeed)
+        self.assertTrue(issubclass(stripe.error.CircuitOpenError,
+                                   stripe.error.APIConnectionError))
+        self.assertEqual({
+            'requests': 4,
+            'failures': 2,
+            'rejected': 1,
+            'opened': 1,
+            'state': breakers.OPEN,
+        }, self.breaker.stats()[self.key])
+
+    def test_failed_and_slow_requests(self):
+        self.breaker.slow_threshold = 5
+        for _ in xrange(2):
+            with self.breaker.guard(self.key) as attempt:
+                attempt.failed()
+        self.succeed()
+        self.assertEqual(breakers.CLOSED, self.breaker.state(self.key))
+
+        with self.breaker.guard(self.key):
+            self.time_mock.time.return_value += 6
+        self.assertEqual(breakers.OPEN, self.breaker.state(self.key))
+
+    def test_other_errors_are_not_failures(self):
+        for _ in xrange(4):
+            try:
+                with self.breaker.guard(self.key):
+                    raise stripe.error.InvalidRequestError('bad', 'id')
+            except stripe.error.InvalidRequestError:
+                pass
+        self.assertEqual(breakers.CLOSED, self.breaker.state(self.key))
+
+    def test_expired_deadlines_are_not_failures(self):
+        self.breaker.slow_threshold = 5
+        for _ in xrange(8):
+            try:
+                with self.breaker.guard(self.key):
+                    self.time_mock.time.return_value += 6
+                    raise stripe.error.DeadlineExceededError('too late')
+            except stripe.error.DeadlineExceededError:
+                pass
+        self.assertEqual(breakers.CLOSED, self.breaker.state(self.key))
+        self.assertEqual(0, self.breaker.stats()[self.key]['failures'])
+
+        self.open()
+        self.time_mock.time.return_value += 30
+        self.assertRaises(stripe.error.DeadlineExceededError,
+                          self.expire)
+        self.assertEqual(breakers.HALF_OPEN, self.breaker.state(self.key))
+        # The probe was given back, so another can be sent
+        self.succeed()
+        self.assertEqual(breakers.CLOSED, self.breaker.state(self.key))
+
+    def expire(self):
+        with self.breaker.guard(self.key):
+            raise stripe.error.DeadlineExceededError('too late')
+
+    def open(self):
+        for _ in xrange(4):
+            self.fail()
+        self.assertEqual(breakers.OPEN, self.breaker.state(self.key))
+
+    def test_probe_success_closes(self):
+        self.open()
+        self.time_mock.time.return_value += 30
+
+        with self.breaker.guard(self.key):
+            self.assertEqual(breakers.HALF_OPEN,
+                             self.breaker.state(self.key))
+            # Only one probe is let through at a time
+            self.assertRaises(stripe.error.CircuitOpenError, self.succeed)
+
+        self.assertEqual(breakers.CLOSED, self.breaker.state(self.key))
+        self.assertEqual([breakers.OPEN, breakers.HALF_OPEN, breakers.CLOSED],
+                         [new for _, _, new in self.transitions])
+        self.succeed()
+
+    def test_probe_failure_reopens(self):
+        self.open()
+        self.time_mock.time.return_value += 30
+
+        self.fail()
+
+        self.assertEqual(breakers.OPEN, self.breaker.state(self.key))
+        self.assertRaises(stripe.error.CircuitOpenError, self.succeed)
+        self.assertEqual(2, self.breaker.stats()[self.key]['opened'])
+
+    def test_late_results_do_not_close(self):
+        # A request let through before the circuit opened is not a probe
+        attempt = self.breaker.guard(self.key)
+        attempt.__enter__()
+        self.open()
+        self.time_mock.time.return_value += 30
+        self.breaker.probes = 2
+
+        with self.breaker.guard(self.key):
+            attempt.__exit__(None, None, None)
+            self.assertEqual(breakers.HALF_OPEN,
+                             self.breaker.state(self.key))
+
+    def test_keys(self):
+        self.assertEqual(('https://api.stripe.com', None),
+                         self.breaker.key('https://api.stripe.com',
+                                          'acct_1'))
+
+        breaker = breakers.CircuitBreaker(per_account=True, min_requests=1,
+                                          window=1)
+        self.breaker = breaker
+        first = breaker.key('https://api.stripe.com', 'acct_1')
+        second = breaker.key('https://api.stripe.com', 'acct_2')
+        self.fail(first)
+
+        self.assertEqual(breakers.OPEN, breaker.state(first))
+        self.assertEqual(breakers.CLOSED, breaker.state(second))
+        self.succeed(second)
+
+
+if __name__ == '__main__':
+    unittest2.main()
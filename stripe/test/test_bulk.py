@@ -0,0 +1,116 @@
+import unittest2
+
+from mock import Mock
+
+import stripe
+import stripe.bulk
+
+from stripe.test.helper import StripeApiTestCase
+
+
+class BulkExecutorTests(StripeApiTestCase):
+
+    def setUp(self):
+        super(BulkExecutorTests, self).setUp()
+
+        def request(method, url, params=None, headers=None):
+            if params and params.get('fail'):
+                raise stripe.error.CardError('Declined', 'card', 'declined')
+            return {'id': 'obj_1', 'object': 'customer', 'url': url}, 'key'
+
+        self.requestor_mock.request = Mock(side_effect=request)
+
+    def make_customer(self):
+        return stripe.Customer.construct_from({
+            'id': 'cus_1',
+            'description': 'old',
+        }, 'mykey')
+
+    def operations(self):
+        customer = self.make_customer()
+        customer.description = 'new'
+        charge = stripe.Charge.construct_from({'id': 'ch_1'}, 'mykey')
+
+        return [
+            stripe.bulk.Create(stripe.Customer, description='foo'),
+            stripe.bulk.Save(customer),
+            stripe.bulk.Delete(self.make_customer()),
+            stripe.bulk.Call(charge.capture, amount=50),
+            stripe.bulk.Create(stripe.Customer, fail=True),
+        ]
+
+    def sent_keys(self):
+        keys = {}
+        for args, _ in self.requestor_mock.request.call_args_list:
+            method, url, params, headers = args
+            # The failing create shares its URL with the first one
+            if params and params.get('fail'):
+                continue
+            keys[(method, url)] = headers and headers['Idempotency-Key']
+        return keys
+
+    def test_runs_operations(self):
+        results = list(stripe.bulk.run(self.operations(), concurrency=3))
+
+        self.assertEqual(5, len(results))
+        results.sort(key=lambda r: r.index)
+
+        self.assertTrue(isinstance(results[0].value, stripe.Customer))
+        self.assertTrue(isinstance(results[0].item, stripe.bulk.Create))
+        self.assertEqual('/v1/customers/cus_1', results[1].value.url)
+        self.assertEqual('/v1/customers/cus_1', results[2].value.url)
+        self.assertEqual('/v1/charges/ch_1/capture', results[3].value.url)
+        self.assertTrue(isinstance(results[4].error, stripe.error.CardError))
+        self.assertEqual(4, len([r for r in results if r.ok]))
+
+        self.requestor_mock.request.assert_any_call(
+            'post', '/v1/customers/cus_1', {'description': 'new'},
+            {'Idempotency-Key': self.sent_keys()[
+                ('post', '/v1/customers/cus_1')]})
+
+        # Deletes don't carry an idempotency key
+        self.assertEqual(None,
+                         self.sent_keys()[('delete', '/v1/customers/cus_1')])
+
+    def test_idempotency_keys_are_deterministic(self):
+        list(stripe.bulk.run(self.operations(), batch_id='run-1'))
+        first = self.sent_keys()
+
+        self.requestor_mock.request.reset_mock()
+        list(stripe.bulk.run(self.operations(), batch_id='run-1'))
+        self.assertEqual(first, self.sent_keys())
+
+        self.requestor_mock.request.reset_mock()
+        list(stripe.bulk.run(self.operations(), batch_id='run-2'))
+        second = self.sent_keys()
+
+        self.assertTrue(first[('post', '/v1/customers')].startswith('run-1-'))
+        self.assertNotEqual(first[('post', '/v1/customers')],
+                            second[('post', '/v1/customers')])
+
+    def test_runs_without_batch_id_get_fresh_keys(self):
+        list(stripe.bulk.run(self.operations()))
+        first = self.sent_keys()
+
+        self.requestor_mock.request.reset_mock()
+        list(stripe.bulk.run(self.operations()))
+
+        self.assertNotEqual(first[('post', '/v1/customers')],
+                            self.sent_keys()[('post', '/v1/customers')])
+
+    def test_identical_operations_get_distinct_keys(self):
+        executor = stripe.bulk.BulkExecutor()
+        op = stripe.bulk.Create(stripe.InvoiceItem, amount=100)
+
+        self.assertNotEqual(executor.idempotency_key(0, op),
+                            executor.idempotency_key(1, op))
+
+    def test_explicit_idempotency_key(self):
+        executor = stripe.bulk.BulkExecutor(batch_id='run-1')
+        op = stripe.bulk.Create(stripe.InvoiceItem, idempotency_key='mine')
+
+        self.assertEqual('mine', executor.idempotency_key(0, op))
+
+
+if __name__ == '__main__':
+    unittest2.main()
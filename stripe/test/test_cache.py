@@ -0,0 +1,118 @@
+import threading
+import time
+
+import unittest2
+
+from mock import patch
+
+import stripe
+
+from stripe.cache import ObjectCache, SingleFlight
+
+
+class ObjectCacheTests(unittest2.TestCase):
+
+    def make_object(self, id, klass=stripe.resource.StripeObject):
+        return klass.construct_from({'id': id}, 'mykey')
+
+    def test_get_and_set(self):
+        cache = ObjectCache()
+        obj = self.make_object('ch_1')
+        cache.set(obj)
+
+        self.assertTrue(cache.get('ch_1') is obj)
+        self.assertEqual(None, cache.get('ch_2'))
+        self.assertTrue('ch_1' in cache)
+        self.assertEqual(1, len(cache))
+
+    def test_get_checks_class(self):
+        cache = ObjectCache()
+        cache.set(self.make_object('ch_1', stripe.resource.Charge))
+
+        self.assertEqual(None, cache.get('ch_1', stripe.resource.Customer))
+        self.assertTrue(
+            cache.get('ch_1', stripe.resource.Charge) is not None)
+
+    def test_evicts_least_recently_used(self):
+        cache = ObjectCache(max_size=2)
+        cache.set(self.make_object('a'))
+        cache.set(self.make_object('b'))
+        cache.get('a')
+        cache.set(self.make_object('c'))
+
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertTrue('c' in cache)
+        self.assertEqual(2, len(cache))
+
+    def test_expires_entries(self):
+        cache = ObjectCache(ttl=10)
+
+        with patch('stripe.cache.time.time', return_value=100):
+            cache.set(self.make_object('a'))
+
+        with patch('stripe.cache.time.time', return_value=105):
+            self.assertTrue('a' in cache)
+
+        with patch('stripe.cache.time.time', return_value=111):
+            self.assertFalse('a' in cache)
+        self.assertEqual(0, len(cache))
+
+    def test_delete_and_clear(self):
+        cache = ObjectCache()
+        cache.set(self.make_object('a'))
+        cache.set(self.make_object('b'))
+
+        cache.delete('a')
+        self.assertFalse('a' in cache)
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        cache.set(self.make_object('c'))
+        self.assertTrue('c' in cache)
+
+
+class SingleFlightTests(unittest2.TestCase):
+
+    def test_collapses_concurrent_calls(self):
+        flight = SingleFlight()
+        calls = []
+        results = []
+        started = threading.Event()
+
+        def slow():
+            calls.append(1)
+            started.set()
+            time.sleep(0.05)
+            return 'value'
+
+        def run():
+            results.append(flight.do('key', slow))
+
+        threads = [threading.Thread(target=run) for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(['value'] * 5, results)
+
+        # Later calls are not collapsed into a finished one
+        flight.do('key', slow)
+        self.assertEqual(2, len(calls))
+
+    def test_shares_errors(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise KeyError('boom')
+
+        self.assertRaises(KeyError, flight.do, 'key', fail)
+        self.assertEqual('ok', flight.do('key', lambda: 'ok'))
+
+
+if __name__ == '__main__':
+    unittest2.main()
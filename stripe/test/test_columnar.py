@@ -0,0 +1,180 @@
+import datetime
+
+import unittest2
+
+import stripe
+import stripe.columnar
+
+from stripe.test.helper import StripeTestCase
+
+DAY = 60 * 60 * 24
+
+RECORDS = [
+    {'id': 'txn_1', 'amount': 1000, 'fee': 59, 'net': 941,
+     'currency': 'usd', 'type': 'charge', 'created': 1420070400},
+    {'id': 'txn_2', 'amount': 500, 'fee': 45, 'net': 455,
+     'currency': 'eur', 'type': 'charge', 'created': 1420070400 + 60},
+    {'id': 'txn_3', 'amount': -200, 'fee': 0, 'net': -200,
+     'currency': 'usd', 'type': 'refund', 'created': 1420070400 + 120},
+    {'id': 'txn_4', 'amount': 300, 'fee': None, 'net': 300,
+     'currency': 'usd', 'type': 'charge', 'created': 1420070400 + DAY},
+]
+
+EXPECTED_SUMS = {
+    ('usd', datetime.date(2015, 1, 1)): {'amount': 800, 'fee': 59},
+    ('eur', datetime.date(2015, 1, 1)): {'amount': 500, 'fee': 45},
+    ('usd', datetime.date(2015, 1, 2)): {'amount': 300, 'fee': 0},
+}
+
+
+class ColumnarTests(StripeTestCase):
+
+    def setUp(self):
+        super(ColumnarTests, self).setUp()
+        self.numpy = stripe.columnar.numpy
+
+    def tearDown(self):
+        stripe.columnar.numpy = self.numpy
+        super(ColumnarTests, self).tearDown()
+
+    def test_infers_column_kinds(self):
+        columns = stripe.columnar.to_columns(RECORDS)
+
+        self.assertEqual(4, len(columns))
+        self.assertEqual('int', columns['amount'].kind)
+        self.assertEqual('timestamp', columns['created'].kind)
+        self.assertEqual('category', columns['currency'].kind)
+        self.assertEqual('object', columns['id'].kind)
+
+        self.assertEqual(['usd', 'eur'], columns['currency'].categories)
+        self.assertEqual([0, 1, 0, 0], list(columns['currency'].values))
+        self.assertEqual(['usd', 'eur', 'usd', 'usd'],
+                         list(columns['currency']))
+        self.assertEqual(datetime.datetime(2015, 1, 1),
+                         columns['created'][0])
+
+    def test_nested_fields_and_nulls(self):
+        records = [
+            {'id': 'ch_1', 'source': {'brand': 'Visa'}},
+            {'id': 'ch_2', 'source': None},
+            {'id': 'ch_3'},
+        ]
+        columns = stripe.columnar.to_columns(
+            records, ['source.brand', 'amount'])
+
+        self.assertEqual(['Visa', None, None], list(columns['source.brand']))
+        self.assertEqual([None, None, None], list(columns['amount']))
+
+    def test_nested_field_of_unexpanded_id(self):
+        records = [
+            {'id': 'ch_1', 'source': {'id': 'card_1'}},
+            {'id': 'ch_2', 'source': 'card_2'},
+        ]
+        columns = stripe.columnar.to_columns(records, ['source.id'])
+
+        self.assertEqual(['card_1', None], list(columns['source.id']))
+
+    def test_int_column(self):
+        columns = stripe.columnar.to_columns(
+            [{'amount': 2 ** 40}, {'amount': 2.0}], ['amount'])
+        self.assertEqual([2 ** 40, 2], list(columns['amount']))
+
+        self.assertRaises(ValueError, stripe.columnar.to_columns,
+                          [{'amount': 1}, {'amount': 2.5}], ['amount'])
+        columns = stripe.columnar.to_columns(
+            [{'amount': 1}, {'amount': 2.5}], ['amount'],
+            kinds={'amount': 'float'})
+        self.assertEqual([1.0, 2.5], list(columns['amount']))
+
+    def test_column_created_after_nulls(self):
+        columns = stripe.columnar.to_columns(
+            [{'amount': None}, {'amount': 5}], ['amount'])
+
+        self.assertEqual('int', columns['amount'].kind)
+        self.assertEqual([None, 5], list(columns['amount']))
+
+    def test_kinds_override(self):
+        columns = stripe.columnar.to_columns(
+            RECORDS, ['id'], kinds={'id': 'category'})
+
+        self.assertEqual('category', columns['id'].kind)
+
+    def test_list_page(self):
+        page = stripe.resource.convert_to_stripe_object(
+            {'object': 'list', 'url': '/v1/balance/history',
+             'data': RECORDS}, 'sk_test', None)
+
+        columns = page.to_columns(['amount'])
+        self.assertEqual([1000, 500, -200, 300], list(columns['amount']))
+
+    def test_group_sum(self):
+        sums = stripe.columnar.group_sum(
+            RECORDS, ['amount', 'fee'], ['currency', 'day'])
+        self.assertEqual(EXPECTED_SUMS, sums)
+
+    def test_group_sum_without_numpy(self):
+        stripe.columnar.numpy = None
+        sums = stripe.columnar.group_sum(
+            RECORDS, ['amount', 'fee'], ['currency', 'day'])
+        self.assertEqual(EXPECTED_SUMS, sums)
+
+    def test_group_sum_floats(self):
+        records = [
+            {'currency': 'usd', 'rate': 0.5, 'amount': 1},
+            {'currency': 'usd', 'rate': 1.25, 'amount': 2},
+            {'currency': 'eur', 'rate': None, 'amount': 3},
+        ]
+        expected = {
+            ('usd',): {'rate': 1.75, 'amount': 3},
+            ('eur',): {'rate': 0.0, 'amount': 3},
+        }
+
+        sums = stripe.columnar.group_sum(
+            records, ['rate', 'amount'], ['currency'])
+        self.assertEqual(expected, sums)
+        self.assertTrue(isinstance(sums[('usd',)]['rate'], float))
+        self.assertTrue(isinstance(sums[('usd',)]['amount'], int))
+
+        stripe.columnar.numpy = None
+        self.assertEqual(expected, stripe.columnar.group_sum(
+            records, ['rate', 'amount'], ['currency']))
+
+    def test_group_sum_empty(self):
+        self.assertEqual({}, stripe.columnar.group_sum(
+            [], ['amount'], ['currency']))
+
+    def test_to_numpy_requires_numpy(self):
+        stripe.columnar.numpy = None
+        self.assertRaises(ImportError, stripe.columnar.to_numpy, RECORDS)
+
+
+class NumpyColumnarTests(StripeTestCase):
+
+    def setUp(self):
+        super(NumpyColumnarTests, self).setUp()
+        if stripe.columnar.numpy is None:
+            self.skipTest('numpy is not installed')
+
+    def test_to_numpy(self):
+        numpy = stripe.columnar.numpy
+        arrays = stripe.columnar.to_numpy(RECORDS)
+
+        self.assertEqual(numpy.int64, arrays['amount'].dtype)
+        self.assertEqual(-200, arrays['amount'][2])
+        self.assertEqual(numpy.dtype('datetime64[s]'),
+                         arrays['created'].dtype)
+        self.assertEqual(numpy.datetime64('2015-01-02T00:00:00'),
+                         arrays['created'][3])
+
+        currency = arrays['currency']
+        self.assertEqual([0, 1, 0, 0], currency.codes.tolist())
+        self.assertEqual(['usd', 'eur', 'usd', 'usd'],
+                         currency.decode().tolist())
+
+        fee = arrays['fee']
+        self.assertEqual([False, False, False, True], fee.mask.tolist())
+        self.assertEqual(104, fee.sum())
+
+
+if __name__ == '__main__':
+    unittest2.main()
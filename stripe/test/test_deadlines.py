@@ -0,0 +1,77 @@
+import unittest2
+
+from mock import patch
+
+import stripe
+
+from stripe import deadlines
+from stripe.workers import WorkerPool
+
+
+class DeadlineTests(unittest2.TestCase):
+
+    def setUp(self):
+        self.time_patcher = patch('stripe.deadlines.time')
+        self.time_mock = self.time_patcher.start()
+        self.time_mock.time.return_value = 1000.0
+
+    def tearDown(self):
+        self.time_patcher.stop()
+
+    def test_budget_shrinks(self):
+        deadline = deadlines.Deadline(10)
+        self.assertEqual((10, 10), deadline.timeouts(30, 80))
+
+        self.time_mock.time.return_value = 1004.0
+        self.assertEqual((6, 6), deadline.timeouts(30, 80))
+        self.assertEqual((2, 6), deadline.timeouts(2, 80))
+
+    def test_connect_timeout(self):
+        deadline = deadlines.Deadline(10, connect_timeout=1)
+
+        self.assertEqual((1, 10), deadline.timeouts(30, 80))
+
+    def test_expired(self):
+        deadline = deadlines.Deadline(10)
+        self.time_mock.time.return_value = 1010.0
+
+        self.assertTrue(deadline.expired())
+        self.assertRaises(stripe.error.DeadlineExceededError,
+                          deadline.timeouts, 30, 80)
+        self.assertTrue(issubclass(stripe.error.DeadlineExceededError,
+                                   stripe.error.APIConnectionError))
+
+    def test_context(self):
+        self.assertTrue(deadlines.current() is None)
+
+        outer = deadlines.Deadline(5)
+        with outer:
+            self.assertTrue(deadlines.current() is outer)
+            with deadlines.Deadline(10):
+                self.assertTrue(deadlines.current() is outer)
+            with deadlines.Deadline(1) as inner:
+                self.assertTrue(deadlines.current() is inner)
+            with deadlines.using(None):
+                self.assertTrue(deadlines.current() is outer)
+
+            self.time_mock.time.return_value = 1005.0
+            self.assertRaises(stripe.error.DeadlineExceededError,
+                              deadlines.check)
+
+        self.assertTrue(deadlines.current() is None)
+        deadlines.check()
+
+    def test_inherited_by_workers(self):
+        deadline = deadlines.Deadline(5)
+
+        with deadline:
+            results = WorkerPool(concurrency=2).map(
+                lambda _: deadlines.current(), range(4))
+
+        self.assertEqual([deadline] * 4, [r.value for r in results])
+        self.assertTrue(WorkerPool(concurrency=1).map(
+            lambda _: deadlines.current(), [0])[0].value is None)
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,124 @@
+import unittest2
+
+from mock import Mock
+
+import stripe
+import stripe.dedupe
+
+from stripe.test.helper import StripeTestCase
+
+
+class MemoryDedupeStoreTests(StripeTestCase):
+
+    def test_seen(self):
+        store = stripe.dedupe.MemoryDedupeStore()
+        self.assertFalse(store.seen('evt_1'))
+        store.add('evt_1')
+        self.assertTrue(store.seen('evt_1'))
+        self.assertTrue('evt_1' in store)
+
+    def test_check_and_add(self):
+        store = stripe.dedupe.MemoryDedupeStore()
+        self.assertFalse(store.check_and_add('evt_1'))
+        self.assertTrue(store.check_and_add('evt_1'))
+
+    def test_max_size(self):
+        store = stripe.dedupe.MemoryDedupeStore(max_size=2)
+        for id in ['evt_1', 'evt_2', 'evt_2', 'evt_3']:
+            store.add(id)
+
+        self.assertEqual(2, len(store))
+        self.assertFalse(store.seen('evt_1'))
+        self.assertTrue(store.seen('evt_3'))
+
+        self.assertRaises(ValueError, stripe.dedupe.MemoryDedupeStore, 0)
+
+
+class BloomDedupeStoreTests(StripeTestCase):
+
+    def setUp(self):
+        super(BloomDedupeStoreTests, self).setUp()
+        self.now = 0
+        self.store = stripe.dedupe.BloomDedupeStore(
+            capacity=3000, error_rate=0.01, window=300, buckets=3,
+            clock=lambda: self.now)
+
+    def test_seen(self):
+        self.assertFalse(self.store.seen('evt_1'))
+        self.assertFalse(self.store.check_and_add('evt_1'))
+        self.assertTrue(self.store.check_and_add('evt_1'))
+        self.store.add(u'evt_\xe9')
+        self.assertTrue(u'evt_\xe9' in self.store)
+        self.assertEqual(2, len(self.store))
+
+    def test_error_rate(self):
+        for i in xrange(3000):
+            self.now = i // 10
+            self.store.add('evt_%d' % i)
+        false_positives = sum(self.store.seen('other_%d' % i)
+                              for i in xrange(10000))
+
+        self.assertTrue(all(self.store.seen('evt_%d' % i)
+                            for i in xrange(3000)))
+        self.assertTrue(false_positives < 10000 * 0.02, false_positives)
+
+    def test_ids_expire_with_their_bucket(self):
+        self.store.add('evt_1')
+        self.now = 150
+        self.store.add('evt_2')
+        self.now = 299
+        self.assertTrue(self.store.seen('evt_1'))
+
+        self.now = 300
+        self.assertFalse(self.store.seen('evt_1'))
+        self.assertTrue(self.store.seen('evt_2'))
+
+        self.now = 10000
+        self.assertFalse(self.store.seen('evt_2'))
+        self.assertEqual(0, len(self.store))
+
+    def test_memory_cap(self):
+        store = stripe.dedupe.BloomDedupeStore(
+            capacity=10 ** 7, error_rate=0.001, buckets=4, max_bytes=2 ** 20)
+        store.add('evt_1')
+
+        self.assertEqual(2 ** 18, store.nbytes)
+        self.assertTrue(store.expected_error_rate > 0.001)
+        self.assertRaises(ValueError, stripe.dedupe.BloomDedupeStore,
+                          max_bytes=1)
+
+    def test_sizing(self):
+        store = stripe.dedupe.BloomDedupeStore(
+            capacity=10 ** 6, error_rate=0.001, buckets=2)
+        store.add('evt_1')
+
+        self.assertAlmostEqual(0.001, store.expected_error_rate, places=6)
+        # About 14.4 bits per id for 0.05% per filter
+        self.assertTrue(800000 < store.nbytes < 1000000, store.nbytes)
+
+    def test_confirm(self):
+        confirm = Mock(return_value=False)
+        store = stripe.dedupe.BloomDedupeStore(confirm=confirm)
+
+        self.assertFalse(store.check_and_add('evt_1'))
+        self.assertFalse(confirm.called)
+
+        self.assertFalse(store.check_and_add('evt_1'))
+        confirm.assert_called_with('evt_1')
+
+        confirm.return_value = True
+        self.assertTrue(store.seen('evt_1'))
+
+    def test_confirm_runs_without_lock(self):
+        def confirm(id):
+            # Another lookup can go ahead while this one is confirmed
+            self.assertFalse(store.seen('evt_2'))
+            return True
+        store = stripe.dedupe.BloomDedupeStore(confirm=confirm)
+        store.add('evt_1')
+
+        self.assertTrue(store.check_and_add('evt_1'))
+
+
+if __name__ == '__main__':
+    unittest2.main()
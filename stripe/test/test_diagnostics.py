@@ -0,0 +1,94 @@
+import warnings
+
+import unittest2
+
+from mock import Mock, patch
+
+import stripe
+
+from stripe import diagnostics
+from stripe.test.helper import StripeTestCase
+
+
+class NPlusOneDetectorTests(StripeTestCase):
+
+    def setUp(self):
+        super(NPlusOneDetectorTests, self).setUp()
+
+        client = Mock(stripe.http_client.HTTPClient)
+        client.name = 'mockclient'
+        client.request = Mock(return_value=('{"id": "cus_1A"}', 200, {}))
+
+        self.client_patcher = patch(
+            'stripe.http_client.new_default_http_client',
+            return_value=client)
+        self.client_patcher.start()
+
+    def tearDown(self):
+        self.client_patcher.stop()
+
+        super(NPlusOneDetectorTests, self).tearDown()
+
+    def retrieve_in_loop(self, count):
+        for i in xrange(count):
+            stripe.Customer.retrieve('cus_%dA' % (i,))
+
+    def test_warns_on_repeated_single_object_gets(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            with diagnostics.NPlusOneDetector(threshold=3) as detector:
+                self.retrieve_in_loop(5)
+
+        n_plus_one = [w for w in caught
+                      if issubclass(w.category, diagnostics.NPlusOneWarning)]
+        self.assertEqual(1, len(n_plus_one))
+        self.assertTrue('/v1/customers/{id}' in str(n_plus_one[0].message))
+        self.assertEqual(__file__.rstrip('c'), n_plus_one[0].filename)
+
+        [(call_site, method, template, count)] = detector.report()
+        self.assertEqual('retrieve_in_loop', call_site[2])
+        self.assertEqual('get', method)
+        self.assertEqual(5, count)
+
+    def test_ignores_calls_below_threshold_and_after_exit(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            with diagnostics.NPlusOneDetector(threshold=3) as detector:
+                self.retrieve_in_loop(2)
+            self.retrieve_in_loop(5)
+
+        self.assertEqual([], [w for w in caught if issubclass(
+            w.category, diagnostics.NPlusOneWarning)])
+        self.assertEqual(2, detector.report()[0][3])
+
+    def test_url_template(self):
+        self.assertEqual('/v1/customers/{id}/subscriptions/{id}',
+                         diagnostics.url_template(
+                             '/v1/customers/cus_6jEGA5j3/subscriptions/'
+                             'sub_6jEH9aNz?expand[]=plan'))
+        self.assertEqual('/v1/application_fees',
+                         diagnostics.url_template('/v1/application_fees'))
+
+
+class ExpandTests(StripeTestCase):
+
+    def test_expand_params(self):
+        params = diagnostics.expand_params(
+            ['customer', 'data.charge'],
+            {'limit': 10, 'expand': ['data.customer']})
+
+        self.assertEqual({
+            'limit': 10,
+            'expand': ['data.customer', 'data.charge'],
+        }, params)
+
+    def test_all_expanded(self):
+        with patch.object(stripe.Invoice, 'all') as all_mock:
+            diagnostics.all_expanded(stripe.Invoice, ['customer'], limit=3)
+
+        all_mock.assert_called_with(api_key=None, stripe_account=None,
+                                    limit=3, expand=['data.customer'])
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,165 @@
+import os
+import tempfile
+import threading
+import time
+
+import unittest2
+
+from mock import Mock
+
+import stripe
+import stripe.dedupe
+import stripe.events
+
+from stripe.test.helper import StripeApiTestCase, StripeTestCase
+
+
+def event(id, type, obj):
+    return {'id': id, 'object': 'event', 'type': type,
+            'data': {'object': obj}}
+
+
+def page(data, has_more=False):
+    return {'object': 'list', 'has_more': has_more, 'data': data}
+
+
+class FileCheckpointTests(StripeTestCase):
+
+    def test_round_trip(self):
+        path = os.path.join(tempfile.mkdtemp(), 'cursor')
+        checkpoint = stripe.events.FileCheckpoint(path)
+
+        self.assertEqual(None, checkpoint.get())
+        checkpoint.set('evt_1')
+        checkpoint.set('evt_2')
+        self.assertEqual('evt_2', stripe.events.FileCheckpoint(path).get())
+
+
+class EventConsumerTests(StripeApiTestCase):
+
+    def setUp(self):
+        super(EventConsumerTests, self).setUp()
+        self.consumer = stripe.events.EventConsumer(
+            concurrency=4, dedupe=stripe.dedupe.MemoryDedupeStore())
+
+    def tearDown(self):
+        self.consumer.stop()
+        super(EventConsumerTests, self).tearDown()
+
+    def test_dispatch_by_type(self):
+        calls = []
+        self.consumer.on('customer.created', lambda e: calls.append('exact'))
+        self.consumer.on('customer.*', lambda e: calls.append('family'))
+
+        @self.consumer.on('*')
+        def everything(e):
+            calls.append('all')
+
+        self.consumer.dispatch(event('evt_1', 'customer.created', {}))
+        self.assertEqual(['exact', 'family', 'all'], calls)
+
+        calls[:] = []
+        self.consumer.dispatch(event('evt_2', 'customer.source.created', {}))
+        self.assertEqual(['family', 'all'], calls)
+
+    def test_partition_key(self):
+        key = self.consumer.partition_key
+        self.assertEqual('cus_1', key(event('evt_1', 'charge.succeeded', {
+            'id': 'ch_1', 'object': 'charge', 'customer': 'cus_1'})))
+        self.assertEqual('cus_1', key(event('evt_2', 'customer.updated', {
+            'id': 'cus_1', 'object': 'customer'})))
+        self.assertEqual('ch_2', key(event('evt_3', 'charge.succeeded', {
+            'id': 'ch_2', 'object': 'charge', 'customer': None})))
+
+    def test_process_preserves_order_per_object(self):
+        seen = {}
+        lock = threading.Lock()
+
+        @self.consumer.on('charge.updated')
+        def handle(e):
+            self.assertTrue(isinstance(e, stripe.Event))
+            time.sleep(0.001)
+            with lock:
+                seen.setdefault(e.data.object.customer, []).append(e.id)
+
+        events = [event('evt_%d' % i, 'charge.updated',
+                        {'id': 'ch_%d' % i, 'object': 'charge',
+                         'customer': 'cus_%d' % (i % 5)})
+                  for i in xrange(50)]
+        summary = self.consumer.process(events)
+
+        self.assertTrue(summary.ok)
+        self.assertEqual(50, len(summary.handled))
+        self.assertEqual('evt_49', summary.checkpoint)
+        for customer, ids in seen.iteritems():
+            self.assertEqual(sorted(ids, key=lambda id: int(id[4:])), ids)
+
+    def test_process_skips_duplicates(self):
+        handler = Mock()
+        self.consumer.on('*', handler)
+        events = [event('evt_1', 'charge.updated', {'id': 'ch_1'})]
+
+        self.consumer.process(events)
+        summary = self.consumer.process(events)
+
+        self.assertEqual(1, handler.call_count)
+        self.assertEqual(1, len(summary.duplicates))
+        self.assertEqual('evt_1', summary.checkpoint)
+
+    def test_failure_defers_later_events_for_object(self):
+        def handle(e):
+            if e.id == 'evt_2':
+                raise ValueError('boom')
+        self.consumer.on('*', handle)
+
+        events = [
+            event('evt_1', 'charge.updated', {'id': 'ch_1'}),
+            event('evt_2', 'charge.updated', {'id': 'ch_2'}),
+            event('evt_3', 'charge.updated', {'id': 'ch_3'}),
+            event('evt_4', 'charge.refunded', {'id': 'ch_2'}),
+        ]
+        summary = self.consumer.process(events)
+
+        self.assertFalse(summary.ok)
+        self.assertEqual(['evt_1', 'evt_3'],
+                         sorted(e['id'] for e in summary.handled))
+        self.assertEqual('evt_2', summary.failed[0][0]['id'])
+        self.assertEqual(['evt_4'], [e['id'] for e in summary.deferred])
+        self.assertEqual('evt_1', summary.checkpoint)
+
+    def test_poll_starts_at_latest_event(self):
+        self.mock_response(page([{'id': 'evt_9', 'object': 'event'}]))
+
+        summary = self.consumer.poll()
+
+        self.assertEqual(0, len(summary.handled))
+        self.assertEqual('evt_9', self.consumer.checkpoint.get())
+
+    def test_poll_from_checkpoint(self):
+        handled = []
+        self.consumer.on('*', lambda e: handled.append(e.id))
+        self.consumer.checkpoint.set('evt_0')
+
+        pages = [
+            page([event('evt_2', 'charge.updated', {'id': 'ch_2'}),
+                  event('evt_1', 'charge.updated', {'id': 'ch_1'})],
+                 has_more=True),
+            page([event('evt_3', 'charge.updated', {'id': 'ch_1'})]),
+        ]
+        self.requestor_mock.request = Mock(
+            side_effect=lambda *args: (pages.pop(0), 'reskey'))
+
+        summary = self.consumer.poll()
+
+        self.assertEqual(3, len(summary.handled))
+        self.assertEqual(['evt_1', 'evt_3'],
+                         [id for id in handled if id != 'evt_2'])
+        self.assertEqual('evt_3', self.consumer.checkpoint.get())
+
+        calls = self.requestor_mock.request.call_args_list
+        self.assertEqual('evt_0', calls[0][0][2]['ending_before'])
+        self.assertEqual('evt_2', calls[1][0][2]['ending_before'])
+
+
+if __name__ == '__main__':
+    unittest2.main()
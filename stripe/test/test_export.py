@@ -0,0 +1,124 @@
+import csv
+
+import unittest2
+
+from mock import Mock
+
+import stripe
+import stripe.export
+
+from stripe import util
+from stripe.test.helper import StripeApiTestCase
+
+PAGES = [
+    {
+        'object': 'list',
+        'has_more': True,
+        'data': [
+            {'id': 'ch_1', 'amount': 100, 'paid': True,
+             'source': {'brand': 'Visa', 'last4': '4242'},
+             'metadata': {}},
+            {'id': 'ch_2', 'amount': 200, 'paid': False,
+             'source': {'brand': u'M\xe4stercard', 'last4': '4444'},
+             'metadata': {'order': '7'}},
+        ],
+    },
+    {
+        'object': 'list',
+        'has_more': False,
+        'data': [
+            {'id': 'ch_3', 'amount': 300, 'paid': True, 'source': None,
+             'refunds': [], 'metadata': {}},
+        ],
+    },
+]
+
+
+class ExportTests(StripeApiTestCase):
+
+    def setUp(self):
+        super(ExportTests, self).setUp()
+
+        pages = list(PAGES)
+        self.requestor_mock.request = Mock(
+            side_effect=lambda *args: (pages.pop(0), 'reskey'))
+
+    def test_iter_records_follows_pagination(self):
+        records = stripe.export.iter_records(stripe.Charge, page_size=2,
+                                             customer='cus_1')
+
+        self.assertEqual(['ch_1', 'ch_2', 'ch_3'],
+                         [r['id'] for r in records])
+
+        calls = self.requestor_mock.request.call_args_list
+        self.assertEqual(2, len(calls))
+        self.assertEqual(('get', '/v1/charges'), calls[0][0][:2])
+        self.assertEqual({'customer': 'cus_1', 'limit': 2,
+                          'starting_after': 'ch_2'}, calls[1][0][2])
+
+    def test_iter_records_is_lazy(self):
+        records = stripe.export.iter_records(stripe.Charge)
+        records.next()
+
+        self.assertEqual(1, self.requestor_mock.request.call_count)
+
+    def test_flatten(self):
+        self.assertEqual({
+            'id': 'ch_1',
+            'source.brand': 'Visa',
+            'source.owner.name': 'Jo',
+            'refunds': [],
+        }, stripe.export.flatten({
+            'id': 'ch_1',
+            'source': {'brand': 'Visa', 'owner': {'name': 'Jo'}},
+            'refunds': [],
+        }))
+
+    def test_export_csv(self):
+        out = util.StringIO.StringIO()
+
+        count = stripe.export.export(
+            stripe.Charge, out, format='csv',
+            columns=['id', 'amount', 'paid', 'source.brand',
+                     'metadata.order'])
+
+        self.assertEqual(3, count)
+        out.seek(0)
+        rows = list(csv.reader(out))
+        self.assertEqual(
+            ['id', 'amount', 'paid', 'source.brand', 'metadata.order'],
+            rows[0])
+        self.assertEqual(['ch_1', '100', 'true', 'Visa', ''], rows[1])
+        self.assertEqual(u'M\xe4stercard', rows[2][3].decode('utf-8'))
+        self.assertEqual('7', rows[2][4])
+        self.assertEqual(['ch_3', '300', 'true', '', ''], rows[3])
+
+    def test_export_csv_infers_columns(self):
+        out = util.StringIO.StringIO()
+
+        stripe.export.export(stripe.Charge, out, format='csv')
+
+        out.seek(0)
+        self.assertEqual(['amount', 'id', 'paid', 'source.brand',
+                          'source.last4'], list(csv.reader(out))[0])
+
+    def test_export_jsonl(self):
+        out = util.StringIO.StringIO()
+
+        count = stripe.export.export(stripe.Charge, out,
+                                     columns=['id', 'source.last4'])
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(3, count)
+        self.assertEqual({'id': 'ch_2', 'source.last4': '4444'},
+                         util.json.loads(lines[1]))
+        self.assertEqual({'id': 'ch_3', 'source.last4': None},
+                         util.json.loads(lines[2]))
+
+    def test_export_unknown_format(self):
+        self.assertRaises(ValueError, stripe.export.export, stripe.Charge,
+                          util.StringIO.StringIO(), format='xml')
+
+
+if __name__ == '__main__':
+    unittest2.main()
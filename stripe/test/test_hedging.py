@@ -0,0 +1,155 @@
+import threading
+import time
+
+import unittest2
+
+import stripe
+
+from stripe.hedging import HedgingPolicy
+
+
+class HedgingPolicyTests(unittest2.TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def tearDown(self):
+        self.release.set()
+
+    def respond(self, *responses):
+        # Each call in turn returns its response, or raises it if it is an
+        # exception.  'stall' blocks until the test ends, and a (delay,
+        # response) pair sleeps first.
+        lock = threading.Lock()
+
+        def func():
+            with lock:
+                response = responses[len(self.calls)]
+                self.calls.append(response)
+            if response == 'stall':
+                self.release.wait()
+            elif isinstance(response, tuple):
+                delay, response = response
+                time.sleep(delay)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return func
+
+    def test_fast_call_is_not_hedged(self):
+        policy = HedgingPolicy(initial_delay=1, max_hedged=1)
+
+        self.assertEqual('first', policy.call(self.respond('first')))
+
+        self.assertEqual(1, len(self.calls))
+        stats = policy.stats()
+        self.assertEqual(1, stats['requests'])
+        self.assertEqual(0, stats['hedged'])
+
+    def test_hedge_wins(self):
+        policy = HedgingPolicy(initial_delay=0.01, max_hedged=1)
+
+        self.assertEqual('hedge', policy.call(self.respond('stall', 'hedge')))
+
+        stats = policy.stats()
+        self.assertEqual(1, stats['hedged'])
+        self.assertEqual(1, stats['hedge_wins'])
+
+    def test_first_call_wins(self):
+        policy = HedgingPolicy(initial_delay=0.01, max_hedged=1)
+
+        self.assertEqual('first', policy.call(
+            self.respond((0.05, 'first'), 'stall')))
+
+        stats = policy.stats()
+        self.assertEqual(1, stats['hedged'])
+        self.assertEqual(0, stats['hedge_wins'])
+
+    def test_hedges_are_capped(self):
+        policy = HedgingPolicy(initial_delay=0.01, max_hedged=0.05)
+
+        self.assertEqual('first', policy.call(
+            self.respond((0.05, 'first'))))
+
+        self.assertEqual(1, len(self.calls))
+        stats = policy.stats()
+        self.assertEqual(0, stats['hedged'])
+        self.assertEqual(1, stats['throttled'])
+
+    def test_errors(self):
+        policy = HedgingPolicy(initial_delay=1, max_hedged=1)
+        failure = stripe.error.APIConnectionError('refused')
+
+        self.assertRaises(stripe.error.APIConnectionError,
+                          policy.call, self.respond(failure))
+        self.assertEqual(1, len(self.calls))
+
+        self.calls = []
+        policy = HedgingPolicy(initial_delay=0.01, max_hedged=1)
+        first = stripe.error.APIConnectionError('first')
+        try:
+            policy.call(self.respond((0.05, first), ValueError('hedge')))
+        except Exception, e:
+            self.assertTrue(e is first)
+        else:
+            self.fail('Expected an error')
+
+    def test_threads_are_reused(self):
+        policy = HedgingPolicy(initial_delay=1, max_hedged=1)
+        threads = set()
+
+        def func():
+            threads.add(threading.current_thread())
+            return 'first'
+
+        for _ in xrange(20):
+            self.assertEqual('first', policy.call(func))
+
+        self.assertEqual(1, len(threads))
+
+    def test_busy_pool_runs_on_caller_thread(self):
+        policy = HedgingPolicy(initial_delay=0.1, max_hedged=1,
+                               max_threads=1)
+        caller = threading.current_thread()
+        thread = threading.Thread(target=policy.call,
+                                  args=(self.respond('stall'),))
+        thread.start()
+        while not self.calls:
+            time.sleep(0.001)
+
+        self.assertTrue(policy.call(threading.current_thread) is caller)
+        self.assertEqual(1, policy.stats()['saturated'])
+
+        # The hedge of the stalled call finds no free thread either
+        while policy.stats()['saturated'] < 2:
+            time.sleep(0.001)
+        self.release.set()
+        thread.join()
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual(0, policy.stats()['hedged'])
+        # Its token was given back: 2 earned, none spent
+        self.assertEqual(2, policy._tokens)
+
+    def test_delay_is_percentile(self):
+        policy = HedgingPolicy(percentile=95, initial_delay=1)
+        for i in xrange(10):
+            policy._record(i / 1000.0)
+        self.assertEqual(1, policy.delay())
+
+        for i in xrange(10, 100):
+            policy._record(i / 1000.0)
+        self.assertEqual(0.094, policy.delay())
+
+    def test_deadline_is_inherited(self):
+        policy = HedgingPolicy(initial_delay=1)
+        deadline = stripe.Deadline(10)
+
+        with deadline:
+            current = policy.call(stripe.deadlines.current)
+
+        self.assertTrue(current is deadline)
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -1,11 +1,18 @@
+import errno
+import httplib
+import socket
+import ssl
 import sys
+import time
 import unittest2
 
 from mock import Mock, patch
 
 import stripe
 
-from stripe.test.helper import StripeUnitTestCase
+from stripe.multipart_data_generator import MultipartBody
+from stripe.test import fake_urlfetch
+from stripe.test.helper import StripeTestCase, StripeUnitTestCase
 
 VALID_API_METHODS = ('get', 'post', 'delete')
 
@@ -47,6 +54,39 @@ class HttpClientTests(StripeUnitTestCase):
         self.check_default(('urlfetch', 'requests', 'pycurl'),
                            stripe.http_client.Urllib2Client)
 
+    def test_new_pooled_http_client_requests(self):
+        stripe.http_client.urlfetch = None
+        requests_mock = self.request_mocks['requests']
+        session = requests_mock.Session.return_value
+
+        inst = stripe.http_client.new_pooled_http_client(5)
+
+        self.assertTrue(isinstance(inst, stripe.http_client.RequestsClient))
+        requests_mock.adapters.HTTPAdapter.assert_called_with(
+            pool_connections=1, pool_maxsize=5)
+        session.mount.assert_any_call(
+            'https://', requests_mock.adapters.HTTPAdapter.return_value)
+
+        inst.request('get', 'https://api.stripe.com/foo', {})
+        self.assertTrue(session.request.called)
+        self.assertFalse(requests_mock.request.called)
+
+    def test_new_pooled_http_client_urllib2(self):
+        for lib in ('urlfetch', 'requests', 'pycurl'):
+            setattr(stripe.http_client, lib, None)
+
+        inst = stripe.http_client.new_pooled_http_client(5)
+
+        self.assertTrue(isinstance(inst,
+                                   stripe.http_client.PooledUrllib2Client))
+        self.assertEqual(5, inst.pool_size)
+
+    def test_new_pooled_http_client_fallback(self):
+        self.check_default(('requests',),
+                           stripe.http_client.UrlFetchClient)
+        inst = stripe.http_client.new_pooled_http_client(5)
+        self.assertTrue(isinstance(inst, stripe.http_client.UrlFetchClient))
+
 
 class ClientTestBase():
 
@@ -117,18 +157,94 @@ class RequestsClientTests(StripeUnitTestCase, ClientTestBase):
         result.content = body
         result.status_code = code
 
-        mock.request = Mock(return_value=result)
+        mock.Session.return_value.request = Mock(return_value=result)
 
     def mock_error(self, mock):
         mock.exceptions.RequestException = Exception
-        mock.request.side_effect = mock.exceptions.RequestException()
+        mock.Session.return_value.request.side_effect = \
+            mock.exceptions.RequestException()
 
     def check_call(self, mock, meth, url, post_data, headers):
-        mock.request.assert_called_with(meth, url,
-                                        headers=headers,
-                                        data=post_data,
-                                        verify=RequestsVerify(),
-                                        timeout=80)
+        mock.Session.return_value.request.assert_called_with(
+            meth, url, headers=headers, data=post_data,
+            verify=RequestsVerify(), timeout=80)
+
+    def test_clients_share_a_session(self):
+        first = self.request_client()
+        second = self.request_client(verify_ssl_certs=True)
+        unverified = self.request_client(verify_ssl_certs=False)
+
+        self.assertTrue(first._session is second._session)
+        self.assertEqual(2, self.request_mock.Session.call_count)
+        self.assertTrue(unverified._session is
+                        self.request_client(verify_ssl_certs=False)._session)
+
+    def test_close_leaves_shared_session_open(self):
+        session = Mock()
+        self.request_client().close()
+        self.request_client(session=session).close()
+
+        self.assertFalse(self.request_mock.Session.return_value.close.called)
+        self.assertTrue(session.close.called)
+
+    def test_request_stream(self):
+        self.mock_response(self.request_mock, None, 200)
+        session = self.request_mock.Session.return_value
+        result = session.request.return_value
+        result.iter_content = Mock(return_value=iter(['ab', 'cd']))
+
+        chunks, code, _ = self.request_client().request_stream(
+            'get', self.valid_url, {}, chunk_size=2)
+
+        self.assertEqual(200, code)
+        self.assertEqual(['ab', 'cd'], list(chunks))
+        result.iter_content.assert_called_with(2)
+        self.assertTrue(result.close.called)
+        session.request.assert_called_with(
+            'get', self.valid_url, headers={}, data=None,
+            verify=RequestsVerify(), timeout=80, stream=True)
+
+    def test_request_within_deadline(self):
+        self.mock_response(self.request_mock, '{}', 200)
+
+        with stripe.Deadline(10, connect_timeout=2):
+            self.make_request('get', self.valid_url, {}, None)
+
+        _, kwargs = self.request_mock.Session.return_value.request.call_args
+        connect_timeout, read_timeout = kwargs['timeout']
+        self.assertEqual(2, connect_timeout)
+        self.assertTrue(9 < read_timeout <= 10)
+
+    def test_warmup(self):
+        session = Mock()
+        session.request.return_value = Mock(content='{}', status_code=200)
+        headers = {'Authorization': 'Bearer sk_test'}
+
+        client = self.request_client(session=session)
+        self.assertEqual(3, client.warmup(self.valid_url, 3, headers))
+
+        self.assertEqual(3, session.request.call_count)
+        args, kwargs = session.request.call_args
+        self.assertEqual(('get', self.valid_url), args)
+        self.assertEqual(headers, kwargs['headers'])
+
+    def test_warmup_failure(self):
+        self.request_mock.exceptions.RequestException = IOError
+        session = Mock()
+        session.request.side_effect = IOError('refused')
+
+        client = self.request_client(session=session)
+        self.assertRaises(stripe.error.APIConnectionError,
+                          client.warmup, self.valid_url)
+
+    def test_request_stream_falls_back_to_buffering(self):
+        client = stripe.http_client.HTTPClient()
+        client.request = Mock(return_value=('abcde', 200, {}))
+
+        chunks, code, _ = client.request_stream(
+            'get', self.valid_url, {}, chunk_size=2)
+
+        self.assertEqual(['ab', 'cd', 'e'], list(chunks))
 
 
 class UrlFetchClientTests(StripeUnitTestCase, ClientTestBase):
@@ -155,6 +271,83 @@ class UrlFetchClientTests(StripeUnitTestCase, ClientTestBase):
             payload=post_data
         )
 
+    def test_request_reads_streamed_body(self):
+        self.mock_response(self.request_mock, '{}', 200)
+        body = MultipartBody(['streamed ', 'body'])
+
+        self.make_request('post', self.valid_url, {}, body)
+
+        self.check_call(self.request_mock, 'post', self.valid_url,
+                        'streamed body', {})
+
+
+class UrlFetchAsyncTests(StripeUnitTestCase):
+
+    def setUp(self):
+        super(UrlFetchAsyncTests, self).setUp()
+
+        self.urlfetch = fake_urlfetch.FakeUrlFetch()
+        stripe.http_client.urlfetch = self.urlfetch
+
+    def test_requests_run_concurrently(self):
+        client = stripe.http_client.UrlFetchClient()
+        for i in xrange(3):
+            self.urlfetch.add_response('{"n": %d}' % (i,))
+
+        rpcs = [client.request_async('get', 'https://api.stripe.com/%d' % i,
+                                     {}) for i in xrange(3)]
+
+        self.assertEqual(3, self.urlfetch.in_flight)
+        self.assertEqual(['{"n": 0}', '{"n": 1}', '{"n": 2}'],
+                         [rpc.get_result()[0] for rpc in rpcs])
+        self.assertEqual(0, self.urlfetch.in_flight)
+
+    def test_deadline(self):
+        client = stripe.http_client.UrlFetchClient(deadline=10)
+        self.urlfetch.add_response()
+        self.urlfetch.add_response()
+
+        client.request('get', 'https://api.stripe.com/', {})
+        client.request_async('get', 'https://api.stripe.com/', {})
+
+        self.assertEqual([10, 10],
+                         [call['deadline'] for call in self.urlfetch.calls])
+
+    def test_deadline_is_cut_short(self):
+        client = stripe.http_client.UrlFetchClient()
+        self.urlfetch.add_response()
+
+        with stripe.Deadline(10):
+            client.request_async('get', 'https://api.stripe.com/', {})
+
+        self.assertTrue(9 < self.urlfetch.calls[0]['deadline'] <= 10)
+
+    def test_request_error(self):
+        client = stripe.http_client.UrlFetchClient()
+        self.urlfetch.add_response(
+            error=fake_urlfetch.DeadlineExceededError('timed out'))
+
+        rpc = client.request_async('get', 'https://api.stripe.com/', {})
+
+        self.assertRaises(stripe.error.APIConnectionError, rpc.get_result)
+
+    def test_invalid_url(self):
+        client = stripe.http_client.UrlFetchClient()
+
+        self.assertRaises(stripe.error.APIConnectionError,
+                          client.request_async, 'get', 'api.stripe.com', {})
+
+    def test_request_async_without_rpcs(self):
+        client = stripe.http_client.HTTPClient()
+        client.request = Mock(side_effect=[
+            ('{}', 200, {}), stripe.error.APIConnectionError('refused')])
+
+        first = client.request_async('get', 'https://api.stripe.com/', {})
+        second = client.request_async('get', 'https://api.stripe.com/', {})
+
+        self.assertEqual(('{}', 200, {}), first.get_result())
+        self.assertRaises(stripe.error.APIConnectionError, second.get_result)
+
 
 class Urllib2ClientTests(StripeUnitTestCase, ClientTestBase):
     request_client = stripe.http_client.Urllib2Client
@@ -178,7 +371,197 @@ class Urllib2ClientTests(StripeUnitTestCase, ClientTestBase):
             post_data = post_data.encode('utf-8')
 
         mock.Request.assert_called_with(url, post_data, headers)
-        mock.urlopen.assert_called_with(self.request_object)
+        mock.urlopen.assert_called_with(
+            self.request_object, context=stripe.http_client.ssl_context())
+
+
+class PooledUrllib2ClientTests(StripeUnitTestCase, ClientTestBase):
+    request_client = stripe.http_client.PooledUrllib2Client
+
+    def setUp(self):
+        super(PooledUrllib2ClientTests, self).setUp()
+
+        self.httplib_patcher = patch('stripe.http_client.httplib')
+        self.select_patcher = patch('stripe.http_client.select.select')
+
+        httplib_mock = self.httplib_patcher.start()
+        httplib_mock.HTTPException = httplib.HTTPException
+        httplib_mock.BadStatusLine = httplib.BadStatusLine
+        httplib_mock.HTTPSConnection.side_effect = self.new_connection
+        self.select_mock = self.select_patcher.start()
+        self.select_mock.return_value = ([], [], [])
+
+        self.connections = []
+
+    def tearDown(self):
+        super(PooledUrllib2ClientTests, self).tearDown()
+
+        self.httplib_patcher.stop()
+        self.select_patcher.stop()
+
+    def new_connection(self, *args, **kwargs):
+        conn = Mock()
+        if hasattr(self, 'response'):
+            conn.getresponse.return_value = self.response
+        self.connections.append(conn)
+        return conn
+
+    @property
+    def request_mock(self):
+        return self
+
+    def mock_response(self, mock, body, code):
+        self.response = Mock(status=code, will_close=False)
+        self.response.read.return_value = body
+        self.response.getheaders.return_value = [('Request-Id', 'req_1')]
+
+    def mock_error(self, mock):
+        self.mock_response(mock, '', 200)
+        self.new_connection().request.side_effect = socket.error('refused')
+        stripe.http_client.httplib.HTTPSConnection.side_effect = None
+        stripe.http_client.httplib.HTTPSConnection.return_value = \
+            self.connections[0]
+
+    def check_call(self, mock, meth, url, post_data, headers):
+        self.connections[-1].request.assert_called_with(
+            meth.upper(), '/foo', post_data, headers)
+
+    def test_connection_is_reused(self):
+        self.mock_response(None, '{}', 200)
+        client = self.request_client()
+
+        for _ in xrange(3):
+            self.assertEqual(
+                ('{}', 200, {'request-id': 'req_1'}),
+                client.request('get', self.valid_url, {}))
+
+        self.assertEqual(1, len(self.connections))
+        self.assertFalse(self.connections[0].close.called)
+
+    def test_dropped_connection_is_replaced(self):
+        self.mock_response(None, '{}', 200)
+        client = self.request_client()
+        client.request('get', self.valid_url, {})
+
+        self.select_mock.return_value = ([self.connections[0].sock], [], [])
+        client.request('get', self.valid_url, {})
+
+        self.assertEqual(2, len(self.connections))
+        self.assertTrue(self.connections[0].close.called)
+
+    def test_idle_connection_expires(self):
+        self.mock_response(None, '{}', 200)
+        client = self.request_client(max_idle=30)
+        client.request('get', self.valid_url, {})
+
+        later = time.time() + 60
+        with patch('stripe.http_client.time.time', return_value=later):
+            client.request('get', self.valid_url, {})
+
+        self.assertEqual(2, len(self.connections))
+        self.assertTrue(self.connections[0].close.called)
+
+    def test_stale_connection_is_retried(self):
+        self.mock_response(None, '{}', 200)
+        client = self.request_client()
+        client.request('get', self.valid_url, {})
+
+        self.connections[0].getresponse.side_effect = \
+            httplib.BadStatusLine('')
+        headers = {'Idempotency-Key': 'key_1'}
+        self.assertEqual(200, client.request('post', self.valid_url,
+                                             headers, 'a=1')[1])
+
+        self.assertEqual(2, len(self.connections))
+        self.connections[1].request.assert_called_with(
+            'POST', '/foo', 'a=1', headers)
+
+    def test_unsent_request_is_retried(self):
+        self.mock_response(None, '{}', 200)
+        client = self.request_client()
+        client.request('get', self.valid_url, {})
+
+        self.connections[0].request.side_effect = \
+            socket.error(errno.EPIPE, 'Broken pipe')
+        self.assertEqual(200, client.request('post', self.valid_url, {},
+                                             'a=1')[1])
+        self.assertEqual(2, len(self.connections))
+
+    def test_sent_post_is_not_resent(self):
+        self.mock_response(None, '{}', 200)
+        client = self.request_client()
+        client.request('get', self.valid_url, {})
+
+        # The server may have charged the card before the connection reset
+        self.connections[0].getresponse.side_effect = \
+            socket.error(errno.ECONNRESET, 'Connection reset by peer')
+        self.assertRaises(stripe.error.APIConnectionError,
+                          client.request, 'post', self.valid_url, {}, 'a=1')
+
+        self.assertEqual(1, len(self.connections))
+        self.assertEqual(2, self.connections[0].request.call_count)
+
+    def test_stale_connection_with_file_body_is_not_retried(self):
+        self.mock_response(None, '{}', 200)
+        client = self.request_client()
+        client.request('get', self.valid_url, {})
+
+        self.connections[0].getresponse.side_effect = \
+            httplib.BadStatusLine('')
+        self.assertRaises(stripe.error.APIConnectionError,
+                          client.request, 'post', self.valid_url, {},
+                          MultipartBody(['body']))
+        self.assertEqual(1, len(self.connections))
+
+    def test_closing_connection_is_not_pooled(self):
+        self.mock_response(None, '{}', 200)
+        self.response.will_close = True
+        client = self.request_client()
+        client.request('get', self.valid_url, {})
+        client.request('get', self.valid_url, {})
+
+        self.assertEqual(2, len(self.connections))
+
+    def test_request_stream(self):
+        self.mock_response(None, None, 200)
+        self.response.read.side_effect = ['ab', 'cd', '']
+        client = self.request_client()
+
+        chunks, code, headers = client.request_stream(
+            'get', self.valid_url, {}, chunk_size=2)
+
+        self.assertEqual({'request-id': 'req_1'}, headers)
+        self.assertEqual(['ab', 'cd'], list(chunks))
+        self.response.read.assert_called_with(2)
+        self.assertEqual(1, len(client._idle[('https', 'api.stripe.com')]))
+
+    def test_request_within_deadline(self):
+        self.mock_response(None, '{}', 200)
+        client = self.request_client()
+        client.request('get', self.valid_url, {})
+        self.connections[0].sock.settimeout.assert_called_with(80)
+
+        with stripe.Deadline(10):
+            client.request('get', self.valid_url, {})
+
+        (timeout,), _ = self.connections[0].sock.settimeout.call_args
+        self.assertTrue(9 < timeout <= 10)
+
+    def test_warmup(self):
+        self.mock_response(None, '', 404)
+        client = self.request_client(pool_size=2)
+
+        self.assertEqual(2, client.warmup(
+            'https://api.stripe.com/v1/account?a=1', 3, {'X': 'y'}))
+
+        self.assertEqual(2, len(self.connections))
+        for conn in self.connections:
+            self.assertTrue(conn.connect.called)
+            conn.request.assert_called_with('GET', '/v1/account?a=1',
+                                            headers={'X': 'y'})
+
+        client.request('get', self.valid_url, {})
+        self.assertEqual(2, len(self.connections))
 
 
 class PycurlClientTests(StripeUnitTestCase, ClientTestBase):
@@ -227,6 +610,71 @@ class PycurlClientTests(StripeUnitTestCase, ClientTestBase):
         # TODO: Check the setopt calls
         pass
 
+    def test_request_streams_body(self):
+        self.mock_response(self.request_mock, '{}', 200)
+        pycurl = self.request_mocks[self.request_client.name]
+        body = MultipartBody(['streamed ', 'body'])
+
+        self.make_request('post', self.valid_url, {}, body)
+
+        self.request_mock.setopt.assert_any_call(
+            pycurl.READFUNCTION, body.read)
+        self.request_mock.setopt.assert_any_call(
+            pycurl.POSTFIELDSIZE_LARGE, 13)
+
+    def test_request_within_deadline(self):
+        self.mock_response(self.request_mock, '{}', 200)
+        pycurl = self.request_mocks[self.request_client.name]
+
+        self.make_request('get', self.valid_url, {}, None)
+        self.request_mock.setopt.assert_any_call(pycurl.TIMEOUT_MS, 80000)
+
+        with stripe.Deadline(0.5, connect_timeout=0.1):
+            self.make_request('get', self.valid_url, {}, None)
+        self.request_mock.setopt.assert_any_call(
+            pycurl.CONNECTTIMEOUT_MS, 100)
+        calls = self.request_mock.setopt.call_args_list
+        _, timeout = [args for args, _ in calls
+                      if args[0] == pycurl.TIMEOUT_MS][-1]
+        self.assertTrue(400 < timeout <= 500)
+
+    def test_request_passes_ca_bundle_in_memory(self):
+        self.mock_response(self.request_mock, '{}', 200)
+        pycurl = self.request_mocks[self.request_client.name]
+
+        self.make_request('get', self.valid_url, {}, None)
+
+        self.request_mock.setopt.assert_any_call(
+            pycurl.CAINFO_BLOB, stripe.http_client.ca_bundle())
+
+
+class SSLContextTests(StripeTestCase):
+
+    def setUp(self):
+        super(SSLContextTests, self).setUp()
+
+        if stripe.http_client.ssl_context() is None:
+            self.skipTest('SSL contexts are not supported')
+
+    def test_context_is_shared(self):
+        context = stripe.http_client.ssl_context()
+
+        self.assertTrue(context is stripe.http_client.ssl_context())
+        self.assertEqual(ssl.CERT_REQUIRED, context.verify_mode)
+        self.assertTrue(context.check_hostname)
+        self.assertFalse(stripe.http_client.ssl_context(False).check_hostname)
+
+    def test_requests_session_uses_shared_context(self):
+        stripe.http_client._load_backends()
+        if stripe.http_client.requests is None:
+            self.skipTest('requests is not installed')
+
+        session = stripe.http_client._new_session(4, True)
+        adapter = session.get_adapter('https://api.stripe.com')
+
+        self.assertTrue(stripe.http_client.ssl_context(False) is
+                        adapter.poolmanager.connection_pool_kw['ssl_context'])
+
 
 class APIEncodeTest(StripeUnitTestCase):
 
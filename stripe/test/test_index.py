@@ -0,0 +1,121 @@
+import unittest2
+
+import stripe
+import stripe.index
+
+from stripe import util
+from stripe.test.helper import StripeApiTestCase
+
+
+CUSTOMERS = [
+    {'id': 'cus_1', 'object': 'customer', 'email': 'Jenny@Example.com',
+     'metadata': {'user_id': '123'}},
+    {'id': 'cus_2', 'object': 'customer', 'email': 'jenny.rosen@example.com',
+     'metadata': {'user_id': '456'}},
+    {'id': 'cus_3', 'object': 'customer', 'email': 'joe@example.com',
+     'metadata': {}},
+    {'id': 'ch_1', 'object': 'charge', 'metadata': {'user_id': '123'}},
+]
+
+
+class InvertedIndexTests(StripeApiTestCase):
+
+    def setUp(self):
+        super(InvertedIndexTests, self).setUp()
+        self.index = stripe.index.InvertedIndex(
+            fields=['email'], metadata_keys=['user_id'],
+            object_types=['customer']).build(CUSTOMERS)
+
+    def test_find(self):
+        self.assertEqual(3, len(self.index))
+        self.assertEqual(['cus_1'], self.index.find('metadata.user_id', 123))
+        self.assertEqual(['cus_1'],
+                         self.index.find('email', 'jenny@example.com'))
+        self.assertEqual('cus_2', self.index.find_one('metadata.user_id',
+                                                      '456'))
+        self.assertEqual(None, self.index.find_one('email', 'x@y.z'))
+        self.assertRaises(ValueError, self.index.find, 'description', 'x')
+
+    def test_case_sensitive(self):
+        index = stripe.index.InvertedIndex(
+            case_sensitive=True).build(CUSTOMERS)
+
+        self.assertEqual([], index.find('email', 'jenny@example.com'))
+        self.assertEqual(['cus_1'], index.find('email', 'Jenny@Example.com'))
+
+    def test_prefix(self):
+        self.assertEqual(['cus_2', 'cus_1'],
+                         self.index.prefix('email', 'JENNY'))
+        self.assertEqual(['cus_2'], self.index.prefix('email', 'jenny',
+                                                      limit=1))
+        self.assertEqual([], self.index.prefix('email', 'zed'))
+
+    def test_reindex_and_remove(self):
+        self.index.add(dict(CUSTOMERS[0], email='jen@example.com',
+                            metadata={}))
+
+        self.assertEqual([], self.index.find('metadata.user_id', '123'))
+        self.assertEqual(['cus_1'], self.index.prefix('email', 'jen@'))
+        self.assertEqual(['cus_2'], self.index.prefix('email', 'jenny'))
+
+        self.index.remove('cus_1')
+        self.assertFalse('cus_1' in self.index)
+        self.assertEqual([], self.index.prefix('email', 'jen@'))
+
+    def test_build_onto_existing_index(self):
+        self.index.build([
+            dict(CUSTOMERS[2], email='adam@example.com'),
+            dict(CUSTOMERS[2], email='zed@example.com'),
+            {'id': 'cus_5', 'object': 'customer', 'email': 'Amy@example.com'},
+        ])
+        self.index.add({'id': 'cus_6', 'object': 'customer',
+                        'email': 'bob@example.com'})
+
+        self.assertEqual(['amy@example.com', 'bob@example.com',
+                          'jenny.rosen@example.com', 'jenny@example.com',
+                          'zed@example.com'], self.index._values['email'])
+        self.assertEqual(['cus_3'], self.index.prefix('email', 'z'))
+
+    def test_apply_events(self):
+        self.index.apply({'type': 'customer.deleted',
+                          'data': {'object': CUSTOMERS[1]}})
+        self.index.apply({'type': 'customer.created',
+                          'data': {'object': {
+                              'id': 'cus_4', 'object': 'customer',
+                              'email': 'new@example.com'}}})
+
+        self.assertEqual([], self.index.find('metadata.user_id', '456'))
+        self.assertEqual(['cus_4'],
+                         self.index.find('email', 'new@example.com'))
+
+    def test_indexes_objects_on_refresh(self):
+        self.index.start()
+        try:
+            self.mock_response({'id': 'cus_5', 'object': 'customer',
+                                'email': 'loaded@example.com',
+                                'metadata': {'user_id': '789'}})
+            stripe.Customer.retrieve('cus_5')
+        finally:
+            self.index.stop()
+
+        self.assertEqual(['cus_5'], self.index.find('metadata.user_id', 789))
+
+        stripe.Customer.construct_from(
+            {'id': 'cus_6', 'object': 'customer',
+             'email': 'late@example.com'}, 'sk_test')
+        self.assertEqual([], self.index.find('email', 'late@example.com'))
+
+    def test_save_and_load(self):
+        out = util.StringIO.StringIO()
+        self.index.save(out)
+
+        loaded = stripe.index.InvertedIndex.load(
+            util.StringIO.StringIO(out.getvalue()))
+
+        self.assertEqual(3, len(loaded))
+        self.assertEqual(['cus_1'], loaded.find('metadata.user_id', '123'))
+        self.assertEqual(['cus_2', 'cus_1'], loaded.prefix('email', 'jenny'))
+
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,193 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+import unittest2
+
+from mock import Mock
+
+import stripe
+import stripe.mirror
+
+from stripe.test.helper import StripeApiTestCase
+
+
+def page(data, has_more=False):
+    return {'object': 'list', 'has_more': has_more, 'data': data}
+
+
+def event(id, type, obj):
+    return {'id': id, 'object': 'event', 'type': type,
+            'data': {'object': obj}}
+
+
+CUSTOMER = {
+    'id': 'cus_1', 'object': 'customer', 'created': 100, 'email': 'a@b.c',
+    'subscriptions': page([
+        {'id': 'sub_1', 'object': 'subscription', 'customer': 'cus_1',
+         'plan': {'id': 'gold', 'object': 'plan'}, 'status': 'active'},
+    ]),
+}
+
+CHARGES = [
+    {'id': 'ch_2', 'object': 'charge', 'customer': 'cus_1', 'amount': 200,
+     'created': 300},
+    {'id': 'ch_1', 'object': 'charge', 'customer': 'cus_1', 'amount': 100,
+     'created': 200},
+    {'id': 'ch_3', 'object': 'charge', 'customer': 'cus_2', 'amount': 300,
+     'created': 250},
+]
+
+
+class MirrorTests(StripeApiTestCase):
+
+    def setUp(self):
+        super(MirrorTests, self).setUp()
+        self.responses = {}
+        self.requestor_mock.request = Mock(side_effect=self.respond)
+        self.mirror = stripe.mirror.Mirror(api_key='sk_test')
+
+    def tearDown(self):
+        self.mirror.close()
+        super(MirrorTests, self).tearDown()
+
+    def respond(self, method, url, params):
+        return self.responses[url].pop(0), 'reskey'
+
+    def bootstrap(self):
+        self.responses = {
+            '/v1/events': [page([{'id': 'evt_0', 'object': 'event'}])],
+            '/v1/customers': [page([CUSTOMER])],
+            '/v1/charges': [page(CHARGES[:2], has_more=True),
+                            page(CHARGES[2:])],
+        }
+        self.mirror.bootstrap([stripe.Customer, stripe.Charge])
+
+    def test_bootstrap(self):
+        self.bootstrap()
+
+        self.assertEqual('evt_0', self.mirror.cursor)
+        self.assertEqual(set(['charge', 'customer', 'subscription']),
+                         self.mirror.object_types)
+        self.assertEqual(5, self.mirror.count())
+        self.assertEqual(3, self.mirror.count('charge'))
+
+        customer = self.mirror.get('cus_1')
+        self.assertTrue(isinstance(customer, stripe.Customer))
+        self.assertEqual('a@b.c', customer.email)
+        self.assertEqual('sk_test', customer.api_key)
+        self.assertEqual(None, self.mirror.get('cus_missing'))
+
+    def test_find(self):
+        self.bootstrap()
+
+        charges = self.mirror.find('charge', customer='cus_1')
+        self.assertEqual(['ch_2', 'ch_1'], [c.id for c in charges])
+        self.assertTrue(isinstance(charges[0], stripe.Charge))
+
+        subscriptions = self.mirror.find('subscription', plan='gold')
+        self.assertEqual(['sub_1'], [s.id for s in subscriptions])
+
+        charges = self.mirror.find('charge', created={'gte': 250, 'lt': 300})
+        self.assertEqual(['ch_3'], [c.id for c in charges])
+        self.assertEqual(['ch_1'], [c.id for c in self.mirror.find(
+            'charge', created=200)])
+        self.assertEqual(1, len(self.mirror.find('charge', limit=1)))
+
+        self.assertRaises(ValueError, self.mirror.find, 'charge',
+                          created={'after': 1})
+
+    def test_sync_applies_events_in_order(self):
+        self.bootstrap()
+
+        updated = dict(CHARGES[1], amount=50, refunded=True)
+        self.responses['/v1/events'] = [
+            # Newest first, like the API
+            page([
+                event('evt_3', 'charge.refunded', updated),
+                event('evt_2', 'charge.captured', CHARGES[1]),
+            ], has_more=True),
+            page([
+                event('evt_5', 'customer.deleted', CUSTOMER),
+                event('evt_4', 'invoice.created',
+                      {'id': 'in_1', 'object': 'invoice'}),
+            ]),
+        ]
+
+        self.assertEqual(4, self.mirror.sync(page_size=2))
+
+        calls = self.requestor_mock.request.call_args_list
+        self.assertEqual({'limit': 2, 'ending_before': 'evt_0'},
+                         calls[-2][0][2])
+        self.assertEqual({'limit': 2, 'ending_before': 'evt_3'},
+                         calls[-1][0][2])
+
+        self.assertEqual('evt_5', self.mirror.cursor)
+        self.assertTrue(self.mirror.has_event('evt_4'))
+        self.assertFalse(self.mirror.has_event('evt_6'))
+        self.assertEqual(50, self.mirror.get('ch_1').amount)
+        self.assertEqual(None, self.mirror.get('cus_1'))
+        self.assertEqual(None, self.mirror.get('in_1'))
+
+    def test_confirms_dedupe_from_other_threads(self):
+        self.mirror.apply(event('evt_1', 'charge.created', CHARGES[0]))
+        store = stripe.dedupe.BloomDedupeStore(confirm=self.mirror.has_event)
+        store.add('evt_1')
+        store.add('evt_2')
+        results = []
+
+        def check():
+            results.append((store.seen('evt_1'), store.seen('evt_2')))
+        thread = threading.Thread(target=check)
+        thread.start()
+        thread.join()
+
+        self.assertEqual([(True, False)], results)
+
+    def test_apply_commits(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'stripe.db')
+        mirror = stripe.mirror.Mirror(path)
+        self.addCleanup(mirror.close)
+
+        mirror.apply(event('evt_1', 'charge.created', CHARGES[0]),
+                     object_types=['charge'])
+
+        other = sqlite3.connect(path)
+        self.addCleanup(other.close)
+        self.assertEqual(1, other.execute(
+            'SELECT COUNT(*) FROM objects').fetchone()[0])
+        self.assertEqual(1, other.execute(
+            'SELECT COUNT(*) FROM applied_events').fetchone()[0])
+
+    def test_sync_without_bootstrap(self):
+        self.assertRaises(ValueError, self.mirror.sync)
+
+    def test_sync_after_empty_event_history(self):
+        self.responses = {
+            '/v1/events': [
+                page([]),
+                page([
+                    event('evt_2', 'customer.updated',
+                          dict(CUSTOMER, email='new@b.c')),
+                    event('evt_1', 'customer.updated', CUSTOMER),
+                ]),
+                page([]),
+            ],
+            '/v1/customers': [page([CUSTOMER])],
+        }
+        self.mirror.bootstrap([stripe.Customer])
+        self.assertEqual('', self.mirror.cursor)
+
+        self.assertEqual(2, self.mirror.sync())
+        self.assertEqual('evt_2', self.mirror.cursor)
+        self.assertEqual('new@b.c', self.mirror.get('cus_1').email)
+
+        self.assertEqual(0, self.mirror.sync())
+
+
+if __name__ == '__main__':
+    unittest2.main()
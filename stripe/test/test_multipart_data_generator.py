@@ -1,7 +1,12 @@
+import io
 import re
 import sys
+import tempfile
 
-from stripe.multipart_data_generator import MultipartDataGenerator
+from mock import patch
+
+from stripe.multipart_data_generator import (
+    MultipartBody, MultipartDataGenerator)
 from stripe.test.helper import StripeTestCase
 
 
@@ -38,3 +43,49 @@ class MultipartDataGeneratorTests(StripeTestCase):
         test_file.seek(0)
         file_contents = test_file.read()
         self.assertNotEqual(-1, http_body.find(file_contents))
+
+    def test_post_data_closes_body(self):
+        generator = MultipartDataGenerator()
+        generator.add_params({"key": open(__file__, 'rb')})
+
+        with patch.object(MultipartBody, 'close',
+                          autospec=True) as close:
+            generator.get_post_data()
+
+        self.assertEqual(1, close.call_count)
+
+    def test_streamed_body_matches_post_data(self):
+        test_file = open(__file__, 'rb')
+        test_file.seek(10)
+
+        generator = MultipartDataGenerator()
+        generator.add_params({"key1": "value1", "key2": test_file})
+        body = generator.get_body(chunk_size=100)
+
+        test_file.seek(10)
+        file_contents = test_file.read()
+        test_file.seek(10)
+
+        chunks = list(body)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        http_body = b''.join(chunks)
+        self.assertEqual(len(body), len(http_body))
+        self.assertEqual(generator.get_post_data(), http_body)
+        self.assertNotEqual(-1, http_body.find(file_contents))
+        self.assertEqual(1, http_body.count(
+            ("--%s--" % (generator.boundary,)).encode('utf-8')))
+        body.close()
+
+    def test_streamed_body_from_empty_and_in_memory_files(self):
+        empty = tempfile.NamedTemporaryFile()
+        memory = io.BytesIO(b'in memory')
+        memory.name = 'memory'
+
+        generator = MultipartDataGenerator()
+        generator.add_params({"a": empty, "b": memory})
+        body = generator.get_body()
+
+        http_body = body.read(5) + body.read()
+        self.assertEqual(len(body), len(http_body))
+        self.assertNotEqual(-1, http_body.find(b'in memory'))
+        self.assertEqual(b'', body.read())
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+import unittest2
+
+import stripe
+import stripe.error
+import stripe.resource
+
+from stripe.test.helper import StripeTestCase
+
+# Modules that are slow to import and have no business being loaded before
+# they are needed
+SLOW_MODULES = ['numpy', 'pycurl', 'requests', 'urllib2',
+                'google.appengine.api.urlfetch']
+
+
+class PackageTests(StripeTestCase):
+
+    def imported_by(self, code):
+        script = 'import sys\n%s\nprint("\\n".join(sys.modules))' % (code,)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(stripe.__file__))
+        process = subprocess.Popen([sys.executable, '-c', script],
+                                   stdout=subprocess.PIPE, env=env)
+        output = process.communicate()[0]
+        self.assertEqual(0, process.returncode)
+        return set(output.decode('utf-8').split())
+
+    def test_import_is_lazy(self):
+        modules = self.imported_by('import stripe')
+
+        self.assertTrue('stripe' in modules)
+        for name in SLOW_MODULES + ['stripe.resource', 'stripe.http_client']:
+            self.assertFalse(name in modules, '%s was imported' % (name,))
+
+    def test_resources_load_without_http_libraries(self):
+        modules = self.imported_by('import stripe\nstripe.Charge')
+
+        self.assertTrue('stripe.resource' in modules)
+        for name in SLOW_MODULES:
+            self.assertFalse(name in modules, '%s was imported' % (name,))
+
+    def test_attributes(self):
+        self.assertTrue(stripe.Charge is stripe.resource.Charge)
+        self.assertTrue(stripe.CardError is stripe.error.CardError)
+        self.assertTrue(stripe.convert_to_stripe_object is
+                        stripe.resource.convert_to_stripe_object)
+        self.assertTrue(stripe.bulk is sys.modules['stripe.bulk'])
+        self.assertTrue('Customer' in dir(stripe))
+        self.assertTrue('Customer' in stripe.__all__)
+        self.assertRaises(AttributeError, getattr, stripe, 'NoSuchThing')
+
+
+if __name__ == '__main__':
+    unittest2.main()
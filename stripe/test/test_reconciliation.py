@@ -0,0 +1,114 @@
+import datetime
+
+import unittest2
+
+import stripe
+import stripe.reconciliation
+
+from stripe.test.helper import StripeApiTestCase
+
+JULY_1 = 1435708800
+DAY = 60 * 60 * 24
+
+TRANSACTIONS = [
+    {'id': 'txn_1', 'source': 'ch_1', 'amount': 1000, 'fee': 59,
+     'net': 941, 'currency': 'usd', 'type': 'charge', 'created': JULY_1},
+    {'id': 'txn_2', 'source': 'ch_2', 'amount': 2000, 'fee': 88,
+     'net': 1912, 'currency': 'usd', 'type': 'charge',
+     'created': JULY_1 + 60},
+    {'id': 'txn_3', 'source': 're_1', 'amount': -1000, 'fee': 0,
+     'net': -1000, 'currency': 'usd', 'type': 'refund',
+     'created': JULY_1 + DAY},
+    {'id': 'txn_4', 'source': 'ch_3', 'amount': 500, 'fee': 45,
+     'net': 455, 'currency': 'eur', 'type': 'charge', 'created': JULY_1},
+    {'id': 'txn_5', 'source': None, 'amount': -25, 'fee': 0,
+     'net': -25, 'currency': 'usd', 'type': 'adjustment',
+     'created': JULY_1},
+]
+
+
+class ReconciliationTests(StripeApiTestCase):
+
+    def test_summarize(self):
+        totals = stripe.reconciliation.summarize(TRANSACTIONS)
+
+        july_1 = datetime.date(2015, 7, 1)
+        self.assertEqual({'gross': 3000, 'fee': 147, 'net': 2853},
+                         totals[('charge', 'usd', july_1)])
+        self.assertEqual({'gross': 500, 'fee': 45, 'net': 455},
+                         totals[('charge', 'eur', july_1)])
+        self.assertEqual({'gross': -1000, 'fee': 0, 'net': -1000},
+                         totals[('refund', 'usd', datetime.date(2015, 7, 2))])
+        self.assertEqual(4, len(totals))
+
+    def test_reconcile_matching_ledger(self):
+        ledger = [
+            {'source': 'ch_1', 'amount': 1000, 'currency': 'usd'},
+            {'source': 'ch_2', 'amount': 1500},
+            {'source': 'ch_2', 'amount': 500},
+            ('re_1', -1000),
+            ('ch_3', 500),
+            ('txn_5', -25),
+        ]
+        report = stripe.reconciliation.reconcile(TRANSACTIONS, ledger)
+
+        self.assertTrue(report.ok)
+        self.assertEqual(5, report.matched)
+        self.assertEqual(4, len(report.totals))
+
+    def test_reconcile_differences(self):
+        ledger = [
+            {'source': 'ch_1', 'amount': 1000, 'currency': 'eur'},
+            ('ch_2', 1999),
+            ('re_1', -1000),
+            ('ch_9', 700),
+        ]
+        report = stripe.reconciliation.reconcile(TRANSACTIONS, ledger)
+
+        self.assertFalse(report.ok)
+        self.assertEqual(1, report.matched)
+        self.assertEqual([('ch_3', 500, 'eur'), ('txn_5', -25, 'usd')],
+                         report.missing_from_ledger)
+        self.assertEqual([('ch_9', 700, None)], report.missing_from_stripe)
+        self.assertEqual([('ch_1', 1000, 'usd', 1000, 'eur'),
+                          ('ch_2', 2000, 'usd', 1999, None)],
+                         report.mismatched)
+        self.assertEqual([
+            '1 matched, 2 missing from ledger, 1 missing from Stripe, '
+            '2 mismatched',
+            '- ch_3 500 eur',
+            '- txn_5 -25 usd',
+            '+ ch_9 700',
+            '~ ch_1 1000 usd != 1000 eur',
+            '~ ch_2 2000 usd != 1999',
+        ], str(report).split('\n'))
+
+    def test_reconcile_expanded_sources(self):
+        transactions = [dict(TRANSACTIONS[0], source={
+            'id': 'ch_1', 'object': 'charge', 'amount': 1000})]
+        report = stripe.reconciliation.reconcile(transactions,
+                                                 [('ch_1', 1000)])
+
+        self.assertTrue(report.ok)
+        self.assertEqual(1, report.matched)
+
+    def test_reconcile_range(self):
+        self.mock_response({
+            'object': 'list',
+            'has_more': False,
+            'data': TRANSACTIONS,
+        })
+
+        report = stripe.reconciliation.reconcile_range(
+            datetime.date(2015, 7, 1), datetime.datetime(2015, 7, 3),
+            [], api_key='sk_test')
+
+        self.assertEqual(5, len(report.missing_from_ledger))
+        self.requestor_mock.request.assert_called_with(
+            'get', '/v1/balance/history',
+            {'created': {'gte': JULY_1, 'lt': JULY_1 + 2 * DAY},
+             'limit': 100})
+
+
+if __name__ == '__main__':
+    unittest2.main()
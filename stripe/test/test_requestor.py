@@ -2,10 +2,11 @@ import datetime
 import unittest2
 import urlparse
 
-from mock import Mock
+from mock import Mock, patch
 
 import stripe
 
+from stripe.test import fake_urlfetch
 from stripe.test.helper import StripeUnitTestCase
 
 VALID_API_METHODS = ('get', 'post', 'delete')
@@ -365,6 +366,299 @@ class APIRequestorRequestTests(StripeUnitTestCase):
                           self.requestor.request,
                           'get', self.valid_path, {})
 
+    def test_interns_repeated_strings(self):
+        self.mock_response(
+            '{"data": [{"object": "charge", "currency": "usd", "id": "ch_1", '
+            '"metadata": {"order_1": "a"}}, '
+            '{"object": "charge", "currency": "usd", "id": "ch_2", '
+            '"metadata": {"order_1": "b"}}]}', 200)
+
+        body, key = self.requestor.request('get', self.valid_path, {})
+        first, second = body['data']
+
+        self.assertEqual('usd', first['currency'])
+        self.assertTrue(first['currency'] is second['currency'])
+
+        first_keys = dict((k, k) for k in first.keys())
+        for k in second.keys():
+            self.assertTrue(first_keys[k] is k)
+
+        # Values outside of the enumerated fields are left alone
+        self.assertEqual('ch_2', second['id'])
+
+        # As are the keys of hashes that aren't API objects
+        first_key, = first['metadata'].keys()
+        second_key, = second['metadata'].keys()
+        self.assertFalse(first_key is second_key)
+
+    def test_request_stream(self):
+        self.http_client.request_stream = Mock(
+            return_value=(iter(['ab', 'cd']), 200, {'foo': 'bar'}))
+
+        chunks, headers = self.requestor.request_stream(
+            'https://files.stripe.com/files/file_1', chunk_size=2)
+
+        self.assertEqual(['ab', 'cd'], list(chunks))
+        self.assertEqual({'foo': 'bar'}, headers)
+        self.http_client.request_stream.assert_called_with(
+            'get', 'https://files.stripe.com/files/file_1',
+            APIHeaderMatcher(request_method='get'), chunk_size=2)
+
+        self.requestor.request_stream(self.valid_path, {'a': 1})
+        self.http_client.request_stream.assert_called_with(
+            'get', 'https://api.stripe.com%s?a=1' % (self.valid_path,),
+            APIHeaderMatcher(request_method='get'), chunk_size=65536)
+
+    def test_request_stream_only_sends_key_to_stripe(self):
+        self.http_client.request_stream = Mock(
+            return_value=(iter([]), 200, {}))
+
+        for url in ['https://example.com/files/file_1',
+                    'https://stripe.com.example.com/file_1',
+                    'http://files.stripe.com/file_1']:
+            self.assertRaises(stripe.error.InvalidRequestError,
+                              self.requestor.request_stream, url)
+        self.assertFalse(self.http_client.request_stream.called)
+
+        with patch.object(stripe, 'upload_api_base',
+                          'http://localhost:8080'):
+            self.requestor.request_stream('http://localhost:8080/file_1')
+        self.requestor.request_stream('https://uploads.stripe.com/file_1')
+        self.assertEqual(2, self.http_client.request_stream.call_count)
+
+    def test_request_stream_error(self):
+        self.http_client.request_stream = Mock(
+            return_value=(iter(['{"error": ', '{}}']), 404, {}))
+
+        self.assertRaises(stripe.error.InvalidRequestError,
+                          self.requestor.request_stream, self.valid_path)
+
+    def test_uses_default_http_client(self):
+        stripe.default_http_client = self.http_client
+        self.mock_response('{}', 200)
+
+        stripe.api_requestor.APIRequestor().request('get', self.valid_path)
+
+        self.check_call('get')
+
+    def test_warmup(self):
+        self.http_client.warmup = Mock(return_value=2)
+
+        with patch('stripe.http_client.new_pooled_http_client',
+                   return_value=self.http_client) as new_client:
+            report = stripe.warmup(n_connections=2)
+
+        new_client.assert_called_with(10, verify_ssl_certs=True)
+        self.assertTrue(stripe.default_http_client is self.http_client)
+        self.http_client.warmup.assert_called_with(
+            stripe.api_base + '/v1/account', 2,
+            APIHeaderMatcher(request_method='get'))
+        self.assertTrue(report['ssl_context'] >= 0)
+        self.assertTrue(report['client'] >= 0)
+        self.assertEqual(2, report['hosts'][stripe.api_base]['connections'])
+        self.assertTrue(stripe.http_client.ssl_context() is
+                        stripe.http_client.ssl_context())
+
+    def test_warmup_reports_errors(self):
+        stripe.default_http_client = self.http_client
+        failure = stripe.error.APIConnectionError('refused')
+        self.http_client.warmup = Mock(side_effect=[1, failure])
+
+        report = stripe.warmup(upload=True)
+
+        hosts = report['hosts']
+        self.assertEqual(1, hosts[stripe.api_base]['connections'])
+        self.assertEqual(0, hosts[stripe.upload_api_base]['connections'])
+        self.assertTrue(hosts[stripe.upload_api_base]['error'] is failure)
+
+    def test_warmup_without_api_key(self):
+        stripe.default_http_client = self.http_client
+        stripe.api_key = None
+        self.http_client.warmup = Mock()
+
+        report = stripe.warmup()
+
+        self.assertFalse(self.http_client.warmup.called)
+        self.assertEqual({}, report['hosts'])
+        self.assertTrue(report['ssl_context'] >= 0)
+
+    def test_request_batch(self):
+        urlfetch = fake_urlfetch.FakeUrlFetch()
+        urlfetch.add_response('{"id": "ch_1"}')
+        urlfetch.add_response('{"error": {"message": "Declined", '
+                              '"code": "card_declined"}}', 402)
+        urlfetch.add_response('{"id": "ch_3"}')
+
+        with patch('stripe.http_client.urlfetch', urlfetch):
+            requestor = stripe.api_requestor.APIRequestor(
+                key='sk_test_batch',
+                client=stripe.http_client.UrlFetchClient(deadline=10))
+            results = requestor.request_batch([
+                ('get', '/v1/charges/ch_1', None),
+                ('post', '/v1/charges', {'amount': 100}),
+                ('get', '/v1/charges/ch_3', {'expand': ['customer']}),
+            ])
+
+        self.assertEqual(({'id': 'ch_1'}, 'sk_test_batch'), results[0])
+        self.assertTrue(isinstance(results[1], stripe.error.CardError))
+        self.assertEqual(({'id': 'ch_3'}, 'sk_test_batch'), results[2])
+
+        self.assertEqual(3, urlfetch.max_in_flight)
+        self.assertEqual('amount=100', urlfetch.calls[1]['payload'])
+        self.assertTrue(urlfetch.calls[2]['url'].endswith(
+            '/v1/charges/ch_3?expand%5B%5D=customer'))
+        self.assertEqual([10] * 3, [c['deadline'] for c in urlfetch.calls])
+
+    def test_request_batch_without_async_client(self):
+        client = stripe.http_client.HTTPClient()
+        client.name = 'mockclient'
+        client.request = Mock(return_value=('{"id": "ch_1"}', 200, {}))
+        requestor = stripe.api_requestor.APIRequestor(client=client)
+
+        results = requestor.request_batch([
+            ('get', self.valid_path, None),
+            ('foo', self.valid_path, None),
+        ])
+
+        self.assertEqual({'id': 'ch_1'}, results[0][0])
+        self.assertTrue(isinstance(results[1],
+                                   stripe.error.APIConnectionError))
+
+    def test_deadline(self):
+        def check_timeout(*args):
+            self.assertTrue(stripe.deadlines.current() is deadline)
+            return '{}', 200, {}
+        self.http_client.request = Mock(side_effect=check_timeout)
+        deadline = stripe.Deadline(10)
+
+        self.requestor.request('get', self.valid_path, deadline=deadline)
+
+        self.assertTrue(self.http_client.request.called)
+        self.assertTrue(stripe.deadlines.current() is None)
+
+    def test_deadline_exceeded_fails_fast(self):
+        self.mock_response('{}', 200)
+
+        with patch('stripe.deadlines.time') as time_mock:
+            time_mock.time.return_value = 1000.0
+            deadline = stripe.Deadline(1)
+            time_mock.time.return_value = 1001.0
+            self.assertRaises(stripe.error.DeadlineExceededError,
+                              self.requestor.request, 'get',
+                              self.valid_path, deadline=deadline)
+
+        self.assertFalse(self.http_client.request.called)
+
+    def test_timeout_at_deadline(self):
+        with patch('stripe.deadlines.time') as time_mock:
+            time_mock.time.return_value = 1000.0
+            deadline = stripe.Deadline(1)
+
+            def time_out(*args):
+                time_mock.time.return_value = 1001.0
+                raise stripe.error.APIConnectionError('timed out')
+            self.http_client.request = Mock(side_effect=time_out)
+
+            with deadline:
+                self.assertRaises(stripe.error.DeadlineExceededError,
+                                  self.requestor.request, 'get',
+                                  self.valid_path)
+
+        self.http_client.request = Mock(
+            side_effect=stripe.error.APIConnectionError('refused'))
+        with stripe.Deadline(10):
+            try:
+                self.requestor.request('get', self.valid_path)
+            except stripe.error.APIConnectionError, e:
+                self.assertFalse(isinstance(
+                    e, stripe.error.DeadlineExceededError))
+
+    def test_hedging(self):
+        policy = Mock()
+        policy.call.side_effect = lambda request, *args: request(*args)
+        requestor = stripe.api_requestor.APIRequestor(
+            client=self.http_client, hedging=policy)
+        self.mock_response('{}', 200)
+
+        requestor.request('get', self.valid_path)
+        policy.call.assert_called_with(
+            self.http_client.request, 'get',
+            'https://api.stripe.com%s' % (self.valid_path,),
+            APIHeaderMatcher(request_method='get'), None)
+
+        policy.call.reset_mock()
+        requestor.request('post', self.valid_path, {'a': 1})
+        requestor.request('delete', self.valid_path)
+        self.assertFalse(policy.call.called)
+        self.assertEqual(3, self.http_client.request.call_count)
+
+    def test_hedging_policy_setting(self):
+        stripe.hedging_policy = stripe.HedgingPolicy()
+
+        requestor = stripe.api_requestor.APIRequestor(client=self.http_client)
+
+        self.assertTrue(requestor._hedging is stripe.hedging_policy)
+
+    def test_circuit_breaker(self):
+        breaker = stripe.CircuitBreaker(min_requests=2, window=2)
+        requestor = stripe.api_requestor.APIRequestor(
+            client=self.http_client, circuit_breaker=breaker)
+        self.mock_response('{"error": {}}', 503)
+
+        for _ in xrange(2):
+            self.assertRaises(stripe.error.APIError,
+                              requestor.request, 'get', self.valid_path)
+        self.assertEqual('open', breaker.state(
+            breaker.key('https://api.stripe.com')))
+
+        self.http_client.request.reset_mock()
+        self.assertRaises(stripe.error.CircuitOpenError,
+                          requestor.request, 'get', self.valid_path)
+        self.assertFalse(self.http_client.request.called)
+
+    def test_circuit_breaker_counts_connection_errors(self):
+        breaker = stripe.CircuitBreaker(min_requests=1, window=1)
+        requestor = stripe.api_requestor.APIRequestor(
+            client=self.http_client, circuit_breaker=breaker)
+        self.http_client.request.side_effect = \
+            stripe.error.APIConnectionError('refused')
+
+        self.assertRaises(stripe.error.APIConnectionError,
+                          requestor.request, 'post', self.valid_path, {})
+
+        self.assertEqual(1, breaker.stats()[
+            ('https://api.stripe.com', None)]['failures'])
+
+    def test_circuit_breaker_ignores_expired_deadlines(self):
+        breaker = stripe.CircuitBreaker(min_requests=1, window=1)
+        requestor = stripe.api_requestor.APIRequestor(
+            client=self.http_client, circuit_breaker=breaker)
+
+        with patch('stripe.deadlines.time') as time_mock:
+            time_mock.time.return_value = 1000.0
+
+            def time_out(*args):
+                time_mock.time.return_value += 1
+                raise stripe.error.APIConnectionError('timed out')
+            self.http_client.request = Mock(side_effect=time_out)
+
+            for _ in xrange(3):
+                self.assertRaises(stripe.error.DeadlineExceededError,
+                                  requestor.request, 'get',
+                                  self.valid_path,
+                                  deadline=stripe.Deadline(1))
+
+        key = breaker.key('https://api.stripe.com')
+        self.assertEqual('closed', breaker.state(key))
+        self.assertEqual(0, breaker.stats()[key]['failures'])
+
+    def test_circuit_breaker_setting(self):
+        stripe.circuit_breaker = stripe.CircuitBreaker()
+
+        requestor = stripe.api_requestor.APIRequestor(client=self.http_client)
+
+        self.assertTrue(requestor._circuit_breaker is stripe.circuit_breaker)
+
     def test_invalid_method(self):
         self.assertRaises(stripe.error.APIConnectionError,
                           self.requestor.request,
@@ -1,10 +1,15 @@
+import hashlib
+import os
 import pickle
 import sys
 import time
 import datetime
 import tempfile
 
+from mock import Mock, patch
+
 import stripe
+import stripe.cache
 import stripe.resource
 
 from stripe.test.helper import (
@@ -241,6 +246,91 @@ class APIResourceTests(StripeApiTestCase):
         self.assertEqual(5, res.frobble)
         self.assertRaises(KeyError, res.__getitem__, 'bobble')
 
+    def mock_retrieve_many(self):
+        def request(method, url, params):
+            id = url.rsplit('/', 1)[1]
+            if id == 'missing':
+                raise stripe.error.InvalidRequestError('No such object', 'id')
+            return {'id': id, 'bobble': 'scrobble'}, 'reskey'
+
+        self.requestor_mock.request = Mock(side_effect=request)
+
+    def test_retrieve_many(self):
+        self.mock_retrieve_many()
+
+        res = MyResource.retrieve_many(['foo1', 'missing', 'foo2', 'foo1'],
+                                       concurrency=2, myparam=5)
+
+        self.assertEqual(4, len(res))
+        self.assertEqual('foo1', res[0].id)
+        self.assertTrue(isinstance(res[1],
+                                   stripe.error.InvalidRequestError))
+        self.assertEqual('foo2', res[2].id)
+        self.assertTrue(res[0] is res[3])
+        self.assertTrue(isinstance(res[2], MyResource))
+        self.assertEqual('reskey', res[2].api_key)
+
+        # Duplicate ids are only fetched once
+        self.assertEqual(3, self.requestor_mock.request.call_count)
+        self.requestor_mock.request.assert_any_call(
+            'get', '/v1/myresources/foo2', {'myparam': 5})
+
+    def test_retrieve_many_uses_object_cache(self):
+        self.mock_retrieve_many()
+        stripe.object_cache = stripe.cache.ObjectCache()
+
+        cached = MyResource.construct_from({'id': 'foo1'}, 'mykey')
+        stripe.object_cache.set(cached, ('foo1', stripe.api_key, None))
+
+        res = MyResource.retrieve_many(['foo1', 'foo2'])
+
+        self.assertTrue(res[0] is cached)
+        self.assertEqual('scrobble', res[1].bobble)
+        self.assertEqual(1, self.requestor_mock.request.call_count)
+        self.assertTrue(stripe.object_cache.get(
+            ('foo2', stripe.api_key, None)) is res[1])
+
+    def test_retrieve_many_object_cache_credentials(self):
+        self.mock_retrieve_many()
+        stripe.object_cache = stripe.cache.ObjectCache()
+        stripe.object_cache.set(
+            MyResource.construct_from({'id': 'foo1'}, 'mykey'))
+
+        MyResource.retrieve_many(['foo1'], stripe_account='acct_1')
+        MyResource.retrieve_many(['foo1'], expand=['customer'])
+        self.assertEqual(2, self.requestor_mock.request.call_count)
+
+        res = MyResource.retrieve_many(['foo1'], stripe_account='acct_1')
+        self.assertEqual(2, self.requestor_mock.request.call_count)
+        self.assertEqual('acct_1', res[0].stripe_account)
+
+    def test_retrieve_many_object_cache_global_key(self):
+        self.mock_retrieve_many()
+        stripe.object_cache = stripe.cache.ObjectCache()
+
+        stripe.api_key = 'sk_account_a'
+        MyResource.retrieve_many(['foo1'])
+        MyResource.retrieve_many(['foo1'], api_key='sk_account_a')
+        self.assertEqual(1, self.requestor_mock.request.call_count)
+
+        stripe.api_key = 'sk_account_b'
+        MyResource.retrieve_many(['foo1'])
+        self.assertEqual(2, self.requestor_mock.request.call_count)
+
+    def test_retrieve_many_uses_default_http_client(self):
+        self.mock_retrieve_many()
+        client = Mock()
+
+        with patch('stripe.http_client.new_pooled_http_client',
+                   return_value=client) as new_client:
+            MyResource.retrieve_many(['foo1'], concurrency=3)
+            MyResource.retrieve_many(['foo2'])
+
+        new_client.assert_called_once_with(3, verify_ssl_certs=True)
+        self.assertTrue(stripe.default_http_client is client)
+        self.assertEqual(client, stripe.api_requestor.APIRequestor.call_args[
+            1]['client'])
+
     def test_convert_to_stripe_object(self):
         sample = {
             'foo': 'bar',
@@ -276,6 +366,87 @@ class APIResourceTests(StripeApiTestCase):
         # self.assertRaises(AttributeError, getattr, converted.adict, 'object')
 
 
+class ResolveTests(StripeApiTestCase):
+
+    def setUp(self):
+        super(ResolveTests, self).setUp()
+
+        def request(method, url, params=None, headers=None):
+            id = url.rsplit('/', 1)[1]
+            if id == 'cus_missing':
+                raise stripe.error.InvalidRequestError('No such customer',
+                                                       'id')
+            return {'id': id, 'object': 'customer',
+                    'email': '%s@example.com' % (id,)}, 'reskey'
+
+        self.requestor_mock.request = Mock(side_effect=request)
+
+    def make_charge(self, customer):
+        return stripe.Charge.construct_from({
+            'id': 'ch_for_%s' % (customer,),
+            'customer': customer,
+        }, 'mykey')
+
+    def test_resolve(self):
+        charge = self.make_charge('cus_1')
+
+        customer = charge.resolve('customer')
+
+        self.assertTrue(isinstance(customer, stripe.Customer))
+        self.assertEqual('cus_1@example.com', customer.email)
+        self.assertEqual('cus_1', charge.customer)
+        self.requestor_mock.request.assert_called_with(
+            'get', '/v1/customers/cus_1', {}, None)
+
+        self.assertTrue(charge.resolve('customer') is customer)
+        self.assertEqual(1, self.requestor_mock.request.call_count)
+
+        charge.refresh_from({'customer': 'cus_2'}, 'mykey', True)
+        self.assertEqual('cus_2', charge.resolve('customer').id)
+
+    def test_resolve_expanded_field(self):
+        charge = stripe.Charge.construct_from({
+            'id': 'ch_1',
+            'customer': {'id': 'cus_1', 'object': 'customer'},
+        }, 'mykey')
+
+        self.assertTrue(charge.resolve('customer') is charge.customer)
+        self.assertFalse(self.requestor_mock.request.called)
+
+    def test_resolve_uses_object_cache(self):
+        stripe.object_cache = stripe.cache.ObjectCache()
+
+        first = self.make_charge('cus_1').resolve('customer')
+        second = self.make_charge('cus_1').resolve('customer')
+
+        self.assertTrue(first is second)
+        self.assertEqual(1, self.requestor_mock.request.call_count)
+
+    def test_resolve_unknown_field(self):
+        obj = stripe.resource.StripeObject.construct_from(
+            {'id': 'foo', 'widget': 'wid_1'}, 'mykey')
+
+        self.assertRaises(ValueError, obj.resolve, 'widget')
+        self.assertEqual('wid_1',
+                         obj.resolve('widget', stripe.Customer).id)
+
+    def test_prefetch(self):
+        charges = [self.make_charge(c) for c in
+                   ('cus_1', 'cus_2', 'cus_1', 'cus_missing')]
+        charges.append(self.make_charge(None))
+
+        stripe.resource.prefetch(charges, 'customer', concurrency=2)
+
+        self.assertEqual(3, self.requestor_mock.request.call_count)
+        self.assertEqual('cus_1@example.com',
+                         charges[2].resolve('customer').email)
+        self.assertEqual(None, charges[4].resolve('customer'))
+        self.assertEqual(3, self.requestor_mock.request.call_count)
+
+        self.assertRaises(stripe.error.InvalidRequestError,
+                          charges[3].resolve, 'customer')
+
+
 class SingletonAPIResourceTests(StripeApiTestCase):
 
     def test_retrieve(self):
@@ -1569,6 +1740,77 @@ class FileUploadTest(StripeResourceTest):
             headers={'Content-Type': 'multipart/form-data'}
         )
 
+    def test_create_many_file_uploads(self):
+        files = [tempfile.NamedTemporaryFile() for _ in xrange(3)]
+
+        def request(method, url, params, headers):
+            if params['file'] is files[1]:
+                raise stripe.error.InvalidRequestError('Too large', 'file')
+            return {'id': params['file'].name, 'object': 'file_upload',
+                    'purpose': params['purpose']}, 'reskey'
+
+        self.requestor_mock.request = Mock(side_effect=request)
+        client = Mock()
+
+        with patch('stripe.http_client.new_pooled_http_client',
+                   return_value=client):
+            res = stripe.FileUpload.create_many(
+                files, purpose='dispute_evidence', concurrency=2)
+
+        self.assertTrue(client.close.called)
+
+        self.assertEqual(3, len(res))
+        self.assertEqual(files[0].name, res[0].id)
+        self.assertTrue(isinstance(res[0], stripe.FileUpload))
+        self.assertEqual('dispute_evidence', res[0].purpose)
+        self.assertTrue(isinstance(res[1], stripe.error.InvalidRequestError))
+        self.assertEqual(files[2].name, res[2].id)
+        self.requestor_mock.request.assert_any_call(
+            'post', '/v1/files',
+            params={'purpose': 'dispute_evidence', 'file': files[2]},
+            headers={'Content-Type': 'multipart/form-data'})
+
+        self.assertEqual([], stripe.FileUpload.create_many([]))
+
+    def test_download_file_upload(self):
+        upload = stripe.FileUpload.construct_from({
+            'id': 'file_foo', 'object': 'file_upload',
+            'url': 'https://files.stripe.com/files/file_foo'}, 'mykey')
+        self.requestor_mock.request_stream = Mock(
+            side_effect=lambda *args, **kwargs: (iter(['ab', 'cd']), {}))
+
+        self.assertEqual(['ab', 'cd'], list(upload.iter_content(2)))
+        self.requestor_mock.request_stream.assert_called_with(
+            'https://files.stripe.com/files/file_foo', chunk_size=2)
+
+        chunks = []
+        self.assertEqual(4, upload.download(chunks.append))
+        self.assertEqual(['ab', 'cd'], chunks)
+
+        path = os.path.join(tempfile.mkdtemp(), 'evidence.pdf')
+        digest = hashlib.sha256()
+        self.assertEqual(4, upload.download(path, hash=digest))
+        with open(path, 'rb') as f:
+            self.assertEqual('abcd', f.read())
+        self.assertEqual(hashlib.sha256('abcd').hexdigest(),
+                         digest.hexdigest())
+
+    def test_failed_download_leaves_no_file(self):
+        upload = stripe.FileUpload.construct_from({
+            'id': 'file_foo', 'url': 'https://files.stripe.com/f'}, 'mykey')
+
+        def chunks():
+            yield 'ab'
+            raise stripe.error.APIConnectionError('reset')
+
+        self.requestor_mock.request_stream = Mock(
+            return_value=(chunks(), {}))
+
+        directory = tempfile.mkdtemp()
+        self.assertRaises(stripe.error.APIConnectionError, upload.download,
+                          os.path.join(directory, 'evidence.pdf'))
+        self.assertEqual([], os.listdir(directory))
+
     def test_fetch_file_upload(self):
         stripe.FileUpload.retrieve("fil_foo")
         self.requestor_mock.request.assert_called_with(
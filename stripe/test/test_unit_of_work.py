@@ -0,0 +1,135 @@
+import threading
+
+import unittest2
+
+from mock import Mock, patch
+
+import stripe
+
+from stripe.test.helper import StripeApiTestCase
+from stripe.unit_of_work import UnitOfWork
+
+
+class UnitOfWorkTests(StripeApiTestCase):
+
+    def setUp(self):
+        super(UnitOfWorkTests, self).setUp()
+
+        self.calls = []
+        self.lock = threading.Lock()
+
+        def request(method, url, params=None, headers=None):
+            with self.lock:
+                self.calls.append(url)
+            if params.get('description') == 'fail':
+                raise stripe.error.InvalidRequestError('Bad', 'description')
+            response = {'id': url.rsplit('/', 1)[1], 'saved': True}
+            if '/subscriptions/' in url:
+                response['customer'] = url.split('/')[3]
+            return response, 'reskey'
+
+        self.requestor_mock.request = Mock(side_effect=request)
+
+    def customer(self, id):
+        return stripe.Customer.construct_from({
+            'id': id,
+            'metadata': {'segment': 'silver'},
+        }, 'mykey')
+
+    def subscription(self, id, customer):
+        return stripe.Subscription.construct_from({
+            'id': id,
+            'customer': customer,
+        }, 'mykey')
+
+    def test_flushes_only_dirty_objects(self):
+        clean = self.customer('cus_clean')
+        dirty = self.customer('cus_dirty')
+        nested = self.customer('cus_nested')
+
+        with UnitOfWork() as uow:
+            uow.track_all([clean, dirty, nested])
+            dirty.description = 'new'
+            nested.metadata['segment'] = 'gold'
+
+        self.assertTrue(uow.summary.ok)
+        self.assertEqual(2, len(uow.summary.saved))
+        self.assertEqual(['/v1/customers/cus_dirty',
+                          '/v1/customers/cus_nested'], sorted(self.calls))
+
+        # Results are merged back into the tracked objects
+        self.assertEqual(True, dirty.saved)
+        self.assertFalse(dirty._unsaved_values)
+
+    def test_uses_default_http_client(self):
+        client = Mock()
+        customer = self.customer('cus_1')
+        customer.metadata['segment'] = 'gold'
+
+        with patch('stripe.http_client.new_pooled_http_client',
+                   return_value=client) as new_client:
+            with UnitOfWork(concurrency=3) as uow:
+                uow.track(customer)
+
+        new_client.assert_called_once_with(3, verify_ssl_certs=True)
+        self.assertTrue(stripe.default_http_client is client)
+        self.assertEqual(client, stripe.api_requestor.APIRequestor.call_args[
+            1]['client'])
+
+    def test_saves_parents_before_children(self):
+        customer = self.customer('cus_1')
+        sub = self.subscription('sub_1', 'cus_1')
+
+        with UnitOfWork() as uow:
+            uow.track(sub)
+            uow.track(customer)
+            sub.quantity = 2
+            customer.description = 'parent'
+
+        self.assertEqual(['/v1/customers/cus_1',
+                          '/v1/customers/cus_1/subscriptions/sub_1'],
+                         self.calls)
+
+    def test_reports_failures_and_skips_dependents(self):
+        customer = self.customer('cus_1')
+        sub = self.subscription('sub_1', 'cus_1')
+        other = self.customer('cus_2')
+
+        with UnitOfWork() as uow:
+            uow.track_all([customer, sub, other])
+            customer.description = 'fail'
+            sub.quantity = 2
+            other.description = 'fine'
+
+        summary = uow.summary
+        self.assertFalse(summary.ok)
+        self.assertEqual([other], summary.saved)
+        self.assertEqual([sub], summary.skipped)
+
+        failed = dict((obj.id, err) for obj, err in summary.failed)
+        self.assertTrue(isinstance(failed['cus_1'],
+                                   stripe.error.InvalidRequestError))
+        self.assertTrue(failed['sub_1'] is failed['cus_1'])
+        self.assertFalse('/v1/customers/cus_1/subscriptions/sub_1' in
+                         self.calls)
+
+    def test_does_not_flush_when_block_raises(self):
+        customer = self.customer('cus_1')
+
+        def run():
+            with UnitOfWork() as uow:
+                uow.track(customer)
+                customer.description = 'new'
+                raise KeyError('boom')
+
+        self.assertRaises(KeyError, run)
+        self.assertEqual([], self.calls)
+
+    def test_only_tracks_updateable_resources(self):
+        uow = UnitOfWork()
+        self.assertRaises(TypeError, uow.track,
+                          stripe.resource.StripeObject('foo'))
+
+
+if __name__ == '__main__':
+    unittest2.main()
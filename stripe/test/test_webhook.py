@@ -0,0 +1,117 @@
+import threading
+
+import unittest2
+
+import stripe
+import stripe.webhook
+
+from stripe import util
+from stripe.test.helper import StripeTestCase
+
+
+def body(event_id, type='charge.succeeded', **obj):
+    obj.setdefault('object', 'charge')
+    return util.json.dumps({'id': event_id, 'object': 'event',
+                            'type': type, 'data': {'object': obj}})
+
+
+class WebhookPipelineTests(StripeTestCase):
+
+    def setUp(self):
+        super(WebhookPipelineTests, self).setUp()
+        self.pipeline = stripe.webhook.WebhookPipeline(concurrency=4)
+        self.handled = []
+        self.lock = threading.Lock()
+
+        @self.pipeline.on('charge.*')
+        def handle(event):
+            with self.lock:
+                self.handled.append(event)
+
+    def tearDown(self):
+        self.pipeline.stop()
+        super(WebhookPipelineTests, self).tearDown()
+
+    def test_process(self):
+        event = self.pipeline.process(body('evt_1', id='ch_1', amount=100))
+
+        self.assertTrue(isinstance(event, stripe.Event))
+        self.assertEqual(100, event.data.object.amount)
+        self.assertTrue(isinstance(event.data.object, stripe.Charge))
+        self.assertEqual([event], self.handled)
+
+    def test_drops_duplicates_and_invalid_bodies(self):
+        self.assertTrue(self.pipeline.process(body('evt_1')))
+        self.assertEqual(None, self.pipeline.process(body('evt_1')))
+        self.assertEqual(None, self.pipeline.process('{not json'))
+        self.assertEqual(None, self.pipeline.process('{"id": "evt_2"}'))
+
+        metrics = self.pipeline.metrics.snapshot()
+        self.assertEqual(1, metrics['handled'])
+        self.assertEqual(1, metrics['duplicates'])
+        self.assertEqual(2, metrics['invalid'])
+        self.assertEqual(1, len(self.handled))
+
+    def test_handler_failures_are_counted(self):
+        @self.pipeline.on('invoice.created')
+        def fail(event):
+            raise ValueError('boom')
+
+        self.pipeline.process(body('evt_1', type='invoice.created'))
+
+        metrics = self.pipeline.metrics.snapshot()
+        self.assertEqual(1, metrics['failed'])
+        self.assertEqual(1, metrics['latency']['invoice.created']['count'])
+
+    def test_failed_event_is_handled_when_redelivered(self):
+        failures = [ValueError('boom')]
+
+        @self.pipeline.on('invoice.created')
+        def flaky(event):
+            if failures:
+                raise failures.pop()
+            self.handled.append(event)
+
+        self.pipeline.process(body('evt_1', type='invoice.created'))
+        self.assertEqual([], self.handled)
+
+        event = self.pipeline.process(body('evt_1', type='invoice.created'))
+        self.assertEqual([event], self.handled)
+        self.assertEqual(None, self.pipeline.process(
+            body('evt_1', type='invoice.created')))
+
+        metrics = self.pipeline.metrics.snapshot()
+        self.assertEqual(1, metrics['failed'])
+        self.assertEqual(1, metrics['handled'])
+        self.assertEqual(1, metrics['duplicates'])
+
+    def test_workers(self):
+        with self.pipeline:
+            for i in xrange(200):
+                accepted = self.pipeline.submit(body('evt_%d' % (i % 150)))
+                self.assertTrue(accepted)
+            self.pipeline.join()
+
+        metrics = self.pipeline.metrics.snapshot()
+        self.assertEqual(200, metrics['received'])
+        self.assertEqual(150, metrics['handled'])
+        self.assertEqual(50, metrics['duplicates'])
+        self.assertEqual(0, metrics['queue_depth'])
+        self.assertEqual(150, len(self.handled))
+        self.assertEqual(
+            150, metrics['latency']['charge.succeeded']['count'])
+
+    def test_rejects_when_full(self):
+        pipeline = stripe.webhook.WebhookPipeline(queue_size=2)
+
+        self.assertTrue(pipeline.submit(body('evt_1')))
+        self.assertTrue(pipeline.submit(body('evt_2')))
+        self.assertFalse(pipeline.submit(body('evt_3')))
+
+        metrics = pipeline.metrics.snapshot()
+        self.assertEqual(2, metrics['queue_depth'])
+        self.assertEqual(1, metrics['rejected'])
+
+
+if __name__ == '__main__':
+    unittest2.main()
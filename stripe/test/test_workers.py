@@ -0,0 +1,78 @@
+import threading
+import time
+
+import unittest2
+
+from stripe.workers import WorkerPool
+
+
+class WorkerPoolTests(unittest2.TestCase):
+
+    def test_map_preserves_order(self):
+        def slow_double(n):
+            time.sleep(0.01 * (5 - n))
+            return n * 2
+
+        results = WorkerPool(concurrency=5).map(slow_double, range(5))
+
+        self.assertEqual([0, 1, 2, 3, 4], [r.index for r in results])
+        self.assertEqual([0, 2, 4, 6, 8], [r.value for r in results])
+
+    def test_captures_errors_per_item(self):
+        def fail_on_odd(n):
+            if n % 2:
+                raise ValueError(n)
+            return n
+
+        results = WorkerPool(concurrency=2).map(fail_on_odd, range(4))
+
+        self.assertTrue(results[0].ok)
+        self.assertFalse(results[1].ok)
+        self.assertTrue(isinstance(results[1].error, ValueError))
+        self.assertEqual(2, results[2].value)
+
+    def test_bounded_concurrency(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def track(n):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+
+        WorkerPool(concurrency=3).map(track, range(12))
+
+        self.assertTrue(state['peak'] <= 3)
+
+    def test_consumes_input_lazily(self):
+        pulled = []
+
+        def source():
+            for n in xrange(1000):
+                pulled.append(n)
+                yield n
+
+        results = WorkerPool(concurrency=2, queue_size=2).imap_unordered(
+            lambda n: n, source())
+        results.next()
+        results.close()
+
+        self.assertTrue(len(pulled) < 1000)
+
+    def test_propagates_producer_errors(self):
+        def source():
+            yield 1
+            raise KeyError('boom')
+
+        pool = WorkerPool(concurrency=2)
+        self.assertRaises(KeyError, pool.map, lambda n: n, source())
+
+    def test_rejects_invalid_concurrency(self):
+        self.assertRaises(ValueError, WorkerPool, 0)
+
+
+if __name__ == '__main__':
+    unittest2.main()
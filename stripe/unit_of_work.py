@@ -0,0 +1,167 @@
+from stripe import api_requestor, resource, workers
+
+
+class FlushSummary(object):
+
+    def __init__(self):
+        self.saved = []
+        # (object, error) pairs.  Objects skipped because an object they
+        # depend on failed are listed with that object's error.
+        self.failed = []
+        self.skipped = []
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def __repr__(self):
+        return '<FlushSummary saved=%d failed=%d skipped=%d>' % (
+            len(self.saved), len(self.failed), len(self.skipped))
+
+
+class UnitOfWork(object):
+    """
+    Collects changes to many `UpdateableAPIResource` objects and saves the
+    dirty ones concurrently when the block exits:
+
+        with UnitOfWork(concurrency=20) as uow:
+            for customer in uow.track_all(customers):
+                customer.metadata['segment'] = 'gold'
+
+        for obj, err in uow.summary.failed:
+            ...
+
+    Objects that reference another tracked object's id (a Subscription's
+    `customer`, for instance) are saved after it, and are skipped if it
+    fails to save.  Nothing is saved if the block raises.  Requests go
+    through `stripe.default_http_client`, which is set to a pooled client
+    if it is unset.
+    """
+
+    def __init__(self, concurrency=10):
+        self.concurrency = concurrency
+        self.summary = None
+        self._tracked = []
+        self._tracked_ids = set()
+
+    def track(self, obj):
+        if not isinstance(obj, resource.UpdateableAPIResource):
+            raise TypeError(
+                'Only UpdateableAPIResource instances can be tracked, got '
+                '%s' % (type(obj).__name__,))
+
+        if id(obj) not in self._tracked_ids:
+            self._tracked_ids.add(id(obj))
+            self._tracked.append(obj)
+        return obj
+
+    def track_all(self, objects):
+        return [self.track(obj) for obj in objects]
+
+    def dirty(self):
+        return [obj for obj in self._tracked if _is_dirty(obj)]
+
+    def flush(self):
+        summary = FlushSummary()
+        dirty = self.dirty()
+        if not dirty:
+            return summary
+
+        client = api_requestor.shared_http_client(self.concurrency)
+        pool = workers.WorkerPool(self.concurrency)
+        parents = _dependencies(dirty)
+        errors = {}
+
+        def save(obj):
+            requestor = api_requestor.APIRequestor(
+                obj.api_key, client=client, api_base=obj.api_base(),
+                account=obj.stripe_account)
+            response, api_key = requestor.request(
+                'post', obj.instance_url(), obj.serialize(None))
+            obj.refresh_from(response, api_key,
+                             stripe_account=obj.stripe_account)
+            return obj
+
+        for layer in _layers(dirty, parents):
+            ready = []
+            for obj in layer:
+                failed_parents = [p for p in parents[id(obj)]
+                                  if id(p) in errors]
+                if failed_parents:
+                    err = errors[id(failed_parents[0])]
+                    errors[id(obj)] = err
+                    summary.failed.append((obj, err))
+                    summary.skipped.append(obj)
+                else:
+                    ready.append(obj)
+
+            for result in pool.map(save, ready):
+                if result.ok:
+                    summary.saved.append(result.item)
+                else:
+                    errors[id(result.item)] = result.error
+                    summary.failed.append((result.item, result.error))
+
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.summary = self.flush()
+        return False
+
+
+def _is_dirty(obj):
+    if obj._unsaved_values:
+        return True
+
+    for value in obj.values():
+        if isinstance(value, resource.APIResource):
+            continue
+        elif isinstance(value, resource.StripeObject) and _is_dirty(value):
+            return True
+        elif isinstance(value, list):
+            for item in value:
+                if (isinstance(item, resource.StripeObject) and
+                        not isinstance(item, resource.APIResource) and
+                        _is_dirty(item)):
+                    return True
+    return False
+
+
+def _dependencies(objects):
+    by_stripe_id = {}
+    for obj in objects:
+        if obj.get('id'):
+            by_stripe_id[obj['id']] = obj
+
+    parents = {}
+    for obj in objects:
+        parents[id(obj)] = []
+        for key, value in obj.items():
+            if key == 'id' or not isinstance(value, basestring):
+                continue
+            parent = by_stripe_id.get(value)
+            if parent is not None and parent is not obj:
+                parents[id(obj)].append(parent)
+    return parents
+
+
+def _layers(objects, parents):
+    remaining = list(objects)
+    done = set()
+
+    while remaining:
+        layer = [obj for obj in remaining
+                 if all(id(p) in done for p in parents[id(obj)])]
+        if not layer:
+            # A reference cycle; nothing left can be ordered, so save the
+            # rest together.
+            layer = remaining
+
+        yield layer
+
+        done.update(id(obj) for obj in layer)
+        remaining = [obj for obj in remaining if id(obj) not in done]
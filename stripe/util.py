@@ -4,7 +4,7 @@ import os
 
 logger = logging.getLogger('stripe')
 
-__all__ = ['StringIO', 'parse_qsl', 'json', 'utf8']
+__all__ = ['StringIO', 'parse_qsl', 'json', 'utf8', 'load_json']
 
 try:
     # When cStringIO is available
@@ -45,6 +45,67 @@ if not (json and hasattr(json, 'loads')):
                 "with questions.")
 
 
+# Keys, and the values of fields drawn from small enumerations, repeat on
+# every object of a list response.  Interning them as the response is
+# decoded means each distinct string is only held in memory once.  Only
+# the keys of API objects, which carry an `object` field, are interned,
+# so that the arbitrary keys of hashes like `metadata` can't fill the
+# table.
+INTERNED_VALUE_KEYS = frozenset([
+    'address_line1_check', 'address_zip_check', 'brand', 'country',
+    'currency', 'cvc_check', 'default_currency', 'duration',
+    'failure_code', 'funding', 'interval', 'object', 'reason', 'status',
+    'tokenization_method', 'type',
+])
+INTERNED_VALUE_MAX_LENGTH = 32
+INTERNED_STRINGS_LIMIT = 10000
+
+_interned_strings = {}
+
+
+def intern_string(value):
+    try:
+        return _interned_strings[value]
+    except KeyError:
+        if len(_interned_strings) < INTERNED_STRINGS_LIMIT:
+            return _interned_strings.setdefault(value, value)
+        return value
+
+
+def _interned_pairs(pairs):
+    obj = {}
+    is_object = any(key == 'object' for key, _ in pairs)
+    for key, value in pairs:
+        if is_object:
+            key = intern_string(key)
+        if (key in INTERNED_VALUE_KEYS and isinstance(value, basestring) and
+                len(value) <= INTERNED_VALUE_MAX_LENGTH):
+            value = intern_string(value)
+        obj[key] = value
+    return obj
+
+
+def _supports_object_pairs_hook():
+    try:
+        json.loads('{}', object_pairs_hook=dict)
+    except TypeError:
+        return False
+    return True
+
+
+_object_pairs_hook_supported = _supports_object_pairs_hook()
+
+
+def load_json(data):
+    """
+    Decode a JSON API response, interning repeated keys and enumerated
+    values along the way.
+    """
+    if _object_pairs_hook_supported:
+        return json.loads(data, object_pairs_hook=_interned_pairs)
+    return json.loads(data)
+
+
 def utf8(value):
     if isinstance(value, unicode) and sys.version_info < (3, 0):
         return value.encode('utf-8')
@@ -0,0 +1,220 @@
+import Queue
+import threading
+import time
+
+from stripe import events, resource, util
+from stripe.dedupe import MemoryDedupeStore
+
+_DONE = object()
+
+
+class WebhookMetrics(object):
+    """
+    Counters for a WebhookPipeline.  Latencies are in seconds.
+    """
+
+    def __init__(self, queue_depth=None):
+        self._lock = threading.Lock()
+        self._queue_depth = queue_depth
+        self.received = 0
+        self.rejected = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.handled = 0
+        self.failed = 0
+        # event type -> [count, total seconds, max seconds]
+        self.latency = {}
+
+    @property
+    def queue_depth(self):
+        return self._queue_depth() if self._queue_depth else 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def observe(self, event_type, seconds, ok):
+        with self._lock:
+            if ok:
+                self.handled += 1
+            else:
+                self.failed += 1
+            stats = self.latency.get(event_type)
+            if stats is None:
+                stats = self.latency[event_type] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            latency = dict(
+                (event_type, {'count': count, 'mean': total / count,
+                              'max': max_seconds})
+                for event_type, (count, total, max_seconds)
+                in self.latency.iteritems())
+            return {
+                'queue_depth': self.queue_depth,
+                'received': self.received,
+                'rejected': self.rejected,
+                'invalid': self.invalid,
+                'duplicates': self.duplicates,
+                'handled': self.handled,
+                'failed': self.failed,
+                'latency': latency,
+            }
+
+
+class WebhookPipeline(events.Dispatcher):
+    """
+    Takes raw webhook request bodies off the request thread: `submit`
+    only enqueues the body, and a pool of workers parses it, drops events
+    already seen and dispatches the rest to the handlers registered with
+    `on`.
+
+        pipeline = WebhookPipeline(concurrency=8, queue_size=5000)
+
+        @pipeline.on('charge.dispute.created')
+        def dispute(event):
+            ...
+
+        pipeline.start()
+
+        def webhook_view(request):
+            if pipeline.submit(request.body):
+                return HttpResponse(status=200)
+            return HttpResponse(status=503)
+
+    When the queue is full `submit` returns False right away; answering
+    with an error status makes Stripe deliver the event again later.
+    Events already accepted are not retried by Stripe, so handler failures
+    are only logged and counted in `metrics`.  An event is only recorded
+    in `dedupe` once its handlers succeed, though, so one that failed is
+    handled again if it is delivered again.
+    """
+
+    def __init__(self, concurrency=4, queue_size=1000, dedupe=None,
+                 api_key=None):
+        if concurrency < 1:
+            raise ValueError(
+                'WebhookPipeline concurrency must be at least 1, got %r' %
+                (concurrency,))
+
+        super(WebhookPipeline, self).__init__()
+        self.concurrency = concurrency
+        self.api_key = api_key
+        if dedupe is None:
+            dedupe = MemoryDedupeStore(max_size=100000)
+        self.dedupe = dedupe
+
+        self._queue = Queue.Queue(queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        # Ids of the events being handled right now
+        self._in_flight = set()
+        self.metrics = WebhookMetrics(self._queue.qsize)
+
+    def submit(self, body):
+        """
+        Queue a raw request body for processing.  Returns False if the
+        pipeline is at capacity.
+        """
+        self.metrics.incr('received')
+        try:
+            self._queue.put_nowait(body)
+            return True
+        except Queue.Full:
+            self.metrics.incr('rejected')
+            return False
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [threading.Thread(target=self._work)
+                             for _ in xrange(self.concurrency)]
+            for thread in self._threads:
+                thread.daemon = True
+                thread.start()
+
+    def join(self):
+        """
+        Block until every submitted body has been processed.
+        """
+        self._queue.join()
+
+    def stop(self):
+        with self._lock:
+            if not self._threads:
+                return
+            for _ in self._threads:
+                self._queue.put(_DONE)
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def _work(self):
+        while True:
+            body = self._queue.get()
+            try:
+                if body is _DONE:
+                    return
+                self.process(body)
+            finally:
+                self._queue.task_done()
+
+    def process(self, body):
+        """
+        Parse, dedupe and dispatch one body on the calling thread.
+        Returns the Event, or None if it was invalid or a duplicate.
+        """
+        try:
+            payload = util.load_json(body)
+            event_id = payload['id']
+            event_type = payload['type']
+        except (ValueError, KeyError, TypeError), e:
+            util.logger.warning('Ignoring invalid webhook body: %r', e)
+            self.metrics.incr('invalid')
+            return None
+
+        # The id is only recorded once the handlers succeed; meanwhile it is
+        # held in _in_flight so that concurrent copies are still dropped
+        with self._lock:
+            duplicate = event_id in self._in_flight
+            if not duplicate:
+                self._in_flight.add(event_id)
+        if duplicate:
+            self.metrics.incr('duplicates')
+            return None
+
+        try:
+            if self.dedupe.seen(event_id):
+                self.metrics.incr('duplicates')
+                return None
+            return self._handle(event_id, event_type, payload)
+        finally:
+            with self._lock:
+                self._in_flight.discard(event_id)
+
+    def _handle(self, event_id, event_type, payload):
+        event = resource.convert_to_stripe_object(payload, self.api_key,
+                                                  None)
+        start = time.time()
+        try:
+            self.dispatch(event)
+        except Exception, e:
+            util.logger.warning('Handling webhook event %s failed: %r',
+                                event_id, e)
+            self.metrics.observe(event_type, time.time() - start, False)
+        else:
+            self.dedupe.add(event_id)
+            self.metrics.observe(event_type, time.time() - start, True)
+        return event
@@ -0,0 +1,127 @@
+import Queue
+import threading
+
+from stripe import deadlines
+
+_DONE = object()
+
+
+class WorkResult(object):
+
+    def __init__(self, index, item, value=None, error=None):
+        self.index = index
+        self.item = item
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return '<WorkResult %d: %r>' % (self.index, self.value)
+        return '<WorkResult %d failed: %r>' % (self.index, self.error)
+
+
+class WorkerPool(object):
+    """
+    Runs a function over the items of an iterable on a fixed number of
+    threads.
+
+    Items are pulled from the iterable lazily and handed to the workers
+    through a bounded queue, so a slow batch never holds more than
+    `queue_size` pending items in memory.
+    """
+
+    def __init__(self, concurrency=10, queue_size=None):
+        if concurrency < 1:
+            raise ValueError(
+                'WorkerPool concurrency must be at least 1, got %r' %
+                (concurrency,))
+
+        self.concurrency = concurrency
+        self.queue_size = queue_size or concurrency * 2
+
+    def imap_unordered(self, func, iterable):
+        """
+        Yield a WorkResult for each item as soon as it completes.
+        Exceptions raised by `func` are captured on the result rather than
+        stopping the batch.
+        """
+        inbox = Queue.Queue(self.queue_size)
+        outbox = Queue.Queue()
+        stop = threading.Event()
+        producer_errors = []
+        # Calls made on the workers share the caller's deadline
+        deadline = deadlines.current()
+
+        def produce():
+            try:
+                for index, item in enumerate(iterable):
+                    if not _put(inbox, (index, item), stop):
+                        break
+            except Exception, e:
+                producer_errors.append(e)
+            finally:
+                for _ in xrange(self.concurrency):
+                    inbox.put(_DONE)
+
+        def work():
+            while True:
+                task = inbox.get()
+                if task is _DONE:
+                    outbox.put(_DONE)
+                    return
+                if stop.isSet():
+                    continue
+
+                index, item = task
+                try:
+                    with deadlines.using(deadline):
+                        value = func(item)
+                    result = WorkResult(index, item, value=value)
+                except Exception, e:
+                    result = WorkResult(index, item, error=e)
+                outbox.put(result)
+
+        threads = [threading.Thread(target=produce)]
+        threads.extend(threading.Thread(target=work)
+                       for _ in xrange(self.concurrency))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        finished = 0
+        try:
+            while finished < self.concurrency:
+                result = outbox.get()
+                if result is _DONE:
+                    finished += 1
+                else:
+                    yield result
+        finally:
+            stop.set()
+
+        if producer_errors:
+            raise producer_errors[0]
+
+    def map(self, func, iterable):
+        """
+        Return the WorkResults for every item, in input order.
+        """
+        results = list(self.imap_unordered(func, iterable))
+        results.sort(key=lambda r: r.index)
+        return results
+
+
+def _put(queue, task, stop):
+    # Poll so that a consumer abandoning the batch also unblocks the
+    # producer, which would otherwise wait on a full queue forever.
+    while not stop.isSet():
+        try:
+            queue.put(task, True, 0.1)
+            return True
+        except Queue.Full:
+            continue
+    return False